@@ -0,0 +1,138 @@
+"""
+Filter + rank benchmark for utils/query_engine.py on synthetic result sets.
+
+    python -m benchmarks.bench_query_engine [sizes...]
+
+Compares ResultSet with the old per-hotel loop + lambda sort key, and the
+radius filter (each hotel's distance measured once per set) with measuring
+every hotel per query. Engine timings include building the set: "one shot" builds
+and queries once, "paged" runs a search the way the handlers do
+(SEARCH_MAX_PAGES pages, one set extended and queried after every page)
+against the naive loop re-run on everything loaded so far.
+"""
+import random
+import sys
+import time
+
+from utils.geo import haversine_km
+from utils.hotel_record import HotelRecord
+from utils.query_engine import FilterSpec, ResultSet
+
+DEFAULT_SIZES = (100, 1_000, 10_000, 100_000)
+PAGES = 5   # SEARCH_MAX_PAGES
+
+
+def make_records(n: int, seed: int = 42) -> list[HotelRecord]:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        out.append(HotelRecord(
+            hotel_id=i,
+            name=f"Hotel {i}",
+            price=None if rnd.random() < 0.03 else round(rnd.uniform(20, 900), 2),
+            currency="USD",
+            rating=round(rnd.uniform(5, 10), 1),
+            review_count=rnd.randint(0, 5000),
+            distance_km=None if rnd.random() < 0.1 else round(rnd.uniform(0, 25), 1),
+            latitude=None if rnd.random() < 0.05 else 48.85 + rnd.uniform(-0.3, 0.3),
+            longitude=None if rnd.random() < 0.05 else 2.35 + rnd.uniform(-0.45, 0.45),
+            card="",
+        ))
+    return out
+
+
+def naive_bestdeal(records, min_price, max_price, max_dist):
+    filtered = []
+    for h in records:
+        if h.price is None or h.distance_km is None:
+            continue
+        ok_min = (min_price == 0) or (h.price >= min_price)
+        ok_max = (max_price == 0) or (h.price <= max_price)
+        ok_dist = (max_dist == 0) or (h.distance_km <= max_dist)
+        if ok_min and ok_max and ok_dist:
+            filtered.append(h)
+    filtered.sort(key=lambda h: (h.distance_km, h.price))
+    return filtered
+
+
+def naive_within(records, lat, lon, max_dist):
+    return sorted(h.hotel_id for h in records
+                  if h.price is not None and h.latitude is not None and h.longitude is not None
+                  and haversine_km(lat, lon, h.latitude, h.longitude) <= max_dist)
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def split_pages(records, pages: int = PAGES):
+    size = -(-len(records) // pages)
+    return [records[i:i + size] for i in range(0, len(records), size)]
+
+
+def engine_paged(pages, spec, ranking, origin=None):
+    rs = ResultSet(origin=origin)
+    for page in pages:
+        rs.extend(page)
+        found = rs.query(spec, ranking)
+    return found
+
+
+def naive_paged(pages, min_price, max_price, max_dist):
+    loaded = []
+    for page in pages:
+        loaded += page
+        found = naive_bestdeal(loaded, min_price, max_price, max_dist)
+    return found
+
+
+def run(size: int):
+    records = make_records(size)
+    pages = split_pages(records)
+    spec = FilterSpec.from_user_input(50, 400, 10)
+    repeat = 5 if size <= 10_000 else 3
+
+    expected = [r.hotel_id for r in naive_bestdeal(records, 50, 400, 10)]
+    assert [r.hotel_id for r in ResultSet(records).query(spec, "bestdeal")] == expected
+    assert [r.hotel_id for r in engine_paged(pages, spec, "bestdeal")] == expected
+
+    build_ms = best_of(lambda: ResultSet(records), repeat)
+    print(f"n={size:>7}  build={build_ms:8.3f}ms  one shot (build + query):", end="")
+    for ranking in ("lowprice", "guest_rating", "bestdeal", {"price": 0.6, "rating": 0.4}):
+        ms = best_of(lambda: ResultSet(records).query(spec, ranking), repeat)
+        label = ranking if isinstance(ranking, str) else "weighted"
+        print(f"  {label}={ms:8.3f}ms", end="")
+    naive_ms = best_of(lambda: naive_bestdeal(records, 50, 400, 10), repeat)
+    print(f"  naive_bestdeal={naive_ms:8.3f}ms")
+
+    paged_ms = best_of(lambda: engine_paged(pages, spec, "bestdeal"), repeat)
+    naive_paged_ms = best_of(lambda: naive_paged(pages, 50, 400, 10), repeat)
+    print(f"{'':>9}  paged bestdeal, {len(pages)} pages: engine={paged_ms:8.3f}ms  naive={naive_paged_ms:8.3f}ms")
+
+    origin = (48.8566, 2.3522)
+    geo_spec = FilterSpec.from_user_input(0, 0, 2)
+    assert sorted(r.hotel_id for r in ResultSet(records, origin=origin).query(geo_spec, "bestdeal")
+                  if r.latitude is not None and r.longitude is not None) == naive_within(records, *origin, 2)
+    # engine timings build the set every time: measuring the distances is part of it
+    geo_ms = best_of(lambda: ResultSet(records, origin=origin).query(geo_spec, "bestdeal"), repeat)
+    geo_paged_ms = best_of(lambda: engine_paged(pages, geo_spec, "bestdeal", origin), repeat)
+    naive_geo_ms = best_of(lambda: naive_within(records, *origin, 2), repeat)
+    naive_geo_paged_ms = best_of(lambda: [naive_within(records[:len(p) * (i + 1)], *origin, 2)
+                                          for i, p in enumerate(pages)], repeat)
+    print(f"{'':>9}  radius 2km: one shot={geo_ms:8.3f}ms  naive_haversine={naive_geo_ms:8.3f}ms"
+          f"  paged={geo_paged_ms:8.3f}ms  naive_paged={naive_geo_paged_ms:8.3f}ms")
+
+
+def main(argv: list[str]):
+    sizes = [int(x) for x in argv] or DEFAULT_SIZES
+    for size in sizes:
+        run(size)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
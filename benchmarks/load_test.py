@@ -0,0 +1,355 @@
+"""
+Offline load test: the real application (conversation, pagination, history
+handlers, update processor, caches, db) driven by simulated users against
+fakes/booking_api.py and fakes/telegram.py. Nothing leaves the machine.
+
+    python -m benchmarks.load_test --users 2000 --booking-latency 0.15 --jitter 0.1
+
+Each user runs /lowprice, /bestdeal or /guest_rating end to end (city,
+location button, both calendar dates, prices, distance), pages through the
+results, sometimes opens photos / info and /history. Reports per-update
+latency percentiles, updates per second and memory per user. Latency runs
+until the user sees the answer: for taps answered in the background (card
+edits, photos, description) that is the matching Bot API call, not the
+handler returning. With
+--max-p95 / --max-p99 the exit code is 1 when the run is slower, so it can
+guard a deploy; --json writes the report for comparing runs.
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# must be set before config.py is imported; explicit env / .env values win
+TMP_DIR = tempfile.mkdtemp(prefix="hotel-bot-load-")
+os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+os.environ.setdefault("RAPIDAPI_KEY", "load-test")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{TMP_DIR}/load.db")
+os.environ.setdefault("METRICS_PORT", "0")
+os.environ.setdefault("REPLAY_LOG", "")
+os.environ.setdefault("DEST_INDEX_PATH", f"{TMP_DIR}/destinations.idx")
+# the fake API has no limits; keep the client-side ones out of the way unless asked
+os.environ.setdefault("RAPIDAPI_RATE", "100000")
+os.environ.setdefault("RAPIDAPI_BURST", "100000")
+os.environ.setdefault("RAPIDAPI_DAILY_QUOTA", "1000000000")
+# same for the bot-wide Telegram limit: it would cap the run at 30 messages/s
+os.environ.setdefault("TELEGRAM_GLOBAL_RATE", "100000")
+os.environ.setdefault("TELEGRAM_GLOBAL_BURST", "100000")
+
+from telegram import Update  # noqa: E402
+
+import main as bot_main  # noqa: E402
+from database.init_db import init_db  # noqa: E402
+from fakes.booking_api import FakeBookingAPI  # noqa: E402
+from fakes.telegram import FakeTelegram  # noqa: E402
+from services import booking_api  # noqa: E402
+from services.send_queue import send_scheduler  # noqa: E402
+
+FLOWS = ("lowprice", "bestdeal", "guest_rating")
+# updates whose answer is sent by a background task: the Bot API call that shows it
+ANSWERED_BY = {
+    "hotel_next": ("editMessageText",),
+    "hotel_photos": ("sendMediaGroup", "sendPhoto", "sendMessage"),
+    "hotel_info": ("sendMessage",),
+}
+ANSWER_TIMEOUT = 30.0
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux); 0 where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.telegram = FakeTelegram(latency=args.telegram_latency, jitter=args.telegram_jitter,
+                                     flood_limit=args.telegram_flood_limit)
+        self.booking = FakeBookingAPI(latency=args.booking_latency, jitter=args.jitter,
+                                      error_rate=args.error_rate, timeout_rate=args.timeout_rate,
+                                      hotels_per_page=args.hotels_per_page, pages=args.pages)
+        self.cities = [d["name"] for d in self.booking.fixtures["destinations"]]
+        self.app = None
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(10_000_000)
+        self.latencies: dict[str, list[float]] = {}   # update kind -> seconds
+        self.flows_done = 0
+        self.flows_failed = 0
+        self.unanswered: dict[str, int] = {}          # update kind -> answers never seen
+
+    # ----- updates -----
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def _text_update(self, user_id: int, text: str) -> Update:
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": next(self._update_ids), "message": message}, self.app.bot)
+
+    def _callback_update(self, user_id: int, message: dict, data: str) -> Update:
+        callback = {
+            "id": str(next(self._update_ids)),
+            "from": self._user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": message,
+        }
+        return Update.de_json({"update_id": next(self._update_ids), "callback_query": callback}, self.app.bot)
+
+    async def send(self, kind: str, update: Update):
+        """Push one update through the application like the polling loop does and time it."""
+        methods = ANSWERED_BY.get(kind)
+        shown = self.telegram.expect(update.effective_chat.id, methods) if methods else None
+        started = time.perf_counter()
+        await self.app.update_processor.process_update(update, self.app.process_update(update))
+        if shown is not None:
+            try:
+                await asyncio.wait_for(shown, ANSWER_TIMEOUT)
+            except asyncio.TimeoutError:
+                self.unanswered[kind] = self.unanswered.get(kind, 0) + 1
+                return
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    async def think(self):
+        if self.args.think:
+            await asyncio.sleep(self.rnd.uniform(0, self.args.think))
+
+    async def press(self, user_id: int, prefix: str, kind: str, data: str | None = None) -> bool:
+        found = self.telegram.last_with_button(user_id, prefix)
+        if not found:
+            return False
+        message, button_data = found
+        await self.send(kind, self._callback_update(user_id, message, data or button_data))
+        return True
+
+    # ----- one user -----
+
+    async def user(self, user_id: int):
+        rnd = random.Random(self.args.seed * 1_000_003 + user_id)
+        flow = rnd.choice(self.args.flows)
+        try:
+            await self.send(flow, self._text_update(user_id, f"/{flow}"))
+            await self.think()
+            await self.send("city", self._text_update(user_id, rnd.choice(self.cities)))
+            await self.think()
+            if not await self.press(user_id, "loc|", "location"):
+                self.flows_failed += 1
+                return
+
+            checkin = date.today() + timedelta(days=rnd.randint(7, 60))
+            checkout = checkin + timedelta(days=rnd.randint(1, 7))
+            for kind, day in (("checkin", checkin), ("checkout", checkout)):
+                await self.think()
+                # what the calendar's day button sends
+                data = f"cbcal_0_s_d_{day.year}_{day.month}_{day.day}"
+                await self.send(kind, self._callback_update(user_id, self.telegram.last_message(user_id), data))
+
+            await self.think()
+            await self.send("min_price", self._text_update(user_id, str(rnd.choice((0, 0, 50, 100)))))
+            await self.think()
+            await self.send("max_price", self._text_update(user_id, str(rnd.choice((0, 300, 500)))))
+            if flow == "bestdeal":
+                await self.think()
+                await self.send("max_distance", self._text_update(user_id, str(rnd.choice((0, 3, 10)))))
+
+            if not self.telegram.last_with_button(user_id, "hotel_"):
+                self.flows_failed += 1
+                return
+
+            for _ in range(rnd.randint(0, self.args.taps)):
+                await self.think()
+                if not await self.press(user_id, "hotel_next", "hotel_next"):
+                    break
+            if rnd.random() < self.args.detail_rate:
+                await self.think()
+                await self.press(user_id, "hotel_", "hotel_photos", "hotel_photos")
+            if rnd.random() < self.args.detail_rate:
+                await self.think()
+                await self.press(user_id, "hotel_", "hotel_info", "hotel_info")
+            if rnd.random() < self.args.history_rate:
+                await self.think()
+                await self.send("history", self._text_update(user_id, "/history"))
+                await self.press(user_id, "hist_open|", "history_open")
+            self.flows_done += 1
+        except Exception:
+            self.flows_failed += 1
+            raise
+        finally:
+            if not self.args.keep_chats:
+                self.telegram.forget(user_id)
+
+    # ----- run -----
+
+    async def run(self) -> dict:
+        args = self.args
+        init_db()
+        booking_api.use_transport(self.booking.transport())
+        self.app = bot_main.build_application(args.concurrency, request=self.telegram)
+        await self.app.initialize()
+        await bot_main.on_startup(self.app)
+        await self.app.start()
+
+        gc.collect()
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        tasks = []
+        for n in range(args.users):
+            tasks.append(asyncio.ensure_future(self.user(1_000_000 + n)))
+            if args.ramp:
+                await asyncio.sleep(args.ramp / args.users)
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+        gc.collect()
+        rss_after = rss_bytes()
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        # same order as run_polling: persistence is flushed before post_shutdown closes the db
+        await self.app.stop()
+        await self.app.shutdown()
+        await bot_main.on_shutdown(self.app)
+        return self.report(elapsed, rss_before, rss_after, errors)
+
+    def report(self, elapsed: float, rss_before: int, rss_after: int, errors: list) -> dict:
+        everything = sorted(v for values in self.latencies.values() for v in values)
+        per_kind = {}
+        for kind, values in sorted(self.latencies.items()):
+            values.sort()
+            per_kind[kind] = {
+                "n": len(values),
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+            }
+        user_data = self.app.user_data
+        return {
+            "users": self.args.users,
+            "flows_done": self.flows_done,
+            "flows_failed": self.flows_failed,
+            "unanswered": dict(self.unanswered),
+            "exceptions": len(errors),
+            "updates": len(everything),
+            "elapsed_s": elapsed,
+            "updates_per_s": len(everything) / elapsed if elapsed else 0.0,
+            "p50": percentile(everything, 0.50),
+            "p95": percentile(everything, 0.95),
+            "p99": percentile(everything, 0.99),
+            "per_kind": per_kind,
+            "rss_delta_per_user_kb": (rss_after - rss_before) / self.args.users / 1024,
+            "user_data_keys_per_user": sum(len(d) for d in user_data.values()) / max(len(user_data), 1),
+            "booking_requests": dict(self.booking.requests),
+            "telegram_requests": dict(self.telegram.calls),
+            "telegram_flooded": self.telegram.flooded,
+            "send_queue": send_scheduler.stats(),
+            "first_error": repr(errors[0]) if errors else None,
+        }
+
+
+def print_report(r: dict):
+    ms = 1000
+    print(f"\n{r['users']} users, {r['updates']} updates in {r['elapsed_s']:.1f}s "
+          f"-> {r['updates_per_s']:.0f} updates/s")
+    print(f"flows: {r['flows_done']} done, {r['flows_failed']} failed, {r['exceptions']} raised")
+    if r["unanswered"]:
+        print(f"never answered (not timed): {r['unanswered']}")
+    print(f"latency: p50 {r['p50'] * ms:.1f} ms  p95 {r['p95'] * ms:.1f} ms  p99 {r['p99'] * ms:.1f} ms")
+    print(f"memory: {r['rss_delta_per_user_kb']:.1f} KiB RSS per user, "
+          f"{r['user_data_keys_per_user']:.1f} user_data keys per user")
+    print(f"\n{'update':<14}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, s in r["per_kind"].items():
+        print(f"{kind:<14}{s['n']:>8}{s['p50'] * ms:>10.1f}{s['p95'] * ms:>10.1f}{s['p99'] * ms:>10.1f}")
+    print(f"\nBooking API calls: {r['booking_requests']}")
+    print(f"Bot API calls: {r['telegram_requests']}")
+    sq = r["send_queue"]
+    print(f"send queue: sent {sq['sent']}, {r['telegram_flooded']} flood-control answers, "
+          f"{sq['retried']} retried, {sq['failed']} gave up")
+    if r["first_error"]:
+        print(f"first error: {r['first_error']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test of the hotel bot")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--flows", default=",".join(FLOWS), help="comma separated subset of " + ",".join(FLOWS))
+    parser.add_argument("--concurrency", type=int, default=bot_main.UPDATE_CONCURRENCY,
+                        help="updates processed in parallel by the bot")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which users arrive")
+    parser.add_argument("--think", type=float, default=0.5, help="max pause between a user's actions, s")
+    parser.add_argument("--taps", type=int, default=8, help="max Next taps per user")
+    parser.add_argument("--detail-rate", type=float, default=0.3, help="share of users opening photos / info")
+    parser.add_argument("--history-rate", type=float, default=0.2, help="share of users opening /history")
+    parser.add_argument("--booking-latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hotels-per-page", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--telegram-latency", type=float, default=0.03)
+    parser.add_argument("--telegram-jitter", type=float, default=0.02)
+    parser.add_argument("--telegram-flood-limit", type=int, default=0,
+                        help="fake Telegram answers 429 past this many messages per chat per second, 0 = never")
+    parser.add_argument("--keep-chats", action="store_true", help="keep sent messages in the fake (costs memory)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--max-p95", type=float, help="fail if overall p95 exceeds this many seconds")
+    parser.add_argument("--max-p99", type=float, help="fail if overall p99 exceeds this many seconds")
+    args = parser.parse_args(argv)
+    args.flows = [f for f in args.flows.split(",") if f in FLOWS] or list(FLOWS)
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        report = asyncio.run(LoadTest(args).run())
+    finally:
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    return check_limits(report, args.max_p95, args.max_p99)
+
+
+def check_limits(report: dict, max_p95: float | None, max_p99: float | None) -> int:
+    """Exit code: 1 (and a REGRESSION line) when a latency limit is exceeded."""
+    failed = []
+    if max_p95 is not None and report["p95"] > max_p95:
+        failed.append(f"p95 {report['p95']:.3f}s > {max_p95}s")
+    if max_p99 is not None and report["p99"] > max_p99:
+        failed.append(f"p99 {report['p99']:.3f}s > {max_p99}s")
+    if failed:
+        print("REGRESSION: " + ", ".join(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
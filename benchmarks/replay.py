@@ -0,0 +1,222 @@
+"""
+Replay a recorded traffic log (REPLAY_LOG, see services/replay_log.py)
+through the current handlers, offline.
+
+    python -m benchmarks.replay replay.jsonl.gz                 # original pacing
+    python -m benchmarks.replay replay.jsonl.gz --speed 4       # 4x faster
+    python -m benchmarks.replay replay.jsonl.gz --speed 0       # as fast as possible
+
+Updates are fed to the application in recorded order through the update
+processor, Booking API requests are answered from the recorded responses
+(with their recorded latency unless --no-upstream-latency) and Telegram by
+fakes/telegram.py. The report puts replayed handling latency next to the
+recorded one; --json / --max-p95 / --max-p99 work as in benchmarks.load_test,
+so two versions can be compared on the same traffic.
+"""
+import argparse
+import asyncio
+import json
+import shutil
+import sys
+import time
+from collections import deque
+
+import httpx
+
+# first: sets up the same throwaway environment (temp db, no metrics port)
+from benchmarks.load_test import TMP_DIR, percentile, check_limits
+from telegram import Update
+
+import main as bot_main
+from database.init_db import init_db
+from fakes.telegram import FakeTelegram
+from services import booking_api
+from services.replay_log import read_log
+
+
+def update_kind(update: dict) -> str:
+    """Short label for reports: command name, "text", or the callback prefix."""
+    if "callback_query" in update:
+        data = update["callback_query"].get("data") or ""
+        if data.startswith("cbcal_"):
+            return "calendar"
+        return data.split("|", 1)[0] or "callback"
+    text = (update.get("message") or {}).get("text") or ""
+    if text.startswith("/"):
+        return text.split()[0].split("@")[0]
+    return "text" if text else "other"
+
+
+def _request_key(path: str, params: dict) -> tuple:
+    return path, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+class RecordedBookingAPI:
+    """Answers each (path, params) with its recorded responses in order; the last one repeats."""
+
+    def __init__(self, latency: bool = True):
+        self.latency = latency
+        self._responses: dict[tuple, deque] = {}
+        self.served = 0
+        self.misses = 0
+
+    def add(self, record: dict):
+        self._responses.setdefault(_request_key(record["path"], record["params"]), deque()).append(record)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        queue = self._responses.get(_request_key(request.url.path, dict(request.url.params)))
+        if not queue:
+            # the new version asks for something the recorded one didn't
+            self.misses += 1
+            return httpx.Response(404, json={"message": "not in replay log"})
+        record = queue.popleft() if len(queue) > 1 else queue[0]
+        self.served += 1
+        if self.latency and record["dur"]:
+            await asyncio.sleep(record["dur"])
+        if record.get("error"):
+            raise httpx.ReadTimeout(f"recorded {record['error']}", request=request)
+        return httpx.Response(record["status"], text=record["body"],
+                              headers={"content-type": "application/json"})
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+
+def load(path: str, upstream: RecordedBookingAPI) -> tuple[list, dict]:
+    """-> ([(start offset s, update dict)], {update_id: recorded handling s})"""
+    updates, recorded = [], {}
+    first_wall = session_wall = None
+    for record in read_log(path):
+        kind = record.get("type")
+        if kind == "start":
+            session_wall = record["wall"]
+            if first_wall is None:
+                first_wall = session_wall
+        elif kind == "update":
+            offset = (session_wall or 0) - (first_wall or 0) + record["t"]
+            updates.append((offset, record["update"]))
+        elif kind == "handled":
+            recorded[record["update_id"]] = record["dur"]
+        elif kind == "booking":
+            upstream.add(record)
+    return updates, recorded
+
+
+class Replay:
+    def __init__(self, args):
+        self.args = args
+        self.upstream = RecordedBookingAPI(latency=not args.no_upstream_latency)
+        self.telegram = FakeTelegram(latency=args.telegram_latency)
+        self.latencies: dict[str, list[float]] = {}
+        self.app = None
+
+    async def send(self, kind: str, update: Update):
+        started = time.perf_counter()
+        await self.app.update_processor.process_update(update, self.app.process_update(update))
+        self.latencies.setdefault(kind, []).append(time.perf_counter() - started)
+
+    async def run(self) -> dict:
+        args = self.args
+        updates, recorded = load(args.log, self.upstream)
+        if not updates:
+            raise SystemExit(f"{args.log}: no updates recorded")
+
+        init_db()
+        booking_api.use_transport(self.upstream.transport())
+        self.app = bot_main.build_application(args.concurrency, request=self.telegram)
+        await self.app.initialize()
+        await bot_main.on_startup(self.app)
+        await self.app.start()
+
+        started = time.perf_counter()
+        tasks = []
+        for offset, data in updates:
+            if args.speed > 0:
+                delay = offset / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            update = Update.de_json(data, self.app.bot)
+            # tasks start in log order, so per-chat order is kept by the update processor
+            tasks.append(asyncio.ensure_future(self.send(update_kind(data), update)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        await self.app.stop()
+        await self.app.shutdown()
+        await bot_main.on_shutdown(self.app)
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        replayed = sorted(v for values in self.latencies.values() for v in values)
+        original = sorted(recorded.values())
+        return {
+            "log": args.log,
+            "updates": len(replayed),
+            "exceptions": len(errors),
+            "elapsed_s": elapsed,
+            "recorded_span_s": updates[-1][0] - updates[0][0],
+            "updates_per_s": len(replayed) / elapsed if elapsed else 0.0,
+            "p50": percentile(replayed, 0.50),
+            "p95": percentile(replayed, 0.95),
+            "p99": percentile(replayed, 0.99),
+            "recorded": {
+                "n": len(original),
+                "p50": percentile(original, 0.50),
+                "p95": percentile(original, 0.95),
+                "p99": percentile(original, 0.99),
+            },
+            "per_kind": {
+                kind: {"n": len(v), "p50": percentile(sorted(v), 0.50), "p95": percentile(sorted(v), 0.95)}
+                for kind, v in sorted(self.latencies.items())
+            },
+            "upstream_served": self.upstream.served,
+            "upstream_misses": self.upstream.misses,
+            "first_error": repr(errors[0]) if errors else None,
+        }
+
+
+def print_report(r: dict):
+    ms = 1000
+    rec = r["recorded"]
+    print(f"\n{r['updates']} updates replayed in {r['elapsed_s']:.1f}s "
+          f"(recorded over {r['recorded_span_s']:.1f}s) -> {r['updates_per_s']:.0f} updates/s")
+    print(f"{'':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    print(f"{'replayed':<10}{r['p50'] * ms:>10.1f}{r['p95'] * ms:>10.1f}{r['p99'] * ms:>10.1f}")
+    if rec["n"]:
+        print(f"{'recorded':<10}{rec['p50'] * ms:>10.1f}{rec['p95'] * ms:>10.1f}{rec['p99'] * ms:>10.1f}")
+    print(f"\n{'update':<16}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for kind, s in r["per_kind"].items():
+        print(f"{kind:<16}{s['n']:>8}{s['p50'] * ms:>10.1f}{s['p95'] * ms:>10.1f}")
+    print(f"\nBooking API: {r['upstream_served']} answered from the log, {r['upstream_misses']} not recorded")
+    if r["exceptions"]:
+        print(f"{r['exceptions']} updates raised, first: {r['first_error']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded traffic log against the current code")
+    parser.add_argument("log", help="file written with REPLAY_LOG (.jsonl or .jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="pacing factor, 0 = as fast as possible")
+    parser.add_argument("--no-upstream-latency", action="store_true",
+                        help="answer Booking API requests immediately instead of after the recorded time")
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=bot_main.UPDATE_CONCURRENCY)
+    parser.add_argument("--json", help="write the report here")
+    parser.add_argument("--max-p95", type=float, help="fail if replayed p95 exceeds this many seconds")
+    parser.add_argument("--max-p99", type=float, help="fail if replayed p99 exceeds this many seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        report = asyncio.run(Replay(args).run())
+    finally:
+        shutil.rmtree(TMP_DIR, ignore_errors=True)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return check_limits(report, args.max_p95, args.max_p99)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,52 @@
-from peewee import SqliteDatabase
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-db = SqliteDatabase("hotel_bot.db")
+from playhouse.db_url import connect
+
+from config import DATABASE_URL, DB_WORKERS
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "wal",      # readers don't block the writer
+    "synchronous": "normal",    # safe with WAL, far fewer fsyncs
+    "cache_size": -16000,       # 16 MB page cache
+    "busy_timeout": 5000,       # ms to wait on a locked db instead of failing
+    "foreign_keys": 1,
+}
+
+# sqlite:///hotel_bot.db by default; postgres+pool://... etc. for multi-instance setups
+if DATABASE_URL.startswith("sqlite"):
+    db = connect(DATABASE_URL, pragmas=SQLITE_PRAGMAS)
+else:
+    db = connect(DATABASE_URL)
+
+# Queries run here, never on the event loop. peewee keeps one connection per
+# thread, so each worker opens its connection once and reuses it.
+_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db")
+
+# hook(seconds, name) after every run_db call; services/instrumentation.py feeds it to the metrics
+_timing_hook = None
+
+
+def set_timing_hook(hook):
+    global _timing_hook
+    _timing_hook = hook
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run a blocking peewee call in the db executor and await the result."""
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        return await loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+    finally:
+        if _timing_hook is not None:
+            # includes waiting for a free db worker
+            _timing_hook(time.perf_counter() - started, getattr(fn, "__qualname__", "call"))
+
+
+def shutdown_db():
+    _executor.shutdown(wait=True)
+    if not db.is_closed():
+        db.close()
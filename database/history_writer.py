@@ -0,0 +1,105 @@
+"""
+Write-behind queue for SearchHistory.
+
+Handlers call history_writer.add(...) and move on; a background task groups
+rows into one transaction per HISTORY_BATCH_SIZE rows or HISTORY_FLUSH_INTERVAL
+seconds, whichever comes first.
+"""
+import asyncio
+import logging
+
+from config import HISTORY_BATCH_SIZE, HISTORY_FLUSH_INTERVAL
+from database.db import db, run_db
+from database.models import SearchHistory, SearchHistoryPayload
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class HistoryWriter:
+    def __init__(self, batch_size: int = HISTORY_BATCH_SIZE, flush_interval: float = HISTORY_FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.batches = 0
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="history_writer")
+
+    async def stop(self):
+        """Flush everything still queued, then stop the task."""
+        if self._task is None:
+            return
+        # a sentinel instead of task.cancel(): wait_for() on 3.11 can swallow a
+        # cancellation that lands while a row arrives, and stop() would hang
+        self._queue.put_nowait(_STOP)
+        await self._task
+        self._task = None
+
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await self._flush(batch)
+
+    def queue_size(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def add(self, row: dict, hotels: list):
+        """
+        Queue one completed search. `row` holds SearchHistory fields,
+        `hotels` the HotelRecord list (serialized in the db thread).
+        """
+        if self._queue is None:
+            logger.warning("History writer is not running, search not recorded")
+            return
+        self._queue.put_nowait((row, hotels))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        try:
+            await run_db(_write_batch, batch)
+        except Exception:
+            logger.exception("Failed to write %d history rows", len(batch))
+            return
+        self.written += len(batch)
+        self.batches += 1
+
+
+def _write_batch(batch: list):
+    packed = [(row, SearchHistoryPayload.pack([h.to_dict() for h in hotels])) for row, hotels in batch]
+    with db.atomic():
+        payloads = []
+        for row, blob in packed:
+            history_id = SearchHistory.insert(**row).execute()
+            payloads.append({"history": history_id, "hotels": blob})
+        SearchHistoryPayload.insert_many(payloads).execute()
+
+
+history_writer = HistoryWriter()
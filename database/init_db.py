@@ -1,7 +1,51 @@
+import json
+import logging
+
+from playhouse.migrate import SchemaMigrator, migrate
+
 from database.db import db
-from database.models import SearchHistory
+from services.result_store import result_store
+from database.models import SearchHistory, SearchHistoryPayload, ApiCache, ResultRow, HotelDetails, SessionData
+
+logger = logging.getLogger(__name__)
+
+
+def migrate_history_payloads(batch_size: int = 500):
+    """
+    Old hotel_bot.db files keep the hotels list in searchhistory.hotels_json.
+    Move it into compressed SearchHistoryPayload rows and drop the column.
+    """
+    table = SearchHistory._meta.table_name
+    columns = {c.name for c in db.get_columns(table)}
+    if "hotels_json" not in columns:
+        return
+
+    logger.info("Migrating %s.hotels_json to %s", table, SearchHistoryPayload._meta.table_name)
+    p = db.param
+    last_id = 0
+    while True:
+        rows = db.execute_sql(
+            f'SELECT id, hotels_json FROM "{table}" WHERE id > {p} ORDER BY id LIMIT {p}',
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            break
+        payloads = [
+            {"history": row_id, "hotels": SearchHistoryPayload.pack(json.loads(hotels_json or "[]"))}
+            for row_id, hotels_json in rows
+        ]
+        with db.atomic():
+            SearchHistoryPayload.insert_many(payloads).on_conflict_ignore().execute()
+        last_id = rows[-1][0]
+
+    with db.atomic():
+        migrate(SchemaMigrator.from_database(db).drop_column(table, "hotels_json"))
+
 
 def init_db():
     db.connect(reuse_if_open=True)
-    db.create_tables([SearchHistory])
+    db.create_tables([SearchHistory, SearchHistoryPayload, ApiCache, ResultRow, HotelDetails, SessionData])
+    migrate_history_payloads()
+    # spilled session result sets from previous runs
+    result_store.purge_expired()
     db.close()
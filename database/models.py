@@ -1,4 +1,10 @@
-from peewee import Model, AutoField, IntegerField, TextField, DateTimeField
+import json
+import zlib
+
+from peewee import (
+    Model, AutoField, IntegerField, TextField, DateTimeField, FloatField, CompositeKey,
+    BlobField, ForeignKeyField,
+)
 from datetime import datetime
 from database.db import db
 
@@ -19,4 +25,59 @@ class SearchHistory(BaseModel):
     max_price = TextField(null=True)
     created_at = DateTimeField(default=datetime.utcnow)
 
-    hotels_json = TextField()      # store full hotels list as JSON string
+    class Meta:
+        # /history: WHERE user_id = ? ORDER BY created_at DESC LIMIT 10
+        indexes = ((("user_id", "created_at"), False),)
+
+
+class SearchHistoryPayload(BaseModel):
+    """Hotels of one search, kept apart so listing /history never reads them."""
+    history = ForeignKeyField(SearchHistory, primary_key=True, backref="payload", on_delete="CASCADE")
+    hotels = BlobField()           # zlib-compressed JSON list of HotelRecord dicts
+
+    @staticmethod
+    def pack(hotel_dicts: list[dict]) -> bytes:
+        return zlib.compress(json.dumps(hotel_dicts, separators=(",", ":")).encode("utf-8"), 6)
+
+    def unpack(self) -> list[dict]:
+        return json.loads(zlib.decompress(bytes(self.hotels)).decode("utf-8"))
+
+
+class ApiCache(BaseModel):
+    key = TextField(primary_key=True)   # "<namespace>:<normalized key>"
+    value = TextField()                 # JSON
+    expires_at = FloatField(index=True) # unix time
+
+
+class ResultRow(BaseModel):
+    """One hotel of a spilled session result set (see services/result_store.py)."""
+    result_id = TextField()
+    position = IntegerField()
+    data = TextField()                  # HotelRecord.to_dict() as JSON
+    created_at = FloatField(index=True) # unix time
+
+    class Meta:
+        primary_key = CompositeKey("result_id", "position")
+
+
+class HotelDetails(BaseModel):
+    """Persistent description cache (see services/hotel_details.py)."""
+    hotel_id = TextField()
+    languagecode = TextField()
+    description = TextField()           # already extracted + truncated
+    fetched_at = FloatField()           # unix time, for the TTL
+    last_used = FloatField(index=True)  # unix time, for LRU eviction
+
+    class Meta:
+        primary_key = CompositeKey("hotel_id", "languagecode")
+
+
+class SessionData(BaseModel):
+    """PTB user/chat/bot data and conversation states (see database/persistence.py)."""
+    kind = TextField()                  # "user" / "chat" / "bot" / "conv:<name>"
+    key = TextField()
+    value = BlobField()                 # JSON, maybe zlib-compressed
+    updated_at = FloatField()
+
+    class Meta:
+        primary_key = CompositeKey("kind", "key")
@@ -0,0 +1,216 @@
+"""
+PTB persistence for user/chat/bot data and ConversationHandler states.
+
+SessionPersistence speaks PTB's BasePersistence API and keeps the data in a
+SessionStore. PeeweeSessionStore uses the bot database (DATABASE_URL), so
+chats pick up where they left off after a restart. Another backend (Redis,
+...) only has to implement SessionStore.
+
+Values are stored as JSON (dates in user_data are tagged and restored) and
+compressed when large; nothing read back is ever unpickled. Rows written as
+pickles by earlier versions are skipped, so those sessions start over once.
+PTB only hands over the users/chats touched since the last flush, so writes
+are incremental; each one is a single upsert.
+
+Scope: sessions survive a restart of one bot process. This is not a store
+for several workers behind a load balancer: PTB reads conversation states
+once at startup and the search result sets live in services/result_store.py's
+memory, so two bot processes on one database would each work from their own
+stale copy. Run one bot process per token.
+"""
+import json
+import logging
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import date, datetime
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import PERSISTENCE_FLUSH_INTERVAL
+from database.db import db, run_db
+from database.models import SessionData
+
+logger = logging.getLogger(__name__)
+
+_COMPRESS_OVER = 512   # bytes
+_ZLIB = b"Z"
+_RAW = b"J"
+# b"z" / b"p" were zlib / plain pickles: never loaded
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, (set, tuple)):
+        return list(value)
+    raise TypeError(f"{type(value).__name__} can't be stored in a session")
+
+
+def _decode(obj: dict):
+    if len(obj) == 1:
+        if "__date__" in obj:
+            return date.fromisoformat(obj["__date__"])
+        if "__datetime__" in obj:
+            return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+def dumps(value) -> bytes:
+    data = json.dumps(value, default=_encode, separators=(",", ":")).encode("utf-8")
+    if len(data) > _COMPRESS_OVER:
+        return _ZLIB + zlib.compress(data, 6)
+    return _RAW + data
+
+
+def loads(blob: bytes):
+    """The stored value, or None for a row in an older format."""
+    blob = bytes(blob)
+    if blob[:1] == _ZLIB:
+        data = zlib.decompress(blob[1:])
+    elif blob[:1] == _RAW:
+        data = blob[1:]
+    else:
+        return None
+    return json.loads(data, object_hook=_decode)
+
+
+class SessionStore(ABC):
+    """Blocking key-value store: (kind, key) -> bytes. Called from the db executor."""
+
+    @abstractmethod
+    def load_all(self, kind: str) -> dict[str, bytes]: ...
+
+    @abstractmethod
+    def load(self, kind: str, key: str) -> bytes | None: ...
+
+    @abstractmethod
+    def save(self, kind: str, key: str, value: bytes): ...
+
+    @abstractmethod
+    def delete(self, kind: str, key: str): ...
+
+
+class PeeweeSessionStore(SessionStore):
+    def load_all(self, kind: str) -> dict[str, bytes]:
+        query = SessionData.select(SessionData.key, SessionData.value).where(SessionData.kind == kind)
+        return {row.key: row.value for row in query}
+
+    def load(self, kind: str, key: str) -> bytes | None:
+        row = SessionData.get_or_none((SessionData.kind == kind) & (SessionData.key == key))
+        return row.value if row else None
+
+    def save(self, kind: str, key: str, value: bytes):
+        with db.atomic():
+            (SessionData
+             .insert(kind=kind, key=key, value=value, updated_at=time.time())
+             .on_conflict(conflict_target=[SessionData.kind, SessionData.key],
+                          update={SessionData.value: value, SessionData.updated_at: time.time()})
+             .execute())
+
+    def delete(self, kind: str, key: str):
+        SessionData.delete().where((SessionData.kind == kind) & (SessionData.key == key)).execute()
+
+
+class SessionPersistence(BasePersistence):
+    USER, CHAT, BOT = "user", "chat", "bot"
+
+    def __init__(self, store: SessionStore | None = None, update_interval: float = PERSISTENCE_FLUSH_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.store = store or PeeweeSessionStore()
+        # last stored value per (kind, key): unchanged data is not written again
+        self._written: dict[tuple[str, str], bytes] = {}
+        self.writes = 0
+        self.skipped_writes = 0
+
+    # ----- helpers -----
+
+    async def _load_all(self, kind: str) -> dict:
+        rows = await run_db(self.store.load_all, kind)
+        self._written.update({(kind, k): bytes(v) for k, v in rows.items()})
+        values = {k: loads(v) for k, v in rows.items()}
+        stale = [k for k, v in values.items() if v is None]
+        if stale:
+            logger.info("Skipping %d %s session rows in an older format", len(stale), kind)
+        return {k: v for k, v in values.items() if v is not None}
+
+    async def _save(self, kind: str, key, value):
+        key = str(key)
+        blob = dumps(value)
+        if self._written.get((kind, key)) == blob:
+            self.skipped_writes += 1
+            return
+        await run_db(self.store.save, kind, key, blob)
+        self._written[(kind, key)] = blob
+        self.writes += 1
+
+    # ----- user / chat / bot data -----
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return defaultdict(dict, {int(k): v for k, v in (await self._load_all(self.USER)).items()})
+
+    async def get_chat_data(self) -> dict[int, dict]:
+        return defaultdict(dict, {int(k): v for k, v in (await self._load_all(self.CHAT)).items()})
+
+    async def get_bot_data(self) -> dict:
+        return (await self._load_all(self.BOT)).get("bot", {})
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self._save(self.USER, user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        await self._save(self.CHAT, chat_id, data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        await self._save(self.BOT, "bot", data)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await run_db(self.store.delete, self.USER, str(user_id))
+        self._written.pop((self.USER, str(user_id)), None)
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        await run_db(self.store.delete, self.CHAT, str(chat_id))
+        self._written.pop((self.CHAT, str(chat_id)), None)
+
+    # this process is the only writer (see the module docstring): memory is never stale
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # ----- conversations -----
+
+    async def get_conversations(self, name: str) -> dict:
+        states = await self._load_all(f"conv:{name}")
+        return {tuple(json.loads(k)): v for k, v in states.items()}
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        kind, key = f"conv:{name}", json.dumps(list(key))
+        if new_state is None:
+            await run_db(self.store.delete, kind, key)
+            self._written.pop((kind, key), None)
+        else:
+            await self._save(kind, key, new_state)
+
+    # ----- callback data (not used by this bot) -----
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # every update_* call is already written through
+        pass
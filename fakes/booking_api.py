@@ -0,0 +1,191 @@
+"""
+Local stand-in for the booking-com15 RapidAPI endpoints used by the bot.
+
+Responses are built from fixtures/booking.json (same shape as the real API,
+searchHotels pages are generated deterministically per dest_id/page), with
+configurable latency and error injection.
+
+In-process (httpx transport, no sockets):
+
+    fake = FakeBookingAPI(latency=0.05, error_rate=0.1)
+    booking_api.use_transport(fake.transport())
+
+As a local HTTP server (then set BOOKING_BASE_URL=http://127.0.0.1:8081):
+
+    python -m fakes.booking_api --port 8081 --latency 0.2 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import zlib
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qsl
+
+import httpx
+
+FIXTURES = Path(__file__).parent / "fixtures" / "booking.json"
+
+
+class FakeBookingAPI:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503, timeout_rate: float = 0.0,
+                 hotels_per_page: int = 20, pages: int = 5, fixtures: Path = FIXTURES, seed: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate      # requests that hang for 60 s
+        self.hotels_per_page = hotels_per_page
+        self.pages = pages
+        self.fixtures = json.loads(fixtures.read_text(encoding="utf-8"))
+        self._rnd = random.Random(seed)
+        self.requests: dict[str, int] = {}   # endpoint -> calls served
+
+    # ----- responses -----
+
+    async def respond(self, path: str, params: dict) -> tuple[int, dict]:
+        endpoint = path.rsplit("/", 1)[-1]
+        self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+        delay = self.latency + self._rnd.uniform(0, self.jitter)
+        if self.timeout_rate and self._rnd.random() < self.timeout_rate:
+            delay = 60.0
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._rnd.random() < self.error_rate:
+            return self.error_status, {"message": "injected upstream error"}
+
+        handler = getattr(self, f"_{endpoint}", None)
+        if handler is None:
+            return 404, {"message": f"Endpoint '{path}' does not exist"}
+        return 200, handler(params)
+
+    def _searchDestination(self, params: dict) -> dict:
+        query = (params.get("query") or "").strip().casefold()
+        items = [d for d in self.fixtures["destinations"]
+                 if query and (query in d["name"].casefold() or query in d["label"].casefold())]
+        return {"status": True, "message": "Success", "data": items}
+
+    def _searchHotels(self, params: dict) -> dict:
+        page = int(params.get("page_number") or 1)
+        if page > self.pages:
+            return {"status": True, "data": {"hotels": []}}
+        dest_id = params.get("dest_id", "")
+        dest = next((d for d in self.fixtures["destinations"] if d["dest_id"] == dest_id),
+                    self.fixtures["destinations"][0])
+        rnd = random.Random(f"{dest_id}:{page}")
+        hotels = [
+            self._hotel(rnd, dest, (page - 1) * self.hotels_per_page + i, params)
+            for i in range(self.hotels_per_page)
+        ]
+        return {"status": True, "message": "Success", "data": {"hotels": hotels}}
+
+    def _hotel(self, rnd: random.Random, dest: dict, n: int, params: dict) -> dict:
+        name = f"{self.fixtures['hotel_names'][n % len(self.fixtures['hotel_names'])]} {dest['name']} {n}"
+        price = round(rnd.uniform(40, 600), 2)
+        score = round(rnd.uniform(5.5, 9.8), 1)
+        reviews = rnd.randint(3, 6000)
+        distance = round(rnd.uniform(0.1, 15), 1)
+        lat = dest["latitude"] + rnd.uniform(-0.12, 0.12)
+        lon = dest["longitude"] + rnd.uniform(-0.18, 0.18)
+        word = self.fixtures["review_words"].get(str(int(score)), "Good")
+        label = (f"{name}.‎ {score} {word} {reviews} reviews.‬\n"
+                 f"‎{distance} km from downtown‬\n"
+                 f"Current price {price:.0f} USD.")
+        return {
+            "hotel_id": zlib.crc32(f"{dest['dest_id']}:{n}".encode()) % 10_000_000,
+            "accessibilityLabel": label,
+            "property": {
+                "name": name,
+                "latitude": round(lat, 6),
+                "longitude": round(lon, 6),
+                "reviewScore": score,
+                "reviewScoreWord": word,
+                "reviewCount": reviews,
+                "checkinDate": params.get("arrival_date", ""),
+                "checkoutDate": params.get("departure_date", ""),
+                "priceBreakdown": {"grossPrice": {"value": price, "currency": "USD"}},
+            },
+        }
+
+    def _getHotelPhotos(self, params: dict) -> dict:
+        hotel_id = params.get("hotel_id", "")
+        photos = [{**p, "url": p["url"].replace(".jpg", f"_{hotel_id}.jpg")} for p in self.fixtures["photos"]]
+        return {"status": True, "message": "Success", "data": {"photos": photos}}
+
+    def _getDescriptionAndInfo(self, params: dict) -> dict:
+        return {"status": True, "message": "Success",
+                "data": {"description": self.fixtures["description"], "hotel_id": params.get("hotel_id")}}
+
+    # ----- adapters -----
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        status, body = await self.respond(request.url.path, dict(request.url.params))
+        return httpx.Response(status, json=body)
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8081) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # minimal HTTP/1.1 with keep-alive: GET only, no request bodies
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                _, target, _ = request_line.decode("latin-1").split(" ", 2)
+                keep_alive = True
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    if header.lower().startswith(b"connection:") and b"close" in header.lower():
+                        keep_alive = False
+
+                url = urlsplit(target)
+                status, body = await self.respond(url.path, dict(parse_qsl(url.query)))
+                payload = json.dumps(body).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake booking-com15 API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="base delay per request, s")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay up to, s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang")
+    args = parser.parse_args()
+
+    fake = FakeBookingAPI(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                          error_status=args.error_status, timeout_rate=args.timeout_rate)
+
+    async def run():
+        server = await fake.serve(args.host, args.port)
+        print(f"Fake Booking API on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+In-process stand-in for the Telegram Bot API.
+
+Plugs into python-telegram-bot as its request object, answers the methods
+the bot uses with plausible payloads and remembers what was sent to every
+chat, so simulated users can read the last reply and press its buttons:
+
+    fake = FakeTelegram(latency=0.02)
+    app = build_application(request=fake)
+    ...
+    fake.last_message(chat_id)["reply_markup"]
+
+With flood_limit, a chat sent more than that many messages within a second
+gets a 429 with retry_after, like Telegram's flood control.
+
+expect() returns a future for the next call of some methods to a chat, for
+timing what a user waits for rather than when the handler returned:
+
+    shown = fake.expect(chat_id, ("editMessageText",))
+    ... process the tap ...
+    await shown
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import deque
+
+from telegram.request import BaseRequest, RequestData
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "HotelBot", "username": "hotel_search_bot"}
+
+
+class FakeTelegram(BaseRequest):
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 1,
+                 flood_limit: int = 0, retry_after: int = 1):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate          # answered with 500, PTB raises NetworkError
+        self._rnd = random.Random(seed)
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self.chats: dict[int, dict[int, dict]] = {}    # chat_id -> message_id -> message
+        self.calls: dict[str, int] = {}                # method -> calls served
+        self.flood_limit = flood_limit
+        self.retry_after = retry_after
+        self._recent: dict[int, deque] = {}            # chat_id -> send times in the last second
+        self.flooded = 0
+        self._waiters: dict[int, list] = {}            # chat_id -> [(methods, since, future)]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> float | None:
+        return None
+
+    # ----- what the simulated users see -----
+
+    def last_message(self, chat_id: int) -> dict | None:
+        messages = self.chats.get(chat_id)
+        if not messages:
+            return None
+        return messages[max(messages)]
+
+    def last_with_button(self, chat_id: int, prefix: str) -> tuple[dict, str] | None:
+        """Newest message that has a button whose callback_data starts with prefix."""
+        for message_id in sorted(self.chats.get(chat_id, {}), reverse=True):
+            message = self.chats[chat_id][message_id]
+            for row in (message.get("reply_markup") or {}).get("inline_keyboard", []):
+                for button in row:
+                    if str(button.get("callback_data", "")).startswith(prefix):
+                        return message, button["callback_data"]
+        return None
+
+    def forget(self, chat_id: int):
+        self.chats.pop(chat_id, None)
+
+    def expect(self, chat_id: int, methods) -> asyncio.Future:
+        """Resolved when one of `methods` to chat_id, sent from now on, has been answered."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((frozenset(methods), time.monotonic(), future))
+        return future
+
+    def _answered(self, chat_id: int, method: str, sent_at: float):
+        waiters = self._waiters.get(chat_id)
+        if not waiters:
+            return
+        # a call already under way when the waiter was set up does not count
+        for methods, since, future in waiters:
+            if method in methods and since <= sent_at and not future.done():
+                future.set_result(method)
+        waiters[:] = [w for w in waiters if not w[2].done()]
+        if not waiters:
+            del self._waiters[chat_id]
+
+    # ----- BaseRequest -----
+
+    async def do_request(self, url, method, request_data: RequestData | None = None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None) -> tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        sent_at = time.monotonic()
+        self.calls[api_method] = self.calls.get(api_method, 0) + 1
+        params = request_data.parameters if request_data else {}
+        if isinstance(params.get("reply_markup"), str):
+            # prebuilt JSON keyboards (telegram_bot_calendar) are passed through as strings
+            params["reply_markup"] = json.loads(params["reply_markup"])
+
+        delay = self.latency + self._rnd.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._rnd.random() < self.error_rate:
+            return 500, json.dumps({"ok": False, "error_code": 500, "description": "injected error"}).encode()
+
+        if self._flooding(params):
+            self.flooded += 1
+            return 429, json.dumps({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }).encode()
+
+        handler = getattr(self, f"_{api_method}", None)
+        result = handler(params) if handler else True
+        if "chat_id" in params:
+            self._answered(int(params["chat_id"]), api_method, sent_at)
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+    def _flooding(self, params: dict) -> bool:
+        if not self.flood_limit or "chat_id" not in params:
+            return False
+        now = time.monotonic()
+        recent = self._recent.setdefault(int(params["chat_id"]), deque())
+        while recent and now - recent[0] > 1.0:
+            recent.popleft()
+        if len(recent) >= self.flood_limit:
+            return True
+        recent.append(now)
+        return False
+
+    # ----- methods -----
+
+    def _getMe(self, params: dict) -> dict:
+        return {**BOT_USER, "can_join_groups": True, "can_read_all_group_messages": False,
+                "supports_inline_queries": False}
+
+    def _new_message(self, params: dict, **content) -> dict:
+        chat_id = int(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **content,
+        }
+        self.chats.setdefault(chat_id, {})[message["message_id"]] = message
+        return message
+
+    def _photo(self) -> list[dict]:
+        n = next(self._file_ids)
+        return [{"file_id": f"photo-{n}", "file_unique_id": f"u{n}", "width": 800, "height": 600}]
+
+    def _sendMessage(self, params: dict) -> dict:
+        content = {"text": params.get("text", "")}
+        if params.get("reply_markup"):
+            content["reply_markup"] = params["reply_markup"]
+        return self._new_message(params, **content)
+
+    def _sendPhoto(self, params: dict) -> dict:
+        return self._new_message(params, photo=self._photo())
+
+    def _sendMediaGroup(self, params: dict) -> list[dict]:
+        return [self._new_message(params, photo=self._photo()) for _ in params.get("media", [])]
+
+    def _edit(self, params: dict, **changes) -> dict | bool:
+        chat_id = int(params.get("chat_id", 0))
+        message = self.chats.get(chat_id, {}).get(int(params.get("message_id", 0)))
+        if message is None:
+            return True   # inline message or already forgotten
+        message.update(changes)
+        if "reply_markup" not in params:
+            message.pop("reply_markup", None)
+        else:
+            message["reply_markup"] = params["reply_markup"]
+        message["edit_date"] = int(time.time())
+        return message
+
+    def _editMessageText(self, params: dict):
+        return self._edit(params, text=params.get("text", ""))
+
+    def _editMessageReplyMarkup(self, params: dict):
+        return self._edit(params)
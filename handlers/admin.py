@@ -0,0 +1,99 @@
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+
+from config import ADMIN_IDS
+from database.history_writer import history_writer
+from services import metrics
+from services.cache import all_cache_stats
+from services.destination_index import destination_index
+from services.hotel_details import warm_up_descriptions
+from services.rate_limit import rate_limiter
+from services.send_queue import send_scheduler
+from services.tap_coalescer import tap_coalescer
+
+
+def is_admin(update: Update) -> bool:
+    return bool(update.effective_user) and update.effective_user.id in ADMIN_IDS
+
+
+async def warmup_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        return  # admin commands stay invisible to everyone else
+
+    # /warmup [destinations] [hotels per destination]
+    args = [int(a) for a in (context.args or []) if a.isdigit()]
+    destinations = args[0] if len(args) > 0 else 10
+    per_destination = args[1] if len(args) > 1 else 10
+
+    await update.message.reply_text(
+        f"⏳ Warming up descriptions: top {per_destination} hotels of {destinations} destinations…"
+    )
+
+    async def run():
+        stats = await warm_up_descriptions(destinations, per_destination)
+        await update.message.reply_text(
+            f"✅ Warm-up done: {stats['hotels']} hotels, "
+            f"{stats['fetched']} fetched, {stats['cached']} already cached, {stats['failed']} failed, "
+            f"{stats['skipped']} skipped (low quota)."
+        )
+
+    context.application.create_task(run(), update=update)
+
+
+def _latency_lines(title: str, histogram: metrics.Histogram, label: str, limit: int = 8) -> list[str]:
+    rows = histogram.summary()[:limit]
+    if not rows:
+        return []
+    lines = [f"\n{title} (n / p50 / p95):"]
+    for r in rows:
+        # quantiles are bucket upper bounds, hence "≤"
+        lines.append(f"  {r['labels'].get(label, '?')}: {r['count']} / ≤{r['p50']:g}s / ≤{r['p95']:g}s")
+    return lines
+
+
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        return
+
+    lines = ["📊 Bot stats"]
+    lines += _latency_lines("Handlers", metrics.handler_seconds, "handler")
+    lines += _latency_lines("Booking API", metrics.booking_seconds, "function")
+    lines += _latency_lines("Stages", metrics.stage_seconds, "stage")
+    lines += _latency_lines("Telegram API", metrics.telegram_seconds, "method", limit=5)
+    lines += _latency_lines("Send queue wait", metrics.send_delay_seconds, "priority")
+
+    lines.append("\nCaches (hit rate / size):")
+    for name, s in all_cache_stats().items():
+        lookups = s["hits"] + s["misses"]
+        rate = f"{s['hits'] / lookups:.0%}" if lookups else "-"
+        lines.append(f"  {name}: {rate} / {s['size']}/{s['maxsize']}")
+
+    if destination_index is not None:
+        ix = destination_index.stats()
+        lookups = ix["hits"] + ix["misses"]
+        rate = f"{ix['hits'] / lookups:.0%}" if lookups else "-"
+        lines.append(f"  destination index: {rate} / {ix['destinations']} places")
+
+    rl = rate_limiter.stats()
+    lines.append(
+        f"\nQueues: rapidapi {rl['queue_depth']}, history {history_writer.queue_size()}, "
+        f"updates {context.application.update_queue.qsize()}"
+    )
+    lines.append(f"RapidAPI quota left: {rl['quota_remaining']}, avg wait {rl['wait_avg']:.2f}s")
+    sq = send_scheduler.stats()
+    lines.append(
+        "Telegram send queue: " + ", ".join(f"{k} {v}" for k, v in sq["queued"].items())
+        + f"; flood retries {sq['retried']}, gave up {sq['failed']}"
+    )
+    lines.append(f"Unchanged edits skipped: {metrics.edits_skipped.total():g}")
+    taps = tap_coalescer.stats()
+    lines.append(f"Card taps: {taps['taps']} -> {taps['renders']} renders, {taps['duplicates']} duplicate fetches dropped")
+
+    await update.message.reply_text("\n".join(lines))
+
+
+def build_admin_handlers():
+    return [
+        CommandHandler("warmup", warmup_cmd),
+        CommandHandler("stats", stats_cmd),
+    ]
@@ -1,37 +1,48 @@
-import json
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
 
-from database.db import db
-from database.models import SearchHistory
+from database.db import run_db
+from database.models import SearchHistory, SearchHistoryPayload
+from keyboards.history import history_keyboard
 from keyboards.pagination import hotel_nav_keyboard
-from utils.formatting import format_hotel
+from services.result_store import result_store
+from services.prefetch import prefetcher
+from services.send_queue import BULK, send_priority
+from utils.hotel_record import HotelRecord
+
+
+def _last_searches(user_id: int, limit: int = 10) -> list[SearchHistory]:
+    # listing only needs these columns, served from the (user_id, created_at) index
+    return list(SearchHistory
+                .select(SearchHistory.id, SearchHistory.created_at, SearchHistory.command, SearchHistory.city)
+                .where(SearchHistory.user_id == user_id)
+                .order_by(SearchHistory.created_at.desc())
+                .limit(limit))
+
+
+def _load_search(hist_id: int, user_id: int):
+    r = SearchHistory.get_or_none((SearchHistory.id == hist_id) & (SearchHistory.user_id == user_id))
+    if not r:
+        return None, []
+    payload = SearchHistoryPayload.get_or_none(SearchHistoryPayload.history == hist_id)
+    if not payload:
+        return r, []
+    return r, [HotelRecord.from_dict(h) for h in payload.unpack()]
 
 
 async def history_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
-    db.connect(reuse_if_open=True)
-    rows = (SearchHistory
-            .select()
-            .where(SearchHistory.user_id == user_id)
-            .order_by(SearchHistory.created_at.desc())
-            .limit(10))
-    rows = list(rows)
-    db.close()
+    rows = await run_db(_last_searches, user_id)
 
     if not rows:
         await update.message.reply_text("History is empty. Run /lowprice first.")
         return
 
-    buttons = []
-    for r in rows:
-        label = f"{r.created_at.strftime('%Y-%m-%d %H:%M')} | {r.command} | {r.city}"
-        buttons.append([InlineKeyboardButton(label, callback_data=f"hist_open|{r.id}")])
-
+    entries = [(r.id, f"{r.created_at.strftime('%Y-%m-%d %H:%M')} | {r.command} | {r.city}") for r in rows]
     await update.message.reply_text(
         "🕘 Your last searches (choose one):",
-        reply_markup=InlineKeyboardMarkup(buttons)
+        reply_markup=history_keyboard(entries)
     )
 
 
@@ -46,28 +57,28 @@ async def history_open_callback(update: Update, context: ContextTypes.DEFAULT_TY
 
     hist_id = int(data[1])
 
-    db.connect(reuse_if_open=True)
-    r = SearchHistory.get_or_none(SearchHistory.id == hist_id)
-    db.close()
+    r, hotels = await run_db(_load_search, hist_id, update.effective_user.id)
 
-    if not r:
+    if not r or not hotels:
         await query.edit_message_text("History item not found.")
         return
 
-    hotels = json.loads(r.hotels_json)
-
     # put hotels into current session so your existing pagination works
-    context.user_data["hotels"] = hotels
+    await result_store.drop(context.user_data.get("result_id"))
+    context.user_data["result_id"] = await result_store.put(hotels)
     context.user_data["hotel_index"] = 0
 
     await query.edit_message_text(
         f"✅ Loaded history:\n{r.command} | {r.city} | {r.checkin}→{r.checkout}\n\n"
         "Showing first hotel:",
     )
-    await query.message.reply_text(
-        format_hotel(hotels[0]),
-        reply_markup=hotel_nav_keyboard(0, len(hotels))
-    )
+    # a reloaded search may wait behind other chats' taps
+    with send_priority(BULK):
+        await query.message.reply_text(
+            hotels[0].card,
+            reply_markup=hotel_nav_keyboard(0, len(hotels))
+        )
+    await prefetcher.around(update.effective_user.id, context.user_data["result_id"], 0)
 
 
 def build_history_handlers():
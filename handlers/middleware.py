@@ -0,0 +1,50 @@
+"""Handlers that run for every update, before (and for recording, after) everything else."""
+import time
+from contextvars import ContextVar
+
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+from services.rate_limit import current_user
+from services.replay_log import replay_log
+
+MIDDLEWARE_GROUP = -1
+# only one handler runs per group, so recording gets its own groups:
+# first before everything, last after every other group
+RECORD_GROUP = -2
+COMPLETION_GROUP = 1000
+
+_update_started: ContextVar[float | None] = ContextVar("update_started", default=None)
+
+
+async def bind_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Booking API calls made while handling this update queue under this user
+    # (fair queueing in services/rate_limit.py)
+    current_user.set(update.effective_user.id if update.effective_user else None)
+
+
+async def record_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if replay_log.enabled:
+        _update_started.set(time.perf_counter())
+        replay_log.update(update.to_dict())
+
+
+async def record_handled(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # same task as record_update, so the context var is still set
+    started = _update_started.get()
+    if replay_log.enabled and started is not None:
+        replay_log.handled(update.update_id, time.perf_counter() - started)
+
+
+def build_middleware_handlers():
+    return [
+        TypeHandler(Update, bind_user),
+    ]
+
+
+def build_recording_handlers() -> dict[int, list]:
+    """group -> handlers; only added when REPLAY_LOG is set."""
+    return {
+        RECORD_GROUP: [TypeHandler(Update, record_update)],
+        COMPLETION_GROUP: [TypeHandler(Update, record_handled)],
+    }
@@ -1,111 +1,156 @@
-from telegram import Update
+import logging
+
+from telegram import Update, InputMediaPhoto
+from telegram.error import BadRequest, TelegramError
 from telegram.ext import ContextTypes
 
 from keyboards.pagination import hotel_nav_keyboard
-from utils.formatting import format_hotel
-from services.booking_api import get_hotel_photos, get_description_and_info, BookingAPIError
-
-
-def _current_hotel(context: ContextTypes.DEFAULT_TYPE):
-    hotels = context.user_data.get("hotels") or []
-    idx = int(context.user_data.get("hotel_index", 0))
-    if not hotels:
-        return None, [], 0, 0
-    idx = max(0, min(idx, len(hotels) - 1))
-    return hotels[idx], hotels, idx, len(hotels)
+from services.result_store import result_store
+from services.booking_api import BookingAPIError
+from services.hotel_details import get_photo_urls, get_description, photo_file_cache
+from services.metrics import edits_skipped
+from services.prefetch import prefetcher
+from services.tap_coalescer import tap_coalescer
+from utils.rendering import edit_text
+
+logger = logging.getLogger(__name__)
+
+PHOTOS_FAILED_TEXT = "❌ Could not send the photos. Please try again later."
+
+
+async def _send_album(message, photos: list[str]):
+    """Send URLs or file_ids as one media group (a single photo can't be a group)."""
+    if len(photos) == 1:
+        return [await message.reply_photo(photos[0])]
+    return await message.reply_media_group([InputMediaPhoto(p) for p in photos])
+
+
+def _message_key(query):
+    message = query.message
+    if message is None:
+        return ("user", query.from_user.id)
+    return message.chat.id, message.message_id
+
+
+def _card_render(query, context: ContextTypes.DEFAULT_TYPE, result_id: str, user_id: int):
+    async def render(previous):
+        # by now the taps may have moved the index further: show where they ended up
+        if context.user_data.get("result_id") != result_id:
+            return None   # a new search replaced this result set
+        hotel, idx, total = await result_store.get(result_id, int(context.user_data.get("hotel_index", 0)))
+        if not hotel:
+            return None
+        state = (hotel.card, hotel_nav_keyboard(idx, total))
+        if state == previous:
+            edits_skipped.inc(method="editMessageText")
+            return state
+        # query.message is what the user saw when tapping; after our own edit it is stale
+        await edit_text(query, *state, compare=previous is None)
+        await prefetcher.around(user_id, result_id, idx)
+        return state
+    return render
 
 
 async def hotel_nav_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
-    await query.answer()
-
-    hotel, hotels, idx, total = _current_hotel(context)
-    if not hotel:
-        await query.edit_message_text("No hotels cached. Run /lowprice again.")
-        return
-
     data = query.data
+    result_id = context.user_data.get("result_id")
+    idx = int(context.user_data.get("hotel_index", 0))
 
     # ===== Prev/Next =====
-    if data == "hotel_prev":
-        idx = max(0, idx - 1)
+    if data in ("hotel_prev", "hotel_next"):
+        await query.answer()
+        idx += -1 if data == "hotel_prev" else 1
+        hotel, idx, total = await result_store.get(result_id, idx)
+        if not hotel:
+            await edit_text(query, "No hotels cached. Run /lowprice again.")
+            return
+        # the index moves now (photos / info see it), the card is redrawn once per burst
         context.user_data["hotel_index"] = idx
-        await query.edit_message_text(
-            format_hotel(hotels[idx]),
-            reply_markup=hotel_nav_keyboard(idx, total)
+        await tap_coalescer.render(
+            _message_key(query),
+            _card_render(query, context, result_id, update.effective_user.id),
+            create_task=lambda coro: context.application.create_task(coro, update=update),
         )
         return
 
-    if data == "hotel_next":
-        idx = min(total - 1, idx + 1)
-        context.user_data["hotel_index"] = idx
-        await query.edit_message_text(
-            format_hotel(hotels[idx]),
-            reply_markup=hotel_nav_keyboard(idx, total)
-        )
+    # only the card being shown is loaded
+    hotel, idx, total = await result_store.get(result_id, idx)
+    if not hotel:
+        await query.answer()
+        await edit_text(query, "No hotels cached. Run /lowprice again.")
+        return
+    if not hotel.hotel_id:
+        await query.answer()
+        await query.message.reply_text("No hotel_id found for this item.")
         return
 
-    # ===== Photos =====
-    if data == "hotel_photos":
-        hotel_id = hotel.get("hotel_id")
-        if not hotel_id:
-            await query.message.reply_text("No hotel_id found for this item.")
-            return
-
+    if data not in ("hotel_photos", "hotel_info"):
+        await query.answer()
+        return
+    # slow fetches run outside the chat's update queue; repeated taps while one runs are dropped
+    send = _send_photos if data == "hotel_photos" else _send_info
+    started = tap_coalescer.once(
+        (update.effective_user.id, data, hotel.hotel_id),
+        lambda: send(query, hotel),
+        create_task=lambda coro: context.application.create_task(coro, update=update),
+    )
+    await query.answer(None if started else "⏳ Already on its way")
+
+
+async def _send_photos(query, hotel):
+    hotel_id = str(hotel.hotel_id)
+
+    # same hotel shown before -> resend Telegram's copies, no API / URL fetch
+    file_ids = await photo_file_cache.aget(hotel_id)
+    if file_ids:
         try:
-            resp = get_hotel_photos(str(hotel_id))
-        except BookingAPIError as e:
-            await query.message.reply_text(f"❌ Photos API error:\n{e}")
+            await _send_album(query.message, file_ids)
             return
-
-        photos = (resp.get("data") or {}).get("photos") or []
-        if not photos:
-            await query.message.reply_text("No photos found for this hotel.")
+        except BadRequest:
+            # stale file_id: forget it here and on disk, then fetch the URLs again
+            await photo_file_cache.adelete(hotel_id)
+        except TelegramError as e:
+            # timeout, flood control, network: the next tap starts over from the URLs
+            logger.warning("Resending photos of hotel %s failed: %s", hotel_id, e)
+            await photo_file_cache.adelete(hotel_id)
+            await query.message.reply_text(PHOTOS_FAILED_TEXT)
             return
 
-        # send first 3 photos (enough for TЗ)
-        sent = 0
-        for p in photos:
-            url = p.get("url") or p.get("photoUrl") or p.get("mainUrl")
-            if url:
-                await query.message.reply_photo(url)
-                sent += 1
-            if sent >= 3:
-                break
-        if sent == 0:
-            await query.message.reply_text("Photos exist but no usable URL fields found.")
+    try:
+        urls = await get_photo_urls(hotel_id)
+    except BookingAPIError as e:
+        logger.warning("Photos for hotel %s failed: %s", hotel_id, e)
+        await query.message.reply_text(f"❌ {e.user_message}")
         return
 
-    # ===== Info / Description =====
-    if data == "hotel_info":
-        hotel_id = hotel.get("hotel_id")
-        if not hotel_id:
-            await query.message.reply_text("No hotel_id found for this item.")
-            return
-
-        try:
-            resp = get_description_and_info(str(hotel_id), languagecode="en-us")
-        except BookingAPIError as e:
-            await query.message.reply_text(f"❌ Info API error:\n{e}")
-            return
-
-        data_obj = resp.get("data") or {}
-        # часто описание лежит в одном из этих полей (зависит от провайдера)
-        description = (
-            data_obj.get("description") or
-            data_obj.get("hotel_description") or
-            data_obj.get("text") or
-            ""
-        )
-
-        if not description:
-            await query.message.reply_text("No description text found for this hotel.")
-            return
+    if not urls:
+        await query.message.reply_text("No photos found for this hotel.")
+        return
 
-        # Telegram limit-friendly
-        description = description.strip()
-        if len(description) > 3500:
-            description = description[:3500] + "…"
+    try:
+        messages = await _send_album(query.message, urls)
+    except TelegramError as e:
+        # a background task: without this the user would never hear back
+        logger.warning("Sending photos of hotel %s failed: %s", hotel_id, e)
+        await query.message.reply_text(PHOTOS_FAILED_TEXT)
+        return
+    file_ids = [m.photo[-1].file_id for m in messages if m.photo]
+    if file_ids:
+        await photo_file_cache.aset(hotel_id, file_ids)
+
+
+async def _send_info(query, hotel):
+    hotel_id = str(hotel.hotel_id)
+    try:
+        description = await get_description(hotel_id, languagecode="en-us")
+    except BookingAPIError as e:
+        logger.warning("Description for hotel %s failed: %s", hotel_id, e)
+        await query.message.reply_text(f"❌ {e.user_message}")
+        return
 
-        await query.message.reply_text(f"ℹ️ Description:\n\n{description}")
+    if not description:
+        await query.message.reply_text("No description text found for this hotel.")
         return
+
+    await query.message.reply_text(f"ℹ️ Description:\n\n{description}")
@@ -10,14 +10,22 @@ from telegram.ext import (
 
 from telegram_bot_calendar import DetailedTelegramCalendar
 
-from services.booking_api import search_destinations, search_hotels, BookingAPIError
+from config import SEARCH_TARGET_RESULTS, PERSISTENCE_ENABLED
+from services.booking_api import search_destinations, search_hotels_pages, BookingAPIError
 from keyboards.locations import locations_keyboard
 from keyboards.pagination import hotel_nav_keyboard
-from utils.formatting import format_hotel, get_hotel_price_value, get_guest_rating
+from utils.query_engine import FilterSpec, ResultSet
+from utils.geo import valid_point
+from utils.rendering import edit_markup
+from services.result_store import result_store
+from services.prefetch import prefetcher
+from services.metrics import stage
+from services.destination_index import destination_index
 
-import json
-from database.db import db
-from database.models import SearchHistory
+import logging
+from database.history_writer import history_writer
+
+logger = logging.getLogger(__name__)
 
 
 # States
@@ -32,11 +40,22 @@ KEY_CHECKOUT = "checkout"
 KEY_MIN_PRICE = "min_price"
 KEY_MAX_PRICE = "max_price"
 KEY_MAX_DISTANCE = "max_distance"
+KEY_CENTER = "center"      # [lat, lon] of the picked destination
+KEY_ORIGIN = "origin"      # [lat, lon] the user shared, wins over the centre
 KEY_COMMAND = "command"
 
+UNEXPECTED_ERROR_TEXT = "❌ Something went wrong. Please try again later."
 
-async def lowprice_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+
+async def _end_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Forget the previous search: its pending prefetches, its result set and the conversation data."""
+    prefetcher.cancel(update.effective_user.id)
+    await result_store.drop(context.user_data.get("result_id"))
     context.user_data.clear()
+
+
+async def lowprice_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _end_session(update, context)
     context.user_data[KEY_COMMAND] = "lowprice"
     await update.message.reply_text("🏙️ Enter city name:")
     return ASK_CITY
@@ -50,14 +69,24 @@ async def city_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data[KEY_CITY] = city
 
-    try:
-        dests = search_destinations(city, limit=5)
-    except BookingAPIError as e:
-        await update.message.reply_text(f"❌ API error while searching city:\n{e}")
-        return ConversationHandler.END
-    except Exception as e:
-        await update.message.reply_text(f"❌ Unexpected error:\n{e}")
-        return ConversationHandler.END
+    # a name resolved before answers locally; anything else (prefixes, typos) asks the API
+    dests = destination_index.exact(city, limit=5) if destination_index is not None else []
+    from_index = bool(dests)
+    if not dests:
+        try:
+            dests = await search_destinations(city, limit=5)
+        except BookingAPIError as e:
+            logger.warning("Destination search for %r failed: %s", city, e)
+            dests = _local_suggestions(city)
+            if not dests:
+                await update.message.reply_text(f"❌ {e.user_message}")
+                return ConversationHandler.END
+        except Exception:
+            logger.exception("Destination search for %r failed", city)
+            await update.message.reply_text(UNEXPECTED_ERROR_TEXT)
+            return ConversationHandler.END
+        else:
+            dests = dests or _local_suggestions(city)
 
     if not dests:
         await update.message.reply_text("No locations found. Try another city name.")
@@ -66,20 +95,48 @@ async def city_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["destinations_cache"] = dests
     await update.message.reply_text(
         "📍 уточните локацию (выберите из списка):",
-        reply_markup=locations_keyboard(dests),
+        reply_markup=locations_keyboard(dests, more=from_index),
     )
     return PICK_LOCATION
 
 
+def _local_suggestions(city: str) -> list[dict]:
+    """Near matches from the index, for when the API has no answer (down, or nothing found)."""
+    return destination_index.search(city, limit=5) if destination_index is not None else []
+
+
 async def location_picked(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
     if query.data == "loc_cancel":
-        context.user_data.clear()
+        await _end_session(update, context)
         await query.edit_message_text("Cancelled ❌")
         return ConversationHandler.END
 
+    if query.data == "loc_more":
+        # the local matches were not it: ask the API for the full list
+        city = context.user_data.get(KEY_CITY, "")
+        try:
+            dests = await search_destinations(city, limit=5)
+        except BookingAPIError as e:
+            logger.warning("Destination search for %r failed: %s", city, e)
+            await query.edit_message_text(f"❌ {e.user_message}")
+            return ConversationHandler.END
+        except Exception:
+            logger.exception("Destination search for %r failed", city)
+            await query.edit_message_text(UNEXPECTED_ERROR_TEXT)
+            return ConversationHandler.END
+        if not dests:
+            await query.edit_message_text("No other locations found. Send another city name:")
+            return ASK_CITY
+        context.user_data["destinations_cache"] = dests
+        await query.edit_message_text(
+            "📍 уточните локацию (выберите из списка):",
+            reply_markup=locations_keyboard(dests),
+        )
+        return PICK_LOCATION
+
     # expected: loc|dest_id|search_type
     parts = (query.data or "").split("|")
     if len(parts) != 3 or parts[0] != "loc":
@@ -87,7 +144,10 @@ async def location_picked(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
 
     dest_id, search_type = parts[1], parts[2]
+    if destination_index is not None:
+        destination_index.picked(dest_id)
     context.user_data[KEY_DEST_ID] = dest_id
+    context.user_data[KEY_CENTER] = _destination_center(context, dest_id)
     context.user_data[KEY_SEARCH_TYPE] = search_type  # for you it will be 'city'
 
     cal = DetailedTelegramCalendar()
@@ -96,6 +156,16 @@ async def location_picked(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ASK_CHECKIN
 
 
+def _destination_center(context: ContextTypes.DEFAULT_TYPE, dest_id: str) -> list | None:
+    dest = next((d for d in context.user_data.get("destinations_cache") or []
+                 if str(d.get("dest_id")) == dest_id), None)
+    if dest is None and destination_index is not None:
+        dest = destination_index.get(dest_id)
+    if dest and valid_point(dest.get("latitude"), dest.get("longitude")):
+        return [float(dest["latitude"]), float(dest["longitude"])]
+    return None
+
+
 async def checkin_calendar_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -196,74 +266,29 @@ async def max_price_received(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if command == "bestdeal":
         await update.message.reply_text(
             "📍 Enter MAX distance to city center in km (e.g. 5).\n"
-            "If no limit, type 0:"
+            "If no limit, type 0.\n"
+            "To measure from another point, share a location 📎 first:"
         )
         return ASK_MAX_DISTANCE
 
     # ===== Otherwise (lowprice / guest_rating): call API now =====
-    dest_id = context.user_data.get(KEY_DEST_ID)
-    search_type = context.user_data.get(KEY_SEARCH_TYPE)  # usually 'city'
-    checkin = context.user_data.get(KEY_CHECKIN)
-    checkout = context.user_data.get(KEY_CHECKOUT)
-
-    checkin_str = checkin.isoformat()
-    checkout_str = checkout.isoformat()
-
-    try:
-        resp = search_hotels(
-            dest_id=dest_id,
-            search_type=search_type,
-            checkin=checkin_str,
-            checkout=checkout_str,
-            adults=2,
-            page=1,
-        )
-    except BookingAPIError as e:
-        await update.message.reply_text(f"❌ API error:\n{e}")
-        return ConversationHandler.END
-    except Exception as e:
-        await update.message.reply_text(f"❌ Unexpected error:\n{e}")
-        return ConversationHandler.END
-
-    hotels = (resp.get("data") or {}).get("hotels") or []
-    if not hotels:
-        await update.message.reply_text("No hotels found for these dates.")
-        return ConversationHandler.END
-
-    # ===== Filter by price range =====
-    filtered = []
-    for h in hotels:
-        price_val = get_hotel_price_value(h)
-        if price_val is None:
-            continue
-
-        ok_min = (min_price == 0) or (price_val >= min_price)
-        ok_max = (max_price == 0) or (price_val <= max_price)
-
-        if ok_min and ok_max:
-            filtered.append(h)
-
-    if not filtered:
-        await update.message.reply_text(
-            f"No hotels found in price range {min_price}–{max_price}.\nTry again."
-        )
-        return ConversationHandler.END
+    spec = FilterSpec.from_user_input(min_price, max_price)
 
-    # ===== Sort for guest_rating if needed =====
-    if command == "guest_rating":
-        filtered.sort(key=get_guest_rating, reverse=True)
+    return await _search_and_show(
+        update, context, spec, command,
+        f"No hotels found in price range {min_price}–{max_price}.\nTry again.",
+    )
 
-    context.user_data["hotels"] = filtered
-    context.user_data["hotel_index"] = 0
 
+async def origin_location_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    location = update.message.location
+    context.user_data[KEY_ORIGIN] = [location.latitude, location.longitude]
     await update.message.reply_text(
-        format_hotel(filtered[0]),
-        reply_markup=hotel_nav_keyboard(0, len(filtered))
+        "📍 Got it, distances will be measured from that point.\n"
+        "Enter MAX distance in km (0 = no limit):"
     )
-    return ConversationHandler.END
+    return ASK_MAX_DISTANCE
 
-from utils.formatting import get_distance_km, get_hotel_price_value, format_hotel
-# (если уже импортировано — просто добавь get_distance_km)
 
 async def max_distance_received(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (update.message.text or "").strip()
@@ -278,83 +303,152 @@ async def max_distance_received(update: Update, context: ContextTypes.DEFAULT_TY
 
     context.user_data[KEY_MAX_DISTANCE] = max_dist
 
-    # ===== CALL API NOW (same as others) =====
-    dest_id = context.user_data.get(KEY_DEST_ID)
-    search_type = context.user_data.get(KEY_SEARCH_TYPE)
+    min_price = float(context.user_data.get(KEY_MIN_PRICE, 0))
+    max_price = float(context.user_data.get(KEY_MAX_PRICE, 0))
+
+    # ===== FILTER BY PRICE + DISTANCE, SORT: distance asc, then price asc =====
+    spec = FilterSpec.from_user_input(min_price, max_price, max_dist)
+    # real distance from the shared point / destination centre; without either
+    # only the "km from downtown" text is left to go on
+    origin = context.user_data.get(KEY_ORIGIN) or context.user_data.get(KEY_CENTER)
+
+    return await _search_and_show(
+        update, context, spec, "bestdeal",
+        f"No hotels found for your filters.\n"
+        f"Price: {min_price}-{max_price}, Distance ≤ {max_dist} km.\n"
+        "Try /bestdeal again.",
+        origin=tuple(origin) if origin else None,
+    )
+
+
+async def _search_and_show(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                           spec: FilterSpec, ranking, not_found_text: str, origin=None):
+    """
+    Stream result pages and show the first matching hotel as soon as one page
+    has something that passes the filters. Remaining pages are merged in
+    the background (see _fill_remaining_pages).
+    """
     checkin = context.user_data.get(KEY_CHECKIN)
     checkout = context.user_data.get(KEY_CHECKOUT)
 
-    checkin_str = checkin.isoformat()
-    checkout_str = checkout.isoformat()
-
-    min_price = float(context.user_data.get(KEY_MIN_PRICE, 0))
-    max_price = float(context.user_data.get(KEY_MAX_PRICE, 0))
+    pages = search_hotels_pages(
+        dest_id=context.user_data.get(KEY_DEST_ID),
+        search_type=context.user_data.get(KEY_SEARCH_TYPE),  # usually 'city'
+        checkin=checkin.isoformat(),
+        checkout=checkout.isoformat(),
+        adults=2,
+    )
 
+    # one set for the whole search: later pages are appended to it (_fill_remaining_pages)
+    results = ResultSet(origin=origin)
+    filtered = []
+    seen_any = False
     try:
-        resp = search_hotels(
-            dest_id=dest_id,
-            search_type=search_type,
-            checkin=checkin_str,
-            checkout=checkout_str,
-            adults=2,
-            page=1,
-        )
+        async for hotels in pages:
+            seen_any = True
+            with stage("filter"):
+                results.extend(hotels)
+                filtered = results.query(spec, ranking)
+            if filtered:
+                break
     except BookingAPIError as e:
-        await update.message.reply_text(f"❌ API error:\n{e}")
-        return ConversationHandler.END
-    except Exception as e:
-        await update.message.reply_text(f"❌ Unexpected error:\n{e}")
+        await pages.aclose()
+        logger.warning("Hotel search failed: %s", e)
+        await update.message.reply_text(f"❌ {e.user_message}")
         return ConversationHandler.END
-
-    hotels = (resp.get("data") or {}).get("hotels") or []
-    if not hotels:
-        await update.message.reply_text("No hotels found for these dates.")
+    except Exception:
+        await pages.aclose()
+        logger.exception("Hotel search failed")
+        await update.message.reply_text(UNEXPECTED_ERROR_TEXT)
         return ConversationHandler.END
 
-    # ===== FILTER BY PRICE + DISTANCE =====
-    filtered = []
-    for h in hotels:
-        price_val = get_hotel_price_value(h)
-        dist_km = get_distance_km(h)
-
-        if price_val is None:
-            continue
-        if dist_km is None:
-            continue  # bestdeal needs distance
-
-        ok_min = (min_price == 0) or (price_val >= min_price)
-        ok_max = (max_price == 0) or (price_val <= max_price)
-        ok_dist = (max_dist == 0) or (dist_km <= max_dist)
-
-        if ok_min and ok_max and ok_dist:
-            filtered.append(h)
-
     if not filtered:
-        await update.message.reply_text(
-            f"No hotels found for your filters.\n"
-            f"Price: {min_price}-{max_price}, Distance ≤ {max_dist} km.\n"
-            "Try /bestdeal again."
-        )
+        await pages.aclose()
+        if not seen_any:
+            await update.message.reply_text("No hotels found for these dates.")
+        else:
+            await update.message.reply_text(not_found_text)
         return ConversationHandler.END
 
-    # ===== SORT BESTDEAL: distance asc, then price asc =====
-    filtered.sort(key=lambda h: (get_distance_km(h) or 9999, get_hotel_price_value(h) or 1e18))
-
-    context.user_data["hotels"] = filtered
+    await result_store.drop(context.user_data.get("result_id"))
+    result_id = await result_store.put(filtered)
+    context.user_data["result_id"] = result_id
     context.user_data["hotel_index"] = 0
 
-    await update.message.reply_text(
-        format_hotel(filtered[0]),
+    message = await update.message.reply_text(
+        filtered[0].card,
         reply_markup=hotel_nav_keyboard(0, len(filtered))
     )
+
+    await prefetcher.around(update.effective_user.id, result_id, 0)
+
+    history_row = _history_row(update, context)
+    if len(filtered) >= SEARCH_TARGET_RESULTS:
+        await pages.aclose()
+        history_writer.add(history_row, filtered)
+    else:
+        context.application.create_task(
+            _fill_remaining_pages(pages, context, result_id, results, filtered, spec, ranking, message, history_row),
+            update=update,
+        )
     return ConversationHandler.END
 
+
+def _history_row(update: Update, context: ContextTypes.DEFAULT_TYPE) -> dict:
+    ud = context.user_data
+    return {
+        "user_id": update.effective_user.id,
+        "command": ud.get(KEY_COMMAND, "lowprice"),
+        "city": ud.get(KEY_CITY, ""),
+        "dest_id": str(ud.get(KEY_DEST_ID)),
+        "search_type": str(ud.get(KEY_SEARCH_TYPE)),
+        "checkin": ud[KEY_CHECKIN].isoformat(),
+        "checkout": ud[KEY_CHECKOUT].isoformat(),
+        "min_price": str(ud.get(KEY_MIN_PRICE, 0)),
+        "max_price": str(ud.get(KEY_MAX_PRICE, 0)),
+    }
+
+
+async def _fill_remaining_pages(pages, context: ContextTypes.DEFAULT_TYPE, result_id: str, results: ResultSet,
+                                filtered: list, spec: FilterSpec, ranking, message, history_row: dict):
+    """Merge later pages behind the card the user is looking at."""
+    try:
+        async for hotels in pages:
+            with stage("filter"):
+                results.extend(hotels)
+                ranked = results.query(spec, ranking)
+            if len(ranked) == len(filtered):
+                continue   # nothing on this page passed the filters
+            # user started another search meanwhile -> drop the rest
+            if context.user_data.get("result_id") != result_id:
+                break
+
+            idx = int(context.user_data.get("hotel_index", 0))
+            had_next = idx < len(filtered) - 1
+            # cards already seen keep their place, the unseen tail follows the ranking
+            seen = {id(h) for h in filtered[:idx + 1]}
+            filtered[idx + 1:] = [h for h in ranked if id(h) not in seen]
+            if not result_store.update(result_id, filtered):
+                break
+
+            if not had_next:
+                await edit_markup(message, hotel_nav_keyboard(idx, len(filtered)))
+            if len(filtered) >= SEARCH_TARGET_RESULTS:
+                break
+    except Exception:
+        # page 1 is already on screen, later pages are best effort
+        logger.warning("Failed to load remaining hotel pages", exc_info=True)
+    finally:
+        await pages.aclose()
+        # record what the user ended up with, never blocking on the db
+        history_writer.add(history_row, list(filtered))
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data.clear()
+    await _end_session(update, context)
     await update.message.reply_text("Cancelled ❌")
     return ConversationHandler.END
 
-def build_search_conversation() -> ConversationHandler:
+def build_search_conversation(persistent: bool = PERSISTENCE_ENABLED) -> ConversationHandler:
     return ConversationHandler(
         entry_points=[
             CommandHandler("lowprice", lowprice_start),
@@ -363,25 +457,30 @@ def build_search_conversation() -> ConversationHandler:
         ],
         states={
             ASK_CITY: [MessageHandler(filters.TEXT & ~filters.COMMAND, city_received)],
-            PICK_LOCATION: [CallbackQueryHandler(location_picked, pattern="^(loc\\|.*|loc_cancel)$")],
+            PICK_LOCATION: [CallbackQueryHandler(location_picked, pattern="^(loc\\|.*|loc_cancel|loc_more)$")],
             ASK_CHECKIN: [CallbackQueryHandler(checkin_calendar_callback)],
             ASK_CHECKOUT: [CallbackQueryHandler(checkout_calendar_callback)],
             ASK_MIN_PRICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, min_price_received)],
             ASK_MAX_PRICE: [MessageHandler(filters.TEXT & ~filters.COMMAND, max_price_received)],
-            ASK_MAX_DISTANCE: [MessageHandler(filters.TEXT & ~filters.COMMAND, max_distance_received)],
+            ASK_MAX_DISTANCE: [
+                MessageHandler(filters.LOCATION, origin_location_received),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, max_distance_received),
+            ],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         allow_reentry=True,
+        name="search",
+        persistent=persistent,
     )
 
 async def guest_rating_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data.clear()
+    await _end_session(update, context)
     context.user_data[KEY_COMMAND] = "guest_rating"
     await update.message.reply_text("🏙️ Enter city name:")
     return ASK_CITY
 
 async def bestdeal_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    context.user_data.clear()
+    await _end_session(update, context)
     context.user_data[KEY_COMMAND] = "bestdeal"
     await update.message.reply_text("🏙️ Enter city name:")
     return ASK_CITY
@@ -0,0 +1,8 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+
+def history_keyboard(entries) -> InlineKeyboardMarkup:
+    """entries: [(history id, label), ...]."""
+    return InlineKeyboardMarkup(
+        [[InlineKeyboardButton(label, callback_data=f"hist_open|{hist_id}")] for hist_id, label in entries]
+    )
@@ -1,16 +1,28 @@
+from functools import lru_cache
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
-def locations_keyboard(destinations: list[dict]) -> InlineKeyboardMarkup:
-    buttons = []
-    for d in destinations:
-        label = d.get("label") or d.get("name") or "Unknown"
-        dest_id = d.get("dest_id")
-        search_type = d.get("search_type")
 
+def locations_keyboard(destinations: list[dict], more: bool = False) -> InlineKeyboardMarkup:
+    """`more`: list came from the local index, offer a full API search too."""
+    # popular cities come back with the same list over and over
+    items = tuple(
+        (d.get("label") or d.get("name") or "Unknown", d.get("dest_id"), d.get("search_type"))
+        for d in destinations
+    )
+    return _locations_keyboard(items, more)
+
+
+@lru_cache(maxsize=512)
+def _locations_keyboard(items: tuple, more: bool) -> InlineKeyboardMarkup:
+    buttons = []
+    for label, dest_id, search_type in items:
         # callback_data must be short -> store only essential
         # format: loc|dest_id|search_type
         cb = f"loc|{dest_id}|{search_type}"
         buttons.append([InlineKeyboardButton(label, callback_data=cb)])
 
+    if more:
+        buttons.append([InlineKeyboardButton("🔎 Other places", callback_data="loc_more")])
     buttons.append([InlineKeyboardButton("❌ Cancel", callback_data="loc_cancel")])
     return InlineKeyboardMarkup(buttons)
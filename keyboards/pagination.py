@@ -1,12 +1,22 @@
+from functools import lru_cache
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 
+
 def hotel_nav_keyboard(index: int, total: int) -> InlineKeyboardMarkup:
+    # only the position class (first / middle / last / only card) changes the buttons
+    return _nav_keyboard(index > 0, index < total - 1)
+
+
+@lru_cache(maxsize=None)
+def _nav_keyboard(has_prev: bool, has_next: bool) -> InlineKeyboardMarkup:
+    # markups are frozen, so one instance per class is shared by every chat
     buttons = []
 
     nav_row = []
-    if index > 0:
+    if has_prev:
         nav_row.append(InlineKeyboardButton("⬅️ Prev", callback_data="hotel_prev"))
-    if index < total - 1:
+    if has_next:
         nav_row.append(InlineKeyboardButton("Next ➡️", callback_data="hotel_next"))
     if nav_row:
         buttons.append(nav_row)
@@ -1,17 +1,38 @@
+import argparse
+
 from database.init_db import init_db
+from database.db import shutdown_db
+from database.history_writer import history_writer
 from handlers.start import build_start_handler
 
 from handlers.history import build_history_handlers
 from handlers.help import build_help_handler
+from handlers.admin import build_admin_handlers
+from handlers.middleware import build_middleware_handlers, build_recording_handlers, MIDDLEWARE_GROUP
 
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.request import BaseRequest
 
 from telegram.ext import CallbackQueryHandler
 from handlers.pagination import hotel_nav_callback
 
-from config import BOT_TOKEN
+from config import (
+    BOT_TOKEN, BOT_MODE, UPDATE_CONCURRENCY, PERSISTENCE_ENABLED,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+    METRICS_HOST, METRICS_PORT, REPLAY_LOG,
+)
+from services.update_processor import PerChatUpdateProcessor
+from services.result_store import result_store
+from database.persistence import SessionPersistence
 from handlers.search import build_search_conversation
+from services.booking_api import close_client
+from services.rate_limit import rate_limiter
+from services.instrumentation import InstrumentedRequest, instrument_application
+from services.metrics import start_metrics_server, stop_metrics_server
+from services.replay_log import replay_log
+from services.send_queue import send_scheduler
+from services.destination_index import destination_index, init_index
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("Hi! ✅\nUse /lowprice to start hotel search.\n/cancel to stop.")
@@ -24,8 +45,66 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "/cancel - cancel current flow"
     )
 
-def main():
-    app = Application.builder().token(BOT_TOKEN).build()
+async def on_startup(app: Application):
+    history_writer.start()
+    result_store.start()
+    if REPLAY_LOG:
+        replay_log.open(REPLAY_LOG)
+    if METRICS_PORT:
+        await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+async def on_shutdown(app: Application):
+    await stop_metrics_server()
+    await history_writer.stop()
+    await result_store.stop()
+    if PERSISTENCE_ENABLED:
+        # sessions are persisted, keep the result sets they point to as well
+        await result_store.spill_all()
+    await close_client()
+    await rate_limiter.flush()
+    shutdown_db()
+    replay_log.close()
+    if destination_index is not None and destination_index.dirty:
+        destination_index.save()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Hotel search bot")
+    parser.add_argument("--mode", choices=["polling", "webhook"], default=BOT_MODE)
+    parser.add_argument("--concurrency", type=int, default=UPDATE_CONCURRENCY,
+                        help="updates processed in parallel (1 = strictly sequential)")
+    parser.add_argument("--webhook-url", default=WEBHOOK_URL, help="public URL Telegram posts updates to")
+    parser.add_argument("--listen", default=WEBHOOK_LISTEN)
+    parser.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    parser.add_argument("--url-path", default=WEBHOOK_PATH)
+    parser.add_argument("--secret-token", default=WEBHOOK_SECRET)
+    args = parser.parse_args(argv)
+    if args.mode == "webhook" and not args.webhook_url:
+        parser.error("webhook mode needs --webhook-url (or WEBHOOK_URL in .env)")
+    return args
+
+def build_application(concurrency: int = UPDATE_CONCURRENCY, request: BaseRequest | None = None) -> Application:
+    """`request` replaces the Bot API transport (benchmarks pass fakes.telegram.FakeTelegram)."""
+    builder = Application.builder().token(BOT_TOKEN).post_init(on_startup).post_shutdown(on_shutdown)
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    else:
+        # same pool sizes the builder would use by default
+        builder = (builder.request(InstrumentedRequest(connection_pool_size=256))
+                   .get_updates_request(InstrumentedRequest(connection_pool_size=1)))
+    # every Bot API call is paced and prioritised here, handlers call the bot as usual
+    builder = builder.rate_limiter(send_scheduler)
+    if concurrency > 1:
+        builder = builder.concurrent_updates(PerChatUpdateProcessor(concurrency))
+    if PERSISTENCE_ENABLED:
+        builder = builder.persistence(SessionPersistence())
+    app = builder.build()
+
+    for h in build_middleware_handlers():
+        app.add_handler(h, group=MIDDLEWARE_GROUP)
+    if REPLAY_LOG:
+        for group, handlers in build_recording_handlers().items():
+            for h in handlers:
+                app.add_handler(h, group=group)
 
     app.add_handler(build_start_handler())
 
@@ -38,9 +117,30 @@ def main():
         app.add_handler(h)
 
     app.add_handler(build_help_handler())
+
+    for h in build_admin_handlers():
+        app.add_handler(h)
+
+    instrument_application(app)
+    return app
+
+def main(argv=None):
+    args = parse_args(argv)
+    app = build_application(args.concurrency)
     init_db()
+    if destination_index is not None:
+        init_index(destination_index)
 
-    app.run_polling()
+    if args.mode == "webhook":
+        app.run_webhook(
+            listen=args.listen,
+            port=args.port,
+            url_path=args.url_path,
+            webhook_url=args.webhook_url,
+            secret_token=args.secret_token,
+        )
+    else:
+        app.run_polling()
 
 if __name__ == "__main__":
     main()
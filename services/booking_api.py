@@ -1,27 +1,139 @@
-import requests
-from config import RAPIDAPI_KEY
+import asyncio
+import time
 
-BASE_URL = "https://booking-com15.p.rapidapi.com"
+import httpx
+from config import (
+    RAPIDAPI_KEY, BOOKING_BASE_URL,
+    DEST_CACHE_SIZE, DEST_CACHE_TTL, DEST_CACHE_PERSIST,
+    HOTEL_CACHE_SIZE, HOTEL_CACHE_TTL,
+    SEARCH_MAX_PAGES, SEARCH_PAGE_CONCURRENCY,
+)
+from services.cache import TTLCache, SqliteCacheBackend, SingleFlight
+from services.rate_limit import rate_limiter, QuotaExhausted
+from services import resilience
+from services.metrics import timed, booking_seconds, upstream_seconds
+from services.replay_log import replay_log
+from services.destination_index import destination_index
+from utils.hotel_record import HotelRecord
+
+BASE_URL = BOOKING_BASE_URL
 
 HEADERS = {
     "X-RapidAPI-Key": RAPIDAPI_KEY,
     "X-RapidAPI-Host": "booking-com15.p.rapidapi.com",
 }
 
+TIMEOUT = httpx.Timeout(20.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+
+_client: httpx.AsyncClient | None = None
+_transport: httpx.AsyncBaseTransport | None = None
+
+destination_cache = TTLCache(
+    "destinations",
+    maxsize=DEST_CACHE_SIZE,
+    ttl=DEST_CACHE_TTL,
+    backend=SqliteCacheBackend("dest") if DEST_CACHE_PERSIST else None,
+)
+hotel_search_cache = TTLCache("hotel_search", maxsize=HOTEL_CACHE_SIZE, ttl=HOTEL_CACHE_TTL)
+hotel_search_flight = SingleFlight()
+
+
 class BookingAPIError(Exception):
-    pass
+    """str(e) has the details for logs; user_message is what the chat gets to see."""
 
+    user_message = "Booking service is not available right now. Please try again later."
 
-def get_destination(city: str) -> dict:
-    """Return the best destination object for the given city."""
-    url = f"{BASE_URL}/api/v1/hotels/searchDestination"
-    params = {"query": city, "locale": "en-us"}
+    def __init__(self, message: str, status: int | None = None):
+        super().__init__(message)
+        self.status = status
+
+
+class RateLimitedError(BookingAPIError):
+    user_message = "⏳ Too many searches right now. Please try again in a minute."
+
+
+class QuotaExceededError(RateLimitedError):
+    user_message = "⏳ The daily search limit is reached. Please try again later."
+
+
+class UpstreamUnavailableError(BookingAPIError):
+    """Circuit breaker is open: Booking has been failing, calls fail fast."""
 
-    r = requests.get(url, headers=HEADERS, params=params, timeout=20)
+
+def get_client() -> httpx.AsyncClient:
+    """One shared keep-alive pool for the Booking host (created lazily on the running loop)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=BASE_URL,
+            headers=HEADERS,
+            timeout=TIMEOUT,
+            limits=LIMITS,
+            transport=_transport,
+        )
+    return _client
+
+
+def use_transport(transport: httpx.AsyncBaseTransport | None):
+    """Route Booking calls through `transport` (e.g. fakes.booking_api) from the next client on."""
+    global _transport, _client
+    _transport = transport
+    _client = None
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def _get(path: str, params: dict, error_prefix: str) -> dict:
+    endpoint = path.rsplit("/", 1)[-1]
+
+    async def send(timeout: float) -> httpx.Response:
+        started = time.perf_counter()
+        status = "error"
+        try:
+            r = await get_client().get(path, params=params, timeout=min(timeout, TIMEOUT.read))
+        except Exception as e:
+            if replay_log.enabled:
+                replay_log.booking(path, params, None, None, time.perf_counter() - started, e.__class__.__name__)
+            raise
+        else:
+            status = r.status_code
+            if replay_log.enabled:
+                replay_log.booking(path, params, r.status_code, r.text, time.perf_counter() - started)
+            return r
+        finally:
+            upstream_seconds.observe(time.perf_counter() - started, endpoint=endpoint, status=status)
+
+    try:
+        # every attempt (retries, hedges) is a real call: each takes a rate limiter token
+        r = await resilience.call(endpoint, send, limiter=rate_limiter)
+    except QuotaExhausted as e:
+        raise QuotaExceededError(f"{error_prefix}: {e}") from e
+    except resilience.CircuitOpenError as e:
+        raise UpstreamUnavailableError(f"{error_prefix}: {e}") from e
+    except (httpx.HTTPError, TimeoutError) as e:
+        raise BookingAPIError(f"{error_prefix}: {e.__class__.__name__}") from e
+    if r.status_code == 429:
+        rate_limiter.on_throttled()
+        raise RateLimitedError(f"{error_prefix}: 429 {r.text}", status=429)
     if r.status_code != 200:
-        raise BookingAPIError(f"Destination search failed: {r.status_code} {r.text}")
+        raise BookingAPIError(f"{error_prefix}: {r.status_code} {r.text}", status=r.status_code)
+    return r.json()
+
 
-    data = r.json()
+@timed(booking_seconds, function="get_destination")
+async def get_destination(city: str) -> dict:
+    """Return the best destination object for the given city."""
+    data = await _get(
+        "/api/v1/hotels/searchDestination",
+        {"query": city, "locale": "en-us"},
+        "Destination search failed",
+    )
     items = data.get("data") or []
     if not items:
         raise BookingAPIError("No destinations found for this city.")
@@ -35,31 +147,47 @@ def get_destination(city: str) -> dict:
 
     return city_item
 
-def search_destinations(query: str, limit: int = 5) -> list[dict]:
-    """Return list of destination objects to show as keyboard choices."""
-    url = f"{BASE_URL}/api/v1/hotels/searchDestination"
-    params = {"query": query, "locale": "en-us"}
+def destination_cache_key(query: str, locale: str) -> str:
+    # "Paris", "paris ", "PARIS" -> "paris|en-us"
+    return f"{' '.join(query.split()).casefold()}|{locale.lower()}"
 
-    r = requests.get(url, headers=HEADERS, params=params, timeout=20)
-    if r.status_code != 200:
-        raise BookingAPIError(f"Destination search failed: {r.status_code} {r.text}")
+@timed(booking_seconds, function="search_destinations")
+async def search_destinations(query: str, limit: int = 5, locale: str = "en-us") -> list[dict]:
+    """Return list of destination objects to show as keyboard choices."""
+    key = destination_cache_key(query, locale)
+    items_sorted = await destination_cache.aget(key)
+    if items_sorted is None and rate_limiter.quota_low():
+        # save what is left of the quota: an outdated answer beats none
+        items_sorted = destination_cache.get(key, allow_stale=True)
+    if items_sorted is None:
+        try:
+            data = await _get(
+                "/api/v1/hotels/searchDestination",
+                {"query": query, "locale": locale},
+                "Destination search failed",
+            )
+        except BookingAPIError:
+            stale = destination_cache.get(key, allow_stale=True)
+            if stale is None:
+                raise
+            return stale[:limit]
+        items = data.get("data") or []
 
-    data = r.json()
-    items = data.get("data") or []
-    if not items:
-        return []
+        # Prefer city results first, then others
+        items_sorted = sorted(items, key=lambda x: 0 if (x.get("search_type") or "").lower() == "city" else 1)
+        await destination_cache.aset(key, items_sorted)
+        if destination_index is not None:
+            destination_index.add_many(items_sorted)
 
-    # Prefer city results first, then others
-    items_sorted = sorted(items, key=lambda x: 0 if (x.get("search_type") or "").lower() == "city" else 1)
     return items_sorted[:limit]
 
-def search_hotels(dest_id: str, search_type: str, checkin: str, checkout: str,
-                 adults: int = 2, page: int = 1):
+@timed(booking_seconds, function="search_hotels")
+async def search_hotels(dest_id: str, search_type: str, checkin: str, checkout: str,
+                        adults: int = 2, page: int = 1):
     """
     Search hotels. search_type must match API (for you it's 'city').
     checkin/checkout: YYYY-MM-DD
     """
-    url = f"{BASE_URL}/api/v1/hotels/searchHotels"
     params = {
         "dest_id": str(dest_id),
         "search_type": str(search_type),   # ✅ MUST be 'city' in your case
@@ -73,34 +201,83 @@ def search_hotels(dest_id: str, search_type: str, checkin: str, checkout: str,
         "languagecode": "en-us",
         "currency_code": "USD",
     }
+    return await _get("/api/v1/hotels/searchHotels", params, "Hotel search failed")
 
-    r = requests.get(url, headers=HEADERS, params=params, timeout=20)
-    if r.status_code != 200:
-        raise BookingAPIError(f"Hotel search failed: {r.status_code} {r.text}")
+@timed(booking_seconds, function="search_hotel_records")
+async def search_hotel_records(dest_id: str, search_type: str, checkin: str, checkout: str,
+                               adults: int = 2, page: int = 1) -> list[HotelRecord]:
+    """
+    Parsed hotels of one searchHotels page. Shared between users for a short
+    TTL; concurrent identical searches are coalesced into one request.
+    """
+    key = (str(dest_id), str(search_type), checkin, checkout, int(adults), int(page))
 
-    return r.json()
+    records = hotel_search_cache.get(key)
+    if records is None and rate_limiter.quota_low():
+        records = hotel_search_cache.get(key, allow_stale=True)
+    if records is not None:
+        return records
+
+    async def fetch():
+        try:
+            resp = await search_hotels(dest_id, search_type, checkin, checkout, adults, page)
+        except BookingAPIError:
+            # upstream unhealthy: an expired result is better than an error
+            stale = hotel_search_cache.get(key, allow_stale=True)
+            if stale is None:
+                raise
+            return stale
+        hotels = (resp.get("data") or {}).get("hotels") or []
+        records = [HotelRecord.from_api(h) for h in hotels]
+        hotel_search_cache.set(key, records)
+        return records
 
-def get_hotel_photos(hotel_id: str):
+    # N users asking for the same destination + dates -> one upstream request
+    return await hotel_search_flight.do(key, fetch)
+
+async def search_hotels_pages(dest_id: str, search_type: str, checkin: str, checkout: str,
+                              adults: int = 2, max_pages: int = SEARCH_MAX_PAGES,
+                              concurrency: int = SEARCH_PAGE_CONCURRENCY):
+    """
+    Fetch pages 1..max_pages concurrently (at most `concurrency` in flight) and
+    yield each page's HotelRecord list in page order, so page 1 can be used while
+    the rest are still loading. Stops at the first empty page; closing the
+    generator early cancels the pages that are not needed anymore.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def fetch(page: int) -> list[HotelRecord]:
+        async with sem:
+            return await search_hotel_records(dest_id, search_type, checkin, checkout, adults, page)
+
+    tasks = [asyncio.ensure_future(fetch(p)) for p in range(1, max_pages + 1)]
+    try:
+        for task in tasks:
+            hotels = await task
+            if not hotels:
+                break
+            yield hotels
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # mark as retrieved
+
+@timed(booking_seconds, function="get_hotel_photos")
+async def get_hotel_photos(hotel_id: str):
     """
     GET /api/v1/hotels/getHotelPhotos
     hotel_id берётся из searchHotels (поле hotel_id).
     """
-    url = f"{BASE_URL}/api/v1/hotels/getHotelPhotos"
     params = {"hotel_id": str(hotel_id)}
-    r = requests.get(url, headers=HEADERS, params=params, timeout=20)
-    if r.status_code != 200:
-        raise BookingAPIError(f"getHotelPhotos failed: {r.status_code} {r.text}")
-    return r.json()
+    return await _get("/api/v1/hotels/getHotelPhotos", params, "getHotelPhotos failed")
 
 
-def get_description_and_info(hotel_id: str, languagecode: str = "en-us"):
+@timed(booking_seconds, function="get_description_and_info")
+async def get_description_and_info(hotel_id: str, languagecode: str = "en-us"):
     """
     GET /api/v1/hotels/getDescriptionAndInfo
     """
-    url = f"{BASE_URL}/api/v1/hotels/getDescriptionAndInfo"
     params = {"hotel_id": str(hotel_id), "languagecode": languagecode}
-    r = requests.get(url, headers=HEADERS, params=params, timeout=20)
-    if r.status_code != 200:
-        raise BookingAPIError(f"getDescriptionAndInfo failed: {r.status_code} {r.text}")
-    return r.json()
-
+    return await _get("/api/v1/hotels/getDescriptionAndInfo", params, "getDescriptionAndInfo failed")
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+from database.db import run_db
+
+_MISSING = object()
+
+# every cache registers itself here so stats can be reported in one place
+_caches: dict[str, "TTLCache"] = {}
+
+
+class SqliteCacheBackend:
+    """Persistent second level for TTLCache, stored in the ApiCache table."""
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str):
+        """(value, seconds left) or None. Backends for TTLCache implement get/set/delete like this."""
+        from database.models import ApiCache
+
+        row = ApiCache.get_or_none(ApiCache.key == self._key(key))
+        if row is None:
+            return None
+        if row.expires_at < time.time():
+            row.delete_instance()
+            return None
+        return json.loads(row.value), row.expires_at - time.time()
+
+    def set(self, key: str, value, ttl: float):
+        self._upsert(self._key(key), json.dumps(value), time.time() + ttl).execute()
+
+    def delete(self, key: str):
+        from database.models import ApiCache
+
+        ApiCache.delete().where(ApiCache.key == self._key(key)).execute()
+
+    @staticmethod
+    def _upsert(key: str, value: str, expires_at: float):
+        from database.models import ApiCache
+
+        # INSERT .. ON CONFLICT DO UPDATE: REPLACE is SQLite/MySQL only
+        return (ApiCache
+                .insert(key=key, value=value, expires_at=expires_at)
+                .on_conflict(conflict_target=[ApiCache.key], preserve=[ApiCache.value, ApiCache.expires_at]))
+
+
+class TTLCache:
+    """
+    Bounded in-process cache: entries expire after `ttl` seconds and the least
+    recently used one is evicted once `maxsize` is reached.
+    Optional `backend` (SqliteCacheBackend) is consulted by aget/aset/adelete only.
+    """
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 3600, backend=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self._data: OrderedDict = OrderedDict()   # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.backend_hits = 0
+        _caches[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        # membership check only, doesn't count as a hit/miss or touch LRU order
+        item = self._data.get(key)
+        return item is not None and item[0] >= time.monotonic()
+
+    def get(self, key, default=None, allow_stale: bool = False):
+        """
+        allow_stale=True also returns expired entries; they stay in memory
+        until LRU eviction for exactly that fallback.
+        """
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic() and not allow_stale:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    async def aget(self, key, default=None):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        if self.backend is None:
+            return default
+
+        stored = await run_db(self.backend.get, key)
+        if stored is None:
+            return default
+        value, ttl_left = stored
+        self.backend_hits += 1
+        self.set(key, value, ttl=ttl_left)
+        return value
+
+    async def aset(self, key, value):
+        self.set(key, value)
+        if self.backend is not None:
+            await run_db(self.backend.set, key, value, self.ttl)
+
+    async def adelete(self, key):
+        """Drop `key` from memory and from the backend (e.g. a value found to be invalid)."""
+        self.pop(key)
+        if self.backend is not None:
+            await run_db(self.backend.delete, key)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "backend_hits": self.backend_hits,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller starts the
+    work, everyone arriving while it is in flight awaits the same result.
+    The work is cancelled only when every waiter has been cancelled.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}   # key -> [task, waiters]
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        entry = self._inflight.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _, e=entry: self._release(key, e))
+        else:
+            self.coalesced += 1
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            # shield: one impatient caller must not cancel the request for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if entry[1] == 1 and not task.done():
+                # callers arriving before the cancellation lands start a new task
+                self._release(key, entry)
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+    def _release(self, key, entry):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+
+def all_cache_stats() -> dict[str, dict]:
+    return {name: c.stats() for name, c in _caches.items()}
@@ -0,0 +1,338 @@
+"""
+Local destination autocomplete.
+
+Every searchDestination answer (plus an optional seed file) goes into an
+in-memory index. city_received answers from it only when the folded text
+is exactly a known destination's name ("paris", "São Paulo"); anything else
+goes to the API, because a near match can be another place ("parma" is
+not Paris, "bern" is not Berlin). Near matches are bisects over sorted
+folded keys (prefixes, also of later words: "york" -> New York) with a
+trigram fallback for typos ("parsi" -> Paris), ranked by how often a
+destination was picked; they are only offered when the API cannot answer.
+
+The index lives in DEST_INDEX_PATH: magic, length, then the prebuilt
+structure as JSON, memory-mapped at startup. Only when the file is missing
+is it built from SQLite (cached destination answers + search history).
+
+    python -m services.destination_index build [--seed destinations.json]
+"""
+import argparse
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import unicodedata
+from pathlib import Path
+
+from config import DEST_INDEX_ENABLED, DEST_INDEX_PATH, DEST_INDEX_SEED
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"DIX1"
+_HEADER = struct.Struct("<4sI")
+
+# what locations_keyboard / location_picked (and later the geo filter) need
+FIELDS = ("dest_id", "search_type", "dest_type", "label", "name", "city_name", "region", "country",
+          "latitude", "longitude", "nr_hotels")
+
+MIN_FUZZY_LEN = 3
+FUZZY_THRESHOLD = 0.45
+
+
+def fold(text: str) -> str:
+    """"  São  Paulo!" -> "sao paulo": casefold, strip diacritics and punctuation."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    chars = [c if c.isalnum() else " " for c in text if not unicodedata.combining(c)]
+    return " ".join("".join(chars).split())
+
+
+def trigrams(folded: str) -> set[str]:
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DestinationIndex:
+    def __init__(self):
+        self.entries: list[dict] = []
+        self.popularity: list[int] = []
+        self._by_id: dict[str, int] = {}
+        self._keys: list[str] = []         # folded keys, sorted before lookups
+        self._key_entry: list[int] = []    # entry index of each key
+        self._keys_sorted = True
+        self._trigrams: dict[str, list[int]] = {}
+        self._fuzzy_size: list[int] = []   # trigram count of each entry's name
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    # ----- building -----
+
+    @staticmethod
+    def _entry_keys(entry: dict) -> set[str]:
+        name = fold(entry.get("name") or entry.get("city_name") or "")
+        keys = {fold(entry.get("label") or "")}
+        words = name.split()
+        # every word start of the name: "new york" -> "new york", "york"
+        keys.update(" ".join(words[i:]) for i in range(len(words)))
+        keys.discard("")
+        return keys
+
+    def add(self, destination: dict, picks: int = 0) -> bool:
+        """Insert or refresh one destination object. True if it was new."""
+        dest_id = str(destination.get("dest_id") or "")
+        if not dest_id or not destination.get("search_type"):
+            return False
+        entry = {k: destination[k] for k in FIELDS if destination.get(k) is not None}
+        entry["dest_id"] = dest_id
+
+        i = self._by_id.get(dest_id)
+        if i is not None:
+            if picks:
+                self.popularity[i] += picks
+                self.dirty = True
+            if entry != self.entries[i]:
+                # label / name changed: keys are only ever added, stale ones just rank lower
+                self.entries[i] = entry
+                self._index_entry(i)
+                self.dirty = True
+            return False
+
+        i = len(self.entries)
+        self.entries.append(entry)
+        self.popularity.append(picks)
+        self._by_id[dest_id] = i
+        self._fuzzy_size.append(0)
+        self._index_entry(i)
+        self.dirty = True
+        return True
+
+    def add_many(self, destinations: list[dict]) -> int:
+        return sum(self.add(d) for d in destinations)
+
+    def _index_entry(self, i: int):
+        entry = self.entries[i]
+        for key in self._entry_keys(entry):
+            self._keys.append(key)
+            self._key_entry.append(i)
+        self._keys_sorted = False
+
+        name = fold(entry.get("name") or entry.get("city_name") or entry.get("label") or "")
+        grams = trigrams(name)
+        for gram in grams:
+            postings = self._trigrams.setdefault(gram, [])
+            pos = bisect.bisect_left(postings, i)
+            if pos == len(postings) or postings[pos] != i:
+                postings.insert(pos, i)
+        self._fuzzy_size[i] = len(grams)
+
+    def _sort_keys(self):
+        # adds only append; sorting once per batch keeps bulk builds linear-ish
+        pairs = sorted(set(zip(self._keys, self._key_entry)))
+        self._keys = [k for k, _ in pairs]
+        self._key_entry = [i for _, i in pairs]
+        self._keys_sorted = True
+
+    def picked(self, dest_id: str):
+        """The user chose this destination from the keyboard."""
+        i = self._by_id.get(str(dest_id))
+        if i is not None:
+            self.popularity[i] += 1
+            self.dirty = True
+
+    # ----- lookup -----
+
+    def _rank(self, i: int) -> tuple:
+        entry = self.entries[i]
+        is_city = (entry.get("search_type") or "").lower() == "city"
+        return (not is_city, -self.popularity[i], -math.log1p(entry.get("nr_hotels") or 0))
+
+    def _prefix(self, q: str) -> set[int]:
+        if not self._keys_sorted:
+            self._sort_keys()
+        found = set()
+        pos = bisect.bisect_left(self._keys, q)
+        while pos < len(self._keys) and self._keys[pos].startswith(q):
+            found.add(self._key_entry[pos])
+            pos += 1
+        return found
+
+    def _exact(self, q: str) -> set[int]:
+        if not self._keys_sorted:
+            self._sort_keys()
+        found = set()
+        pos = bisect.bisect_left(self._keys, q)
+        while pos < len(self._keys) and self._keys[pos] == q:
+            i = self._key_entry[pos]
+            entry = self.entries[i]
+            # later-word keys ("york") are there for prefixes, they are not the name
+            if q in (fold(entry.get("name") or entry.get("city_name") or ""), fold(entry.get("label") or "")):
+                found.add(i)
+            pos += 1
+        return found
+
+    def _fuzzy(self, q: str) -> list[int]:
+        grams = trigrams(q)
+        shared: dict[int, int] = {}
+        for gram in grams:
+            for i in self._trigrams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        scored = []
+        for i, common in shared.items():
+            dice = 2 * common / (len(grams) + self._fuzzy_size[i])
+            if dice >= FUZZY_THRESHOLD:
+                scored.append((-dice, self._rank(i), i))
+        scored.sort()
+        return [i for _, _, i in scored]
+
+    def exact(self, query: str, limit: int = 5) -> list[dict]:
+        """Destinations named exactly what the user typed (after folding); [] means ask the API."""
+        q = fold(query)
+        found = sorted(self._exact(q), key=self._rank) if q else []
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return [dict(self.entries[i]) for i in found[:limit]]
+
+    def search(self, query: str, limit: int = 5) -> list[dict]:
+        """Prefix, then typo-tolerant matches. Suggestions only: they can be another place."""
+        q = fold(query)
+        if not q:
+            return []
+        found = sorted(self._prefix(q), key=self._rank)
+        if not found and len(q) >= MIN_FUZZY_LEN:
+            found = self._fuzzy(q)
+        return [dict(self.entries[i]) for i in found[:limit]]
+
+    def get(self, dest_id: str) -> dict | None:
+        i = self._by_id.get(str(dest_id))
+        return dict(self.entries[i]) if i is not None else None
+
+    def stats(self) -> dict:
+        if not self._keys_sorted:
+            self._sort_keys()
+        return {"destinations": len(self.entries), "keys": len(self._keys), "hits": self.hits, "misses": self.misses}
+
+    # ----- file -----
+
+    def save(self, path: str = DEST_INDEX_PATH):
+        if not self._keys_sorted:
+            self._sort_keys()
+        payload = json.dumps({
+            "entries": self.entries,
+            "popularity": self.popularity,
+            "keys": self._keys,
+            "key_entry": self._key_entry,
+            "trigrams": self._trigrams,
+            "fuzzy_size": self._fuzzy_size,
+        }, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(payload)))
+            f.write(payload)
+        os.replace(tmp, path)  # readers never see a half-written file
+        self.dirty = False
+
+    def load(self, path: str = DEST_INDEX_PATH) -> bool:
+        """Replace the contents with the prebuilt index in `path`. False if missing or unreadable."""
+        try:
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                magic, size = _HEADER.unpack_from(mm)
+                if magic != MAGIC:
+                    raise ValueError(f"not a destination index: {magic!r}")
+                data = json.loads(mm[_HEADER.size:_HEADER.size + size])
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError, struct.error):
+            logger.warning("Destination index %s is unreadable, rebuilding", path, exc_info=True)
+            return False
+
+        self.entries = data["entries"]
+        self.popularity = data["popularity"]
+        self._keys = data["keys"]
+        self._key_entry = data["key_entry"]
+        self._trigrams = data["trigrams"]
+        self._fuzzy_size = data["fuzzy_size"]
+        self._by_id = {e["dest_id"]: i for i, e in enumerate(self.entries)}
+        self._keys_sorted = True
+        self.dirty = False
+        return True
+
+
+def load_seed(path: str) -> list[dict]:
+    """JSON list or JSONL of destination objects (searchDestination's `data` items)."""
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def build_from_db(index: DestinationIndex):
+    """Blocking: every destination answer still in ApiCache, popularity from search history."""
+    from peewee import fn
+    from database.models import ApiCache, SearchHistory
+
+    for row in ApiCache.select(ApiCache.value).where(ApiCache.key.startswith("dest:")):
+        try:
+            index.add_many(json.loads(row.value))
+        except (ValueError, TypeError, AttributeError):
+            continue
+    picks = (SearchHistory
+             .select(SearchHistory.dest_id, fn.COUNT(SearchHistory.id).alias("n"))
+             .group_by(SearchHistory.dest_id))
+    for row in picks:
+        i = index._by_id.get(str(row.dest_id))
+        if i is not None:
+            index.popularity[i] += row.n
+
+
+def init_index(index: "DestinationIndex", path: str = DEST_INDEX_PATH, seed: str = DEST_INDEX_SEED):
+    """Startup (blocking): the saved file if there is one, otherwise SQLite + seed."""
+    if index.load(path):
+        logger.info("Destination index: %d destinations from %s", len(index), path)
+        return
+    build_from_db(index)
+    if seed:
+        index.add_many(load_seed(seed))
+    index.save(path)
+    logger.info("Destination index: built %d destinations into %s", len(index), path)
+
+
+destination_index = DestinationIndex() if DEST_INDEX_ENABLED else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Destination autocomplete index")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="rebuild the index file from the database (+ seed)")
+    build.add_argument("--seed", default=DEST_INDEX_SEED)
+    build.add_argument("--path", default=DEST_INDEX_PATH)
+    query = sub.add_parser("query", help="look something up in the saved index")
+    query.add_argument("text")
+    query.add_argument("--path", default=DEST_INDEX_PATH)
+    args = parser.parse_args()
+
+    index = DestinationIndex()
+    if args.command == "build":
+        from database.init_db import init_db
+        init_db()
+        build_from_db(index)
+        if args.seed:
+            index.add_many(load_seed(args.seed))
+        index.save(args.path)
+        print(f"{len(index)} destinations, {index.stats()['keys']} keys -> {args.path}")
+    else:
+        if not index.load(args.path):
+            raise SystemExit(f"no index at {args.path}")
+        for d in index.search(args.text, limit=10):
+            print(f"{d['dest_id']:>12}  {d['search_type']:<10} {d.get('label') or d.get('name')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Photos and description of a single hotel, cached so the 📷 / ℹ️ buttons
+(and the prefetcher, see services/prefetch.py) share the same results.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from peewee import fn, SQL, Tuple
+
+from config import (
+    PHOTO_CACHE_SIZE, PHOTO_CACHE_TTL,
+    DETAILS_CACHE_SIZE, DETAILS_CACHE_TTL,
+    DESCRIPTION_TTL, DESCRIPTION_DB_MAX_ROWS,
+)
+from database.db import db, run_db
+from database.models import HotelDetails, SearchHistory, SearchHistoryPayload
+from services.booking_api import get_hotel_photos, get_description_and_info, BookingAPIError
+from services.cache import TTLCache, SqliteCacheBackend, SingleFlight
+from services.rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+PHOTOS_PER_HOTEL = 3
+DESCRIPTION_MAX_LEN = 3500  # Telegram limit-friendly
+
+
+def _upsert(hotel_id: str, languagecode: str, description: str, now: float):
+    # INSERT .. ON CONFLICT DO UPDATE: REPLACE is SQLite/MySQL only
+    return (HotelDetails
+            .insert(hotel_id=hotel_id, languagecode=languagecode, description=description,
+                    fetched_at=now, last_used=now)
+            .on_conflict(conflict_target=[HotelDetails.hotel_id, HotelDetails.languagecode],
+                         preserve=[HotelDetails.description, HotelDetails.fetched_at, HotelDetails.last_used]))
+
+
+class HotelDetailsBackend:
+    """
+    TTLCache backend on the HotelDetails table: (hotel_id, languagecode) ->
+    description text. Keeps about `max_rows` rows, dropping the least
+    recently used ones; the table is counted only every `trim_every` writes,
+    so it may run that many rows over in between.
+    """
+
+    # last_used is refreshed at most this often, so reads rarely write
+    TOUCH_EVERY = 3600
+
+    def __init__(self, max_rows: int = DESCRIPTION_DB_MAX_ROWS, trim_every: int = 100):
+        self.max_rows = max_rows
+        self.trim_every = trim_every
+        self.evictions = 0
+        self._until_trim = 0      # the first write trims: the table may be over from a previous run
+
+    def get(self, key):
+        hotel_id, languagecode = key
+        row = HotelDetails.get_or_none(
+            (HotelDetails.hotel_id == hotel_id) & (HotelDetails.languagecode == languagecode)
+        )
+        if row is None:
+            return None
+        now = time.time()
+        ttl_left = row.fetched_at + DESCRIPTION_TTL - now
+        if ttl_left <= 0:
+            row.delete_instance()
+            return None
+        if now - row.last_used > self.TOUCH_EVERY:
+            (HotelDetails
+             .update(last_used=now)
+             .where((HotelDetails.hotel_id == hotel_id) & (HotelDetails.languagecode == languagecode))
+             .execute())
+        return row.description, ttl_left
+
+    def delete(self, key):
+        hotel_id, languagecode = key
+        (HotelDetails
+         .delete()
+         .where((HotelDetails.hotel_id == hotel_id) & (HotelDetails.languagecode == languagecode))
+         .execute())
+
+    def set(self, key, value, ttl):
+        hotel_id, languagecode = key
+        now = time.time()
+        _upsert(hotel_id, languagecode, value, now).execute()
+        self._until_trim -= 1
+        if self._until_trim <= 0:
+            self._until_trim = self.trim_every
+            self.trim()
+
+    def trim(self) -> int:
+        """Delete the least recently used rows over max_rows in one statement."""
+        with db.atomic():
+            extra = HotelDetails.select().count() - self.max_rows
+            if extra <= 0:
+                return 0
+            # drop a bit more than needed so the next trims find nothing to do
+            extra += self.max_rows // 100
+            key = Tuple(HotelDetails.hotel_id, HotelDetails.languagecode)
+            oldest = (HotelDetails
+                      .select(HotelDetails.hotel_id, HotelDetails.languagecode)
+                      .order_by(HotelDetails.last_used)
+                      .limit(extra))
+            deleted = HotelDetails.delete().where(key.in_(oldest)).execute()
+        self.evictions += deleted
+        return deleted
+
+
+# hotel_id -> Telegram file_ids of its photos (persisted in ApiCache)
+photo_file_cache = TTLCache(
+    "photo_file_ids",
+    maxsize=PHOTO_CACHE_SIZE,
+    ttl=PHOTO_CACHE_TTL,
+    backend=SqliteCacheBackend("photo"),
+)
+# hotel_id -> photo URLs from getHotelPhotos
+photo_url_cache = TTLCache("photo_urls", maxsize=DETAILS_CACHE_SIZE, ttl=DETAILS_CACHE_TTL)
+# (hotel_id, languagecode) -> description text, already extracted and truncated;
+# descriptions rarely change, so they are kept on disk for DESCRIPTION_TTL
+description_cache = TTLCache(
+    "descriptions",
+    maxsize=DETAILS_CACHE_SIZE,
+    ttl=DESCRIPTION_TTL,
+    backend=HotelDetailsBackend(),
+)
+# a button tap while the prefetcher is already fetching the same hotel joins that request
+_flight = SingleFlight()
+
+
+def extract_description(resp: dict) -> str:
+    data_obj = resp.get("data") or {}
+    if isinstance(data_obj, list):
+        data_obj = next((d for d in data_obj if isinstance(d, dict) and d.get("description")), {})
+    # часто описание лежит в одном из этих полей (зависит от провайдера)
+    description = (
+        data_obj.get("description") or
+        data_obj.get("hotel_description") or
+        data_obj.get("text") or
+        ""
+    )
+    description = description.strip()
+    if len(description) > DESCRIPTION_MAX_LEN:
+        description = description[:DESCRIPTION_MAX_LEN] + "…"
+    return description
+
+
+async def get_photo_urls(hotel_id: str, limit: int = PHOTOS_PER_HOTEL) -> list[str]:
+    """First `limit` usable photo URLs ([] if the hotel has none). Raises BookingAPIError."""
+    hotel_id = str(hotel_id)
+    urls = photo_url_cache.get(hotel_id, allow_stale=rate_limiter.quota_low())
+    if urls is not None:
+        return urls[:limit]
+
+    async def fetch():
+        try:
+            resp = await get_hotel_photos(hotel_id)
+        except BookingAPIError:
+            stale = photo_url_cache.get(hotel_id, allow_stale=True)
+            if stale is None:
+                raise
+            return stale
+        photos = (resp.get("data") or {}).get("photos") or []
+        urls = []
+        for p in photos:
+            url = p.get("url") or p.get("photoUrl") or p.get("mainUrl")
+            if url:
+                urls.append(url)
+            if len(urls) >= PHOTOS_PER_HOTEL:
+                break
+        photo_url_cache.set(hotel_id, urls)
+        return urls
+
+    urls = await _flight.do(("photos", hotel_id), fetch)
+    return urls[:limit]
+
+
+async def get_description(hotel_id: str, languagecode: str = "en-us") -> str:
+    """Description text ('' if none). Raises BookingAPIError."""
+    key = (str(hotel_id), languagecode)
+    description = await description_cache.aget(key)
+    if description is not None:
+        return description
+
+    async def fetch():
+        try:
+            resp = await get_description_and_info(str(hotel_id), languagecode=languagecode)
+        except BookingAPIError:
+            stale = description_cache.get(key, allow_stale=True)
+            if stale is None:
+                raise
+            return stale
+        description = extract_description(resp)
+        await description_cache.aset(key, description)
+        return description
+
+    return await _flight.do(("description",) + key, fetch)
+
+
+def is_cached(hotel_id: str, languagecode: str = "en-us") -> bool:
+    hotel_id = str(hotel_id)
+    has_photos = hotel_id in photo_url_cache or photo_file_cache.get(hotel_id) is not None
+    return has_photos and (hotel_id, languagecode) in description_cache
+
+
+def _popular_hotel_ids(destinations: int, per_destination: int, days: int) -> list[str]:
+    """Top hotels of the most searched destinations, taken from their latest search."""
+    since = datetime.utcnow() - timedelta(days=days)
+    popular = (SearchHistory
+               .select(SearchHistory.dest_id,
+                       fn.COUNT(SearchHistory.id).alias("searches"),
+                       fn.MAX(SearchHistory.id).alias("last_id"))
+               .where(SearchHistory.created_at >= since)
+               .group_by(SearchHistory.dest_id)
+               .order_by(SQL("searches").desc())
+               .limit(destinations))
+
+    hotel_ids = []
+    for row in popular:
+        payload = SearchHistoryPayload.get_or_none(SearchHistoryPayload.history == row.last_id)
+        if not payload:
+            continue
+        for h in payload.unpack()[:per_destination]:
+            if h.get("hotel_id") and str(h["hotel_id"]) not in hotel_ids:
+                hotel_ids.append(str(h["hotel_id"]))
+    return hotel_ids
+
+
+async def warm_up_descriptions(destinations: int = 10, per_destination: int = 10, days: int = 30,
+                               languagecode: str = "en-us", concurrency: int = 3) -> dict:
+    """Preload descriptions for the top hotels of popular destinations."""
+    hotel_ids = await run_db(_popular_hotel_ids, destinations, per_destination, days)
+    sem = asyncio.Semaphore(concurrency)
+    stats = {"hotels": len(hotel_ids), "fetched": 0, "cached": 0, "failed": 0, "skipped": 0}
+
+    async def one(hotel_id):
+        key = (hotel_id, languagecode)
+        if await description_cache.aget(key) is not None:
+            stats["cached"] += 1
+            return
+        async with sem:
+            if rate_limiter.quota_low():
+                stats["skipped"] += 1  # keep the rest of the quota for users
+                return
+            try:
+                await get_description(hotel_id, languagecode)
+                stats["fetched"] += 1
+            except BookingAPIError:
+                logger.warning("Warm-up failed for hotel %s", hotel_id, exc_info=True)
+                stats["failed"] += 1
+
+    await asyncio.gather(*(one(h) for h in hotel_ids))
+    return stats
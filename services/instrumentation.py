@@ -0,0 +1,144 @@
+"""
+Wires services/metrics.py into the running bot: times every registered
+handler and every Bot API request, and exposes cache / queue stats as gauges.
+"""
+import functools
+import time
+
+from telegram.ext import Application, ApplicationHandlerStop, ConversationHandler
+from telegram.request import HTTPXRequest
+
+from database.db import set_timing_hook
+from database.history_writer import history_writer
+from services import metrics, resilience
+from services.cache import all_cache_stats
+from services.prefetch import prefetcher
+from services.rate_limit import rate_limiter
+from services.result_store import result_store
+from services.send_queue import send_scheduler
+from services.tap_coalescer import tap_coalescer
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that records the latency of each Bot API method."""
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        started = time.perf_counter()
+        status = "error"
+        try:
+            status, payload = await super().do_request(
+                url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout
+            )
+            return status, payload
+        finally:
+            # .../bot<token>/sendMessage -> sendMessage (never label with the token)
+            metrics.telegram_seconds.observe(
+                time.perf_counter() - started, method=url.rsplit("/", 1)[-1], status=status
+            )
+
+
+def _timed_callback(callback, name: str):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            metrics.handler_errors.inc(handler=name)
+            raise
+        finally:
+            metrics.handler_seconds.observe(time.perf_counter() - started, handler=name)
+
+    return wrapper
+
+
+def _instrument_handler(handler):
+    if isinstance(handler, ConversationHandler):
+        for h in handler.entry_points + handler.fallbacks:
+            _instrument_handler(h)
+        for handlers in handler.states.values():
+            for h in handlers:
+                _instrument_handler(h)
+        return
+    callback = getattr(handler, "callback", None)
+    if callback is None or hasattr(callback, "__wrapped__"):
+        return
+    handler.callback = _timed_callback(callback, getattr(callback, "__name__", type(callback).__name__))
+
+
+def _observe_db(seconds: float, name: str):
+    metrics.stage_seconds.observe(seconds, stage=f"db:{name}")
+
+
+def _cache_samples(field: str) -> dict:
+    return {(("cache", name),): s[field] for name, s in all_cache_stats().items()}
+
+
+def _queue_samples(app: Application) -> dict:
+    samples = {
+        (("queue", "rapidapi"),): rate_limiter.queue_depth(),
+        (("queue", "history_writer"),): history_writer.queue_size(),
+        (("queue", "prefetch"),): prefetcher.stats()["in_flight"],
+        (("queue", "card_renders"),): tap_coalescer.stats()["pending"],
+        (("queue", "updates"),): app.update_queue.qsize(),
+    }
+    for priority, depth in send_scheduler.stats()["queued"].items():
+        samples[(("queue", f"telegram_{priority}"),)] = depth
+    processor = app.update_processor
+    if hasattr(processor, "active_chats"):
+        samples[(("queue", "active_chats"),)] = processor.active_chats()
+    return samples
+
+
+def _endpoint_samples(field: str) -> dict:
+    return {(("endpoint", name),): s[field] for name, s in resilience.all_endpoint_stats().items()}
+
+
+def instrument_application(app: Application):
+    """Call after all handlers are added."""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _instrument_handler(handler)
+    set_timing_hook(_observe_db)
+
+    register = metrics.register
+    register(metrics.GaugeCallback(
+        "bot_cache_hits_total", "Cache hits", lambda: _cache_samples("hits"), kind="counter"
+    ))
+    register(metrics.GaugeCallback(
+        "bot_cache_misses_total", "Cache misses", lambda: _cache_samples("misses"), kind="counter"
+    ))
+    register(metrics.GaugeCallback("bot_cache_entries", "Entries held in memory", lambda: _cache_samples("size")))
+    register(metrics.GaugeCallback("bot_queue_depth", "Items waiting per queue", lambda: _queue_samples(app)))
+    register(metrics.GaugeCallback(
+        "bot_rapidapi_quota_remaining", "RapidAPI calls left today",
+        lambda: {(): rate_limiter.stats()["quota_remaining"]},
+    ))
+    register(metrics.GaugeCallback(
+        "bot_result_sets_in_memory", "Search result sets held in memory",
+        lambda: {(): result_store.stats()["in_memory"]},
+    ))
+    register(metrics.GaugeCallback(
+        "booking_breaker_open", "1 while the endpoint's circuit breaker is not closed",
+        lambda: {k: int(v != "closed") for k, v in _endpoint_samples("state").items()},
+    ))
+    register(metrics.GaugeCallback(
+        "booking_retries_total", "Upstream retries", lambda: _endpoint_samples("retries"), kind="counter"
+    ))
+    register(metrics.GaugeCallback(
+        "booking_hedges_total", "Hedged requests", lambda: _endpoint_samples("hedges"), kind="counter"
+    ))
+    register(metrics.GaugeCallback(
+        "bot_taps_total", "Button taps by what came of them",
+        lambda: {(("outcome", k),): v for k, v in tap_coalescer.stats().items()
+                 if k in ("taps", "renders", "duplicates")},
+        kind="counter",
+    ))
+    register(metrics.GaugeCallback(
+        "telegram_sent_total", "Bot API requests released by the send queue",
+        lambda: {(("priority", k),): v for k, v in send_scheduler.stats()["sent"].items()},
+        kind="counter",
+    ))
@@ -0,0 +1,210 @@
+"""
+In-process metrics with Prometheus text output.
+
+Latency histograms for handlers, Booking API functions, upstream endpoints,
+Telegram Bot API calls and internal stages (filtering, db); gauges read
+cache / queue stats at scrape time. Served on METRICS_PORT (/metrics) and
+summarized by the admin /stats command.
+"""
+import asyncio
+import bisect
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _label_str(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def quantile(self, q: float, labels: tuple) -> float | None:
+        """Estimate from buckets (upper bound of the bucket holding the q-th sample)."""
+        series = self._series.get(labels)
+        if not series or not series[-1]:
+            return None
+        rank = q * series[-1]
+        seen = 0
+        for bound, n in zip(self.buckets, series):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> list[dict]:
+        """One row per label set: labels, count, avg, p50, p95 (slowest p95 first)."""
+        rows = [
+            {"labels": dict(labels), "count": series[-1], "avg": series[-2] / series[-1],
+             "p50": self.quantile(0.5, labels), "p95": self.quantile(0.95, labels)}
+            for labels, series in self._series.items() if series[-1]
+        ]
+        return sorted(rows, key=lambda r: r["p95"], reverse=True)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_label_str(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_str(labels + (('le', '+Inf'),))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(labels)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_label_str(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_label_str(k)} {v}" for k, v in sorted(self._values.items())]
+        return lines
+
+
+class GaugeCallback:
+    """
+    Samples come from `collect()` -> {labels tuple: value} at scrape time, so
+    counters kept elsewhere (cache hits, retries) can be exposed as they are.
+    """
+
+    def __init__(self, name: str, help_text: str, collect, kind: str = "gauge"):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+        self.kind = kind
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = self.collect()
+        except Exception:
+            logger.exception("Collecting %s failed", self.name)
+            return lines
+        lines += [f"{self.name}{_label_str(k)} {v}" for k, v in sorted(samples.items()) if v is not None]
+        return lines
+
+
+_registry: dict[str, object] = {}   # name -> metric, in registration order
+
+
+def register(metric):
+    """Add `metric`; one registered again under the same name replaces the old one in place."""
+    _registry[metric.name] = metric
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry.values():
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+handler_seconds = register(Histogram("bot_handler_seconds", "Telegram handler latency"))
+handler_errors = register(Counter("bot_handler_errors_total", "Handlers that raised"))
+booking_seconds = register(Histogram("booking_function_seconds", "services/booking_api.py call latency"))
+upstream_seconds = register(Histogram("booking_upstream_seconds", "Single HTTP request to the Booking API"))
+telegram_seconds = register(Histogram("telegram_api_seconds", "Telegram Bot API request latency"))
+stage_seconds = register(Histogram("bot_stage_seconds", "Internal stage latency (filtering, db, ...)"))
+send_delay_seconds = register(Histogram("telegram_send_delay_seconds", "Time a Bot API request waited for pacing"))
+send_retry_after = register(Counter("telegram_retry_after_total", "RetryAfter (flood control) answers from Telegram"))
+edits_skipped = register(Counter("bot_edits_skipped_total", "Message edits not sent because nothing changed"))
+
+
+def timed(histogram: Histogram, **labels):
+    """Decorator for coroutine functions."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage=name)
+
+
+# ----- metrics endpoint -----
+
+async def _serve_metrics(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        path = request_line.split(b" ")[1] if request_line.count(b" ") >= 2 else b"/"
+        if path.split(b"?")[0] == b"/metrics":
+            status, body = "200 OK", render().encode("utf-8")
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            f"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+_server: asyncio.AbstractServer | None = None
+
+
+async def start_metrics_server(host: str, port: int):
+    global _server
+    _server = await asyncio.start_server(_serve_metrics, host, port)
+    logger.info("Metrics on http://%s:%s/metrics", host, port)
+
+
+async def stop_metrics_server():
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
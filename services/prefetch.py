@@ -0,0 +1,103 @@
+"""
+Speculative prefetch of photos + description for the hotels next to the card
+a user is looking at, so the 📷 / ℹ️ buttons answer from cache.
+
+Budget: at most PREFETCH_PER_USER hotels per user and PREFETCH_GLOBAL_CONCURRENCY
+hotels bot-wide in flight. Moving to another card or cancelling the search
+cancels that user's pending prefetches.
+"""
+import asyncio
+import logging
+
+from config import (
+    PREFETCH_ENABLED, PREFETCH_PREVIOUS,
+    PREFETCH_GLOBAL_CONCURRENCY, PREFETCH_PER_USER,
+)
+from services.hotel_details import get_photo_urls, get_description, is_cached, photo_file_cache
+from services.result_store import result_store
+from services.rate_limit import rate_limiter, current_user
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    def __init__(self, enabled: bool = PREFETCH_ENABLED,
+                 global_limit: int = PREFETCH_GLOBAL_CONCURRENCY,
+                 per_user: int = PREFETCH_PER_USER,
+                 include_previous: bool = PREFETCH_PREVIOUS):
+        self.enabled = enabled
+        self.per_user = per_user
+        self.include_previous = include_previous
+        self._global = asyncio.Semaphore(global_limit)
+        self._tasks: dict[int, list[asyncio.Task]] = {}
+        self.started = 0
+        self.cancelled = 0
+        self.skipped = 0
+
+    async def around(self, user_id: int, result_id: str | None, index: int):
+        """Card `index` is on screen: prefetch index+1 (and index-1 if enabled)."""
+        if not self.enabled or not result_id:
+            return
+        positions = [index + 1]
+        if self.include_previous and index > 0:
+            positions.append(index - 1)
+
+        hotels = []
+        for pos in positions:
+            hotel, real_pos, _ = await result_store.get(result_id, pos)
+            if hotel and real_pos == pos and hotel.hotel_id:
+                hotels.append(hotel)
+        self.schedule(user_id, hotels)
+
+    def schedule(self, user_id: int, hotels: list):
+        # the user moved on: whatever was pending for the old card is not needed
+        self.cancel(user_id)
+        if rate_limiter.quota_low():
+            return  # quota is for real taps now
+        tasks = []
+        for hotel in hotels[:self.per_user]:
+            if is_cached(hotel.hotel_id):
+                self.skipped += 1
+                continue
+            task = asyncio.create_task(self._prefetch(str(hotel.hotel_id)))
+            task.add_done_callback(lambda t, uid=user_id: self._forget(uid, t))
+            tasks.append(task)
+            self.started += 1
+        if tasks:
+            self._tasks[user_id] = tasks
+
+    def cancel(self, user_id: int):
+        for task in self._tasks.pop(user_id, []):
+            if not task.done():
+                task.cancel()
+                self.cancelled += 1
+
+    def _forget(self, user_id: int, task: asyncio.Task):
+        tasks = self._tasks.get(user_id)
+        if tasks and task in tasks:
+            tasks.remove(task)
+            if not tasks:
+                del self._tasks[user_id]
+
+    async def _prefetch(self, hotel_id: str):
+        # queue as background work, not as the user's own calls
+        current_user.set(None)
+        async with self._global:
+            jobs = [get_description(hotel_id)]
+            if photo_file_cache.get(hotel_id) is None:
+                jobs.append(get_photo_urls(hotel_id))
+            results = await asyncio.gather(*jobs, return_exceptions=True)
+        for r in results:
+            if isinstance(r, Exception):
+                logger.debug("Prefetch for hotel %s failed: %r", hotel_id, r)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": sum(len(t) for t in self._tasks.values()),
+            "started": self.started,
+            "cancelled": self.cancelled,
+            "skipped": self.skipped,
+        }
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,244 @@
+"""
+Client-side pacing for RapidAPI (Booking) calls.
+
+- token bucket shared by every endpoint, each call costs its endpoint weight
+- daily quota budget (UTC day); once it runs low the cached lookups prefer
+  stale data and background work (prefetch, warm-up) is skipped. The day's
+  count is saved in the ApiCache table in the background, so a restart
+  carries on from it (one bot process per database, see
+  database/persistence.py). Calls are charged when they leave the queue;
+  a queued call that no longer fits the quota fails then
+- fair queueing: waiting calls are served round-robin per user, so one user
+  paging through many hotels cannot starve everyone else
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from config import (
+    RAPIDAPI_RATE, RAPIDAPI_BURST,
+    RAPIDAPI_DAILY_QUOTA, RAPIDAPI_QUOTA_LOW, RAPIDAPI_ENDPOINT_WEIGHTS,
+)
+from database.db import run_db
+from services.cache import SqliteCacheBackend
+
+logger = logging.getLogger(__name__)
+
+# a day's count is kept a little longer than the day itself
+QUOTA_KEEP_SECONDS = 2 * 24 * 3600
+
+# Telegram user the current update belongs to (set by handlers/middleware.py);
+# None for background work, which queues as its own "user"
+current_user: contextvars.ContextVar[int | None] = contextvars.ContextVar("current_user", default=None)
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+class RateLimiter:
+    def __init__(self, rate: float = RAPIDAPI_RATE, burst: int = RAPIDAPI_BURST,
+                 daily_quota: int = RAPIDAPI_DAILY_QUOTA, quota_low: float = RAPIDAPI_QUOTA_LOW,
+                 weights: dict[str, int] = RAPIDAPI_ENDPOINT_WEIGHTS, store=None):
+        self.rate = rate
+        self.burst = burst
+        self.daily_quota = daily_quota
+        self.quota_low_fraction = quota_low
+        self.weights = weights
+
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+
+        # keeps the day's count across restarts: get(day) / set(day, count, ttl) like SqliteCacheBackend
+        self.store = store
+        self._day = self._today()
+        self.quota_used = 0
+        self._loaded_day = None
+        self._saver: asyncio.Task | None = None
+        self._unsaved = False
+
+        self._queues: OrderedDict = OrderedDict()   # user -> deque[(future, weight, enqueued_at)]
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+
+        self.calls = 0
+        self.throttled = 0       # 429s seen from upstream
+        self.rejected = 0        # refused because the daily quota is spent
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    def _roll_day(self):
+        today = self._today()
+        if today != self._day:
+            self._day = today
+            self.quota_used = 0
+
+    @property
+    def quota_remaining(self) -> int:
+        self._roll_day()
+        return max(0, self.daily_quota - self.quota_used)
+
+    def quota_low(self) -> bool:
+        return self.quota_remaining <= self.daily_quota * self.quota_low_fraction
+
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _exhausted(self) -> QuotaExhausted:
+        return QuotaExhausted(f"Daily RapidAPI quota of {self.daily_quota} calls is spent")
+
+    async def acquire(self, endpoint: str):
+        """Wait for this user's turn and enough tokens. Raises QuotaExhausted."""
+        weight = self.weights.get(endpoint, 1)
+        self._roll_day()
+        if self.store is not None and self._loaded_day != self._day:
+            await self._load()
+        if self.quota_remaining < weight:
+            self.rejected += 1
+            raise self._exhausted()
+
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        user = current_user.get()
+        self._queues.setdefault(user, deque()).append((future, weight, time.monotonic()))
+        self._wakeup.set()
+        await future
+
+    def try_acquire(self, endpoint: str) -> bool:
+        """Take the tokens only if nobody is queued and they are there right now (hedges never wait)."""
+        weight = self.weights.get(endpoint, 1)
+        if self.queue_depth() or self.quota_remaining < weight:
+            return False
+        self._refill()
+        if self._tokens < weight:
+            return False
+        self._tokens -= weight
+        self._charge(weight)
+        return True
+
+    def on_throttled(self):
+        """Upstream answered 429: drain the bucket so the next calls back off."""
+        self.throttled += 1
+        self._tokens = min(self._tokens, 0.0)
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="rapidapi_rate_limiter")
+
+    def _next_waiter(self):
+        # round-robin: take one call from the first user, move that user to the back
+        while self._queues:
+            user, queue = next(iter(self._queues.items()))
+            item = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            if not item[0].cancelled():
+                return item
+        return None
+
+    async def _dispatch(self):
+        while True:
+            item = self._next_waiter()
+            if item is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            future, weight, enqueued_at = item
+            # the quota may have been spent while this call was queued
+            if not self._fits(future, weight):
+                continue
+            await self._take_tokens(weight)
+            if future.cancelled() or not self._fits(future, weight):
+                # gave up, or the quota ran out while waiting for tokens: give them back
+                self._tokens += weight
+                continue
+
+            self._charge(weight)
+            waited = time.monotonic() - enqueued_at
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            future.set_result(None)
+
+    def _fits(self, future: asyncio.Future, weight: int) -> bool:
+        """True if the quota left covers `weight`; otherwise the waiter fails with QuotaExhausted."""
+        if self.quota_remaining >= weight:
+            return True
+        self.rejected += 1
+        if not future.done():
+            future.set_exception(self._exhausted())
+        return False
+
+    def _charge(self, weight: int):
+        self._roll_day()
+        self.quota_used += weight
+        self.calls += 1
+        if self.store is not None:
+            self._unsaved = True
+            if self._saver is None or self._saver.done():
+                self._saver = asyncio.create_task(self._save(), name="rapidapi_quota_save")
+
+    # ----- the day's count on disk -----
+
+    async def _load(self):
+        day = self._day
+        try:
+            stored = await run_db(self.store.get, day.isoformat())
+        except Exception:
+            logger.warning("Loading the RapidAPI quota count failed", exc_info=True)
+            stored = None
+        if day == self._day:
+            self.quota_used = max(self.quota_used, stored[0] if stored else 0)
+            self._loaded_day = day
+
+    async def _save(self):
+        # one write at a time, always of the latest count
+        while self._unsaved:
+            self._unsaved = False
+            try:
+                await run_db(self.store.set, self._day.isoformat(), self.quota_used, QUOTA_KEEP_SECONDS)
+            except Exception:
+                logger.warning("Saving the RapidAPI quota count failed", exc_info=True)
+
+    async def flush(self):
+        """Wait until the day's count is saved (on shutdown)."""
+        if self._saver is not None and not self._saver.done():
+            await self._saver
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    async def _take_tokens(self, weight: int):
+        while True:
+            self._refill()
+            if self._tokens >= weight:
+                self._tokens -= weight
+                return
+            await asyncio.sleep((weight - self._tokens) / self.rate)
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth(),
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "rejected": self.rejected,
+            "wait_avg": self.wait_total / self.calls if self.calls else 0.0,
+            "wait_max": self.wait_max,
+            "quota_used": self.quota_used,
+            "quota_remaining": self.quota_remaining,
+        }
+
+
+rate_limiter = RateLimiter(store=SqliteCacheBackend("rapidapi_quota"))
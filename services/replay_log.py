@@ -0,0 +1,86 @@
+"""
+Append-only JSONL log of production traffic for benchmarks/replay.py.
+
+One JSON object per line, `t` = seconds since the session's "start" record:
+
+    {"type": "start", "t": 0, "wall": 1760000000.0, "version": 1}
+    {"type": "update", "t": 1.25, "update": {...Update.to_dict()...}}
+    {"type": "handled", "t": 1.43, "update_id": 5, "dur": 0.18}
+    {"type": "booking", "t": 1.30, "path": "/api/v1/hotels/searchHotels",
+     "params": {...}, "status": 200, "dur": 0.41, "body": "..."}
+
+A failed request has "status": null and "error": "<exception class>".
+A ".gz" path writes gzip members, which can be appended to and read as
+one stream.
+"""
+import gzip
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1
+
+
+class ReplayLog:
+    def __init__(self):
+        self._file = None
+        self._t0 = 0.0
+        self.records = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def open(self, path: str):
+        if path.endswith(".gz"):
+            self._file = gzip.open(path, "at", encoding="utf-8")
+        else:
+            self._file = open(path, "a", encoding="utf-8")
+        self._t0 = time.monotonic()
+        self._write({"type": "start", "wall": time.time(), "version": VERSION})
+        logger.info("Recording updates and Booking API traffic to %s", path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: dict):
+        record["t"] = round(time.monotonic() - self._t0, 4)
+        try:
+            self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        except (OSError, TypeError, ValueError):
+            logger.warning("Could not write replay record", exc_info=True)
+            return
+        self.records += 1
+
+    def update(self, update: dict):
+        self._write({"type": "update", "update": update})
+
+    def handled(self, update_id: int, dur: float):
+        self._write({"type": "handled", "update_id": update_id, "dur": round(dur, 4)})
+
+    def booking(self, path: str, params: dict, status: int | None, body: str | None, dur: float,
+                error: str | None = None):
+        record = {"type": "booking", "path": path, "params": params, "status": status, "dur": round(dur, 4)}
+        if error:
+            record["error"] = error
+        else:
+            record["body"] = body
+        self._write(record)
+
+
+def read_log(path: str):
+    """Yield records in file order; a torn last line (crash while writing) is skipped."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                logger.warning("Skipping unreadable replay record")
+
+
+replay_log = ReplayLog()
@@ -0,0 +1,226 @@
+"""
+Resilience for upstream (Booking) calls, per endpoint:
+
+- latency budget: all attempts of one call must finish within it
+- retries with full-jitter exponential backoff on timeouts / transport errors / 5xx
+- hedging: if an attempt is slower than the endpoint's recent p95, a duplicate
+  is sent and whichever answers first wins
+- circuit breaker: after N consecutive failures calls fail fast for a while,
+  then a single trial call decides whether to close it again
+"""
+import asyncio
+import random
+import time
+from collections import deque
+
+import httpx
+
+from config import (
+    UPSTREAM_RETRIES, UPSTREAM_BACKOFF_BASE, UPSTREAM_BACKOFF_MAX,
+    UPSTREAM_LATENCY_BUDGETS, UPSTREAM_DEFAULT_BUDGET,
+    UPSTREAM_HEDGE_MIN_SAMPLES, UPSTREAM_BREAKER_FAILURES, UPSTREAM_BREAKER_RESET,
+)
+
+RETRYABLE_ERRORS = (httpx.TimeoutException, httpx.TransportError, asyncio.TimeoutError)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float) -> float | None:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int = UPSTREAM_BREAKER_FAILURES, reset_after: float = UPSTREAM_BREAKER_RESET):
+        self.failure_threshold = failures
+        self.reset_after = reset_after
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_after:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def abandon_trial(self):
+        """The trial call ended without an upstream verdict (cancelled, other error): count it as failed."""
+        if self._trial_running:
+            self.record_failure()
+
+
+class Endpoint:
+    """Resilience state of one upstream endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.budget = UPSTREAM_LATENCY_BUDGETS.get(name, UPSTREAM_DEFAULT_BUDGET)
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fast_failures = 0
+
+    def stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fast_failures": self.fast_failures,
+            "p95": self.latency.percentile(0.95),
+        }
+
+
+_endpoints: dict[str, Endpoint] = {}
+
+
+def endpoint(name: str) -> Endpoint:
+    ep = _endpoints.get(name)
+    if ep is None:
+        ep = _endpoints[name] = Endpoint(name)
+    return ep
+
+
+def all_endpoint_stats() -> dict[str, dict]:
+    return {name: ep.stats() for name, ep in _endpoints.items()}
+
+
+def _retryable(result) -> bool:
+    if isinstance(result, BaseException):
+        return isinstance(result, RETRYABLE_ERRORS)
+    return result.status_code >= 500
+
+
+async def _hedged(ep: Endpoint, send, timeout: float, limiter=None) -> httpx.Response:
+    """One attempt; a duplicate goes out if the first is slower than p95 (and the limiter has a token free)."""
+    first = asyncio.ensure_future(send(timeout))
+    hedge_after = ep.latency.percentile(0.95) if len(ep.latency) >= UPSTREAM_HEDGE_MIN_SAMPLES else None
+    if hedge_after is None or hedge_after >= timeout:
+        return await first
+
+    tasks = [first]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        # a hedge that has to queue for a token would only add load: skip it then
+        if not done and (limiter is None or limiter.try_acquire(ep.name)):
+            ep.hedges += 1
+            tasks.append(asyncio.ensure_future(send(timeout - hedge_after)))
+
+        pending = set(tasks)
+        failed = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and not _retryable(task.result()):
+                    if task is not first:
+                        ep.hedge_wins += 1
+                    return task.result()
+                failed = task
+        # every copy failed: raise its error / return its 5xx response
+        return failed.result()
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+async def call(name: str, send, limiter=None) -> httpx.Response:
+    """
+    Run `send(timeout)` (an awaitable returning an httpx.Response) under the
+    endpoint's budget, retries, hedging and circuit breaker.
+    `limiter` (services.rate_limit.RateLimiter) is asked for a token before
+    every attempt, outside the timed part: waiting in the local queue never
+    uses up the budget, skews the latency percentiles or trips the breaker.
+    Raises CircuitOpenError, the limiter's error, or the last httpx / timeout
+    error once retries are spent; a final 5xx response is returned as is.
+    """
+    ep = endpoint(name)
+    if not ep.breaker.allow():
+        ep.fast_failures += 1
+        raise CircuitOpenError(f"{name}: upstream marked unhealthy, failing fast")
+    # allow() lets exactly one call through while half open: this one
+    trial = ep.breaker.state == CircuitBreaker.HALF_OPEN
+
+    ep.calls += 1
+    try:
+        return await _attempts(ep, send, limiter)
+    finally:
+        if trial:
+            # no-op once a verdict was recorded; cancelled or failed for a reason of
+            # our own (quota, bug) -> failed trial, never a breaker waiting forever
+            ep.breaker.abandon_trial()
+
+
+async def _attempts(ep: Endpoint, send, limiter=None) -> httpx.Response:
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + ep.budget
+    attempt = 0
+    while True:
+        if limiter is not None:
+            queued = loop.time()
+            await limiter.acquire(ep.name)
+            deadline += loop.time() - queued   # the budget is for upstream time only
+        started = loop.time()
+        # split what is left of the budget over the attempts still allowed,
+        # so one hung attempt can't eat the time of the retries
+        timeout = (deadline - started) / (UPSTREAM_RETRIES - attempt + 1)
+        try:
+            # enforced here, not only by the transport's own timeouts
+            result = await asyncio.wait_for(_hedged(ep, send, timeout, limiter), timeout)
+        except RETRYABLE_ERRORS as e:
+            result = e
+
+        if not _retryable(result):
+            ep.latency.add(loop.time() - started)
+            ep.breaker.record_success()
+            return result
+
+        backoff = random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+        attempt += 1
+        if attempt > UPSTREAM_RETRIES or loop.time() + backoff >= deadline:
+            ep.breaker.record_failure()
+            if isinstance(result, BaseException):
+                raise result
+            return result
+
+        ep.retries += 1
+        await asyncio.sleep(backoff)
@@ -0,0 +1,191 @@
+"""
+Per-session hotel result sets, kept out of context.user_data.
+
+user_data only holds {"result_id": ..., "hotel_index": ...}. The records live
+here: recently used sets in an in-memory LRU, older ones spilled to the
+ResultRow table, from which a single card is loaded on demand. Spilling runs
+in a background task, so put() never waits for the db. Sets are dropped when
+their session starts a new search or cancels; spilled ones still left after
+RESULT_STORE_TTL are deleted by a background task every
+RESULT_STORE_PURGE_INTERVAL.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+from config import RESULT_STORE_SIZE, RESULT_STORE_TTL, RESULT_STORE_PURGE_INTERVAL
+from database.db import db, run_db
+from utils.hotel_record import HotelRecord
+
+logger = logging.getLogger(__name__)
+
+
+def _upsert_rows(rows: list[dict]):
+    from database.models import ResultRow
+
+    # INSERT .. ON CONFLICT DO UPDATE: REPLACE is SQLite/MySQL only
+    return (ResultRow
+            .insert_many(rows)
+            .on_conflict(conflict_target=[ResultRow.result_id, ResultRow.position],
+                         preserve=[ResultRow.data, ResultRow.created_at]))
+
+
+class ResultStore:
+    def __init__(self, maxsize: int = RESULT_STORE_SIZE, ttl: float = RESULT_STORE_TTL,
+                 purge_interval: float = RESULT_STORE_PURGE_INTERVAL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._memory: OrderedDict[str, list[HotelRecord]] = OrderedDict()
+        self._spilling: dict[str, list[HotelRecord]] = {}   # evicted, not written yet
+        self._spiller: asyncio.Task | None = None
+        self._purger: asyncio.Task | None = None
+        self.spills = 0
+        self.disk_reads = 0
+        self.purged = 0
+
+    def start(self):
+        if self.purge_interval > 0:
+            self._purger = asyncio.create_task(self._purge_periodically(), name="result_store_purge")
+
+    async def stop(self):
+        if self._purger is not None:
+            self._purger.cancel()
+            await asyncio.gather(self._purger, return_exceptions=True)
+            self._purger = None
+
+    async def _purge_periodically(self):
+        while True:
+            await asyncio.sleep(self.purge_interval)
+            try:
+                self.purged += await run_db(self.purge_expired)
+            except Exception:
+                logger.warning("Purging expired result sets failed", exc_info=True)
+
+    def __len__(self):
+        return len(self._memory)
+
+    async def put(self, records: list[HotelRecord]) -> str:
+        result_id = uuid.uuid4().hex[:16]
+        self._memory[result_id] = records
+        self._evict()
+        return result_id
+
+    def update(self, result_id: str, records: list[HotelRecord]) -> bool:
+        """Replace a set that is still in memory (streamed pages). False if it was spilled."""
+        if result_id not in self._memory:
+            return False
+        self._memory[result_id] = records
+        self._memory.move_to_end(result_id)
+        return True
+
+    async def drop(self, result_id: str | None):
+        """Forget a set the session no longer points to, spilled rows included."""
+        if not result_id:
+            return
+        if self._memory.pop(result_id, None) is not None or self._spilling.pop(result_id, None) is not None:
+            return   # nothing on disk yet; the spiller deletes a set dropped while it was writing it
+        await run_db(self._delete, result_id)
+
+    async def get(self, result_id: str | None, index: int):
+        """
+        Record at `index` (clamped to the set) -> (record, index, total).
+        (None, 0, 0) if the set is unknown or expired.
+        """
+        if not result_id:
+            return None, 0, 0
+
+        records = self._memory.get(result_id)
+        if records is not None:
+            self._memory.move_to_end(result_id)
+        else:
+            records = self._spilling.get(result_id)
+        if records is not None:
+            if not records:
+                return None, 0, 0
+            index = max(0, min(index, len(records) - 1))
+            return records[index], index, len(records)
+
+        self.disk_reads += 1
+        return await run_db(self._load_row, result_id, index)
+
+    def _evict(self):
+        while len(self._memory) > self.maxsize:
+            result_id, records = self._memory.popitem(last=False)
+            self._spilling[result_id] = records
+            self.spills += 1
+        if self._spilling and (self._spiller is None or self._spiller.done()):
+            self._spiller = asyncio.create_task(self._spill_pending(), name="result_store_spill")
+
+    async def _spill_pending(self):
+        while self._spilling:
+            result_id, records = next(iter(self._spilling.items()))
+            try:
+                await run_db(self._spill, result_id, records)
+                if self._spilling.get(result_id) is records:
+                    del self._spilling[result_id]
+                else:
+                    await run_db(self._delete, result_id)   # dropped while being written
+            except Exception:
+                logger.warning("Spilling result set %s failed", result_id, exc_info=True)
+                self._spilling.pop(result_id, None)
+
+    async def flush(self):
+        """Wait until every evicted set is on disk."""
+        if self._spiller is not None and not self._spiller.done():
+            await self._spiller
+
+    async def spill_all(self):
+        """On shutdown: move every in-memory set to disk so sessions survive a restart."""
+        self._spilling.update(self._memory)
+        self._memory.clear()
+        await self.flush()
+        if self._spilling:
+            await self._spill_pending()
+
+    def _spill(self, result_id: str, records: list[HotelRecord]):
+        now = time.time()
+        rows = [
+            {"result_id": result_id, "position": i, "data": json.dumps(r.to_dict()), "created_at": now}
+            for i, r in enumerate(records)
+        ]
+        with db.atomic():
+            for start in range(0, len(rows), 500):
+                _upsert_rows(rows[start:start + 500]).execute()
+
+    def _load_row(self, result_id: str, index: int):
+        from database.models import ResultRow
+
+        total = (ResultRow
+                 .select()
+                 .where((ResultRow.result_id == result_id) &
+                        (ResultRow.created_at > time.time() - self.ttl))
+                 .count())
+        if not total:
+            return None, 0, 0
+        index = max(0, min(index, total - 1))
+        row = ResultRow.get_or_none((ResultRow.result_id == result_id) & (ResultRow.position == index))
+        if row is None:
+            return None, 0, 0
+        return HotelRecord.from_dict(json.loads(row.data)), index, total
+
+    def _delete(self, result_id: str) -> int:
+        from database.models import ResultRow
+
+        return ResultRow.delete().where(ResultRow.result_id == result_id).execute()
+
+    def purge_expired(self) -> int:
+        """Delete spilled sets older than ttl (sync, call off the event loop)."""
+        from database.models import ResultRow
+
+        return ResultRow.delete().where(ResultRow.created_at < time.time() - self.ttl).execute()
+
+    def stats(self) -> dict:
+        return {"in_memory": len(self._memory), "maxsize": self.maxsize,
+                "spilling": len(self._spilling), "spills": self.spills, "disk_reads": self.disk_reads, "purged": self.purged}
+
+
+result_store = ResultStore()
@@ -0,0 +1,272 @@
+"""
+Outbound Bot API pacing.
+
+Every request the bot makes goes through this scheduler (it is the
+Application's rate limiter), so handlers keep calling reply_text /
+edit_message_text as before:
+
+- global token bucket (Telegram allows about 30 messages/s per bot) and one
+  bucket per chat (about 1/s in private chats with short bursts, 20/min in
+  groups); requests without a chat (getMe, answerCallbackQuery) are not paced
+- priorities: interactive edits and callback answers go before ordinary
+  replies, which go before bulk sends (albums, history reloads); chats of
+  the same priority are served round-robin. Interactive edits answer a
+  tap, so they only wait for a chat that is under flood control
+- RetryAfter blocks that chat for the time Telegram asks, drains the global
+  bucket and the request is queued again, up to TELEGRAM_MAX_RETRIES times
+
+Bulk is picked by endpoint; a handler can mark a reply with
+`with send_priority(BULK): ...`.
+"""
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_BURST,
+    TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, TELEGRAM_GROUP_RATE,
+    TELEGRAM_MAX_RETRIES,
+)
+from services.metrics import send_delay_seconds, send_retry_after
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, NORMAL, BULK = 0, 1, 2
+PRIORITY_NAMES = ("interactive", "normal", "bulk")
+
+INTERACTIVE_ENDPOINTS = frozenset({
+    "answerCallbackQuery", "editMessageText", "editMessageReplyMarkup",
+    "editMessageCaption", "editMessageMedia", "deleteMessage", "sendChatAction",
+})
+BULK_ENDPOINTS = frozenset({"sendMediaGroup", "sendPhoto", "sendDocument"})
+# not counted against message limits
+UNPACED_ENDPOINTS = frozenset({"answerCallbackQuery", "sendChatAction", "getMe", "getUpdates"})
+
+_priority: contextvars.ContextVar[int | None] = contextvars.ContextVar("send_priority", default=None)
+
+
+@contextmanager
+def send_priority(priority: int):
+    """Requests made inside the block are queued with this priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _seconds(value) -> float:
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp", "blocked_until")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = now
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def ready_in(self, now: float) -> float:
+        """Seconds until one token can be taken (0 = now)."""
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def take(self):
+        self.tokens -= 1
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and self.blocked_until <= now
+
+
+class SendScheduler(BaseRateLimiter):
+    def __init__(self, rate: float = TELEGRAM_GLOBAL_RATE, burst: int = TELEGRAM_GLOBAL_BURST,
+                 chat_rate: float = TELEGRAM_CHAT_RATE, chat_burst: int = TELEGRAM_CHAT_BURST,
+                 group_rate: float = TELEGRAM_GROUP_RATE, max_retries: int = TELEGRAM_MAX_RETRIES):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._global = _Bucket(rate, burst, time.monotonic())
+        self._chats: dict[object, _Bucket] = {}
+        # one round-robin of chats per priority: chat -> deque[(future, enqueued_at)]
+        self._queues = [OrderedDict() for _ in PRIORITY_NAMES]
+        self._wakeup: asyncio.Event | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._dispatched = 0
+        self.sent = [0] * len(PRIORITY_NAMES)
+        self.retried = 0
+        self.failed = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for queues in self._queues:
+            for queue in queues.values():
+                for future, _ in queue:
+                    if not future.done():
+                        future.cancel()
+            queues.clear()
+
+    # ----- BaseRateLimiter -----
+
+    @staticmethod
+    def _priority_for(endpoint: str, rate_limit_args) -> int:
+        if isinstance(rate_limit_args, dict) and "priority" in rate_limit_args:
+            return rate_limit_args["priority"]
+        chosen = _priority.get()
+        if chosen is not None:
+            return chosen
+        if endpoint in INTERACTIVE_ENDPOINTS:
+            return INTERACTIVE
+        if endpoint in BULK_ENDPOINTS:
+            return BULK
+        return NORMAL
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        paced = chat_id is not None and endpoint not in UNPACED_ENDPOINTS
+        priority = self._priority_for(endpoint, rate_limit_args)
+        attempt = 0
+        while True:
+            if paced:
+                await self._acquire(chat_id, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                delay = _seconds(e.retry_after)
+                send_retry_after.inc(endpoint=endpoint)
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                self.retried += 1
+                logger.info("Flood control on %s for chat %s: retrying in %.1fs", endpoint, chat_id, delay)
+                self._flood(chat_id, delay)
+                if not paced:
+                    await asyncio.sleep(delay)
+
+    def _flood(self, chat_id, delay: float):
+        # Telegram doesn't say which limit was hit: hold the chat and stop bursting globally
+        now = time.monotonic()
+        self._global.tokens = min(self._global.tokens, 0.0)
+        if chat_id is not None:
+            bucket = self._bucket(chat_id, now)
+            bucket.blocked_until = max(bucket.blocked_until, now + delay)
+        else:
+            self._global.blocked_until = max(self._global.blocked_until, now + delay)
+
+    # ----- queueing -----
+
+    def _bucket(self, chat_id, now: float) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # negative ids are groups / channels
+            is_group = isinstance(chat_id, str) or int(chat_id) < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = _Bucket(rate, 1 if is_group else self.chat_burst, now)
+        return bucket
+
+    async def _acquire(self, chat_id, priority: int):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="telegram_send_queue")
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(chat_id, deque()).append((future, time.monotonic()))
+        self._wakeup.set()
+        await future
+
+    def _pick(self, now: float):
+        """-> (future, priority, enqueued_at) ready to go now, or (None, seconds until one may be)."""
+        wait = self._global.ready_in(now)
+        if wait > 0:
+            return None, wait if self.queue_depth() else None
+        wait = None
+        for priority, queues in enumerate(self._queues):
+            for chat_id in list(queues):
+                queue = queues[chat_id]
+                while queue and queue[0][0].done():
+                    queue.popleft()   # caller gave up (cancelled)
+                if not queue:
+                    del queues[chat_id]
+                    continue
+                bucket = self._bucket(chat_id, now)
+                interactive = priority == INTERACTIVE
+                # an edit answering a tap never waits behind its own chat's replies and albums
+                ready_in = bucket.blocked_until - now if interactive else bucket.ready_in(now)
+                if ready_in > 0:
+                    wait = ready_in if wait is None else min(wait, ready_in)
+                    continue
+                future, enqueued_at = queue.popleft()
+                if queue:
+                    queues.move_to_end(chat_id)
+                else:
+                    del queues[chat_id]
+                if not interactive:
+                    bucket.take()
+                self._global.take()
+                return (future, priority, enqueued_at), None
+        return None, wait
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            item, wait = self._pick(now)
+            if item is None:
+                self._wakeup.clear()
+                waiter = asyncio.ensure_future(self._wakeup.wait())
+                try:
+                    await asyncio.wait((waiter,), timeout=wait)
+                finally:
+                    waiter.cancel()
+                continue
+
+            future, priority, enqueued_at = item
+            future.set_result(None)
+            self.sent[priority] += 1
+            send_delay_seconds.observe(now - enqueued_at, priority=PRIORITY_NAMES[priority])
+            self._dispatched += 1
+            if self._dispatched % 1000 == 0:
+                self._prune(now)
+
+    def _prune(self, now: float):
+        waiting = {chat_id for queues in self._queues for chat_id in queues}
+        for chat_id in [c for c, b in self._chats.items() if c not in waiting and b.idle(now)]:
+            del self._chats[chat_id]
+
+    # ----- stats -----
+
+    def queue_depth(self, priority: int | None = None) -> int:
+        queues = self._queues if priority is None else [self._queues[priority]]
+        return sum(len(q) for chats in queues for q in chats.values())
+
+    def stats(self) -> dict:
+        return {
+            "queued": {name: self.queue_depth(p) for p, name in enumerate(PRIORITY_NAMES)},
+            "sent": dict(zip(PRIORITY_NAMES, self.sent)),
+            "retried": self.retried,
+            "failed": self.failed,
+            "chats": len(self._chats),
+        }
+
+
+send_scheduler = SendScheduler()
@@ -0,0 +1,113 @@
+"""
+Coalescing of rapid button taps.
+
+Updates of one chat run one after another (services/update_processor.py),
+so a burst of "Next ➡️" taps used to mean one full edit round trip per tap.
+Now the handler only moves the index and asks for a render. The first tap
+on a message is edited right away; taps arriving while that edit is in
+flight, or within PAGINATION_COALESCE_WINDOW of its start, collapse into
+exactly one more edit showing wherever the taps ended up.
+
+once() runs slow per-user work (photos, description) in the background and
+drops identical requests while the first one is still running.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+
+from config import PAGINATION_COALESCE_WINDOW
+
+logger = logging.getLogger(__name__)
+
+
+class TapCoalescer:
+    def __init__(self, window: float = PAGINATION_COALESCE_WINDOW, remember: int = 4096):
+        self.window = window
+        self.remember = remember
+        self._renders: dict[object, list] = {}          # key -> [latest render, run again]
+        self._shown: OrderedDict[object, object] = OrderedDict()
+        self._busy: set = set()
+        self.taps = 0
+        self.renders = 0
+        self.duplicates = 0
+
+    # ----- latest-wins rendering -----
+
+    def shown(self, key):
+        """What the last render put on this message (None if not known)."""
+        return self._shown.get(key)
+
+    def _remember(self, key, state):
+        self._shown[key] = state
+        self._shown.move_to_end(key)
+        while len(self._shown) > self.remember:
+            self._shown.popitem(last=False)
+
+    async def render(self, key, render, create_task=asyncio.ensure_future):
+        """
+        render(previous state) -> new state. The first one for `key` starts right
+        away; while it runs (and for the rest of its window) only the newest
+        `render` passed is kept and runs next.
+        """
+        self.taps += 1
+        entry = self._renders.get(key)
+        if entry is not None:
+            entry[0] = render
+            entry[1] = True
+            return
+        if self.window <= 0:
+            await self._render_once(key, render)
+            return
+        self._renders[key] = [render, False]
+        create_task(self._run(key))
+
+    async def _run(self, key):
+        loop = asyncio.get_running_loop()
+        entry = self._renders[key]
+        try:
+            while True:
+                entry[1] = False
+                started = loop.time()
+                await self._render_once(key, entry[0])
+                # at most one edit per window: an edit slower than that is followed at once
+                await asyncio.sleep(max(0.0, started + self.window - loop.time()))
+                if not entry[1]:
+                    break
+        finally:
+            del self._renders[key]
+
+    async def _render_once(self, key, render):
+        self.renders += 1
+        state = await render(self.shown(key))
+        if state is not None:
+            self._remember(key, state)
+
+    # ----- duplicate suppression -----
+
+    def once(self, key, coroutine_factory, create_task=asyncio.ensure_future) -> bool:
+        """Start coroutine_factory() unless the same key is still running. False if dropped."""
+        if key in self._busy:
+            self.duplicates += 1
+            return False
+        self._busy.add(key)
+
+        async def run():
+            try:
+                await coroutine_factory()
+            finally:
+                self._busy.discard(key)
+
+        create_task(run())
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "taps": self.taps,
+            "renders": self.renders,
+            "pending": len(self._renders),
+            "busy": len(self._busy),
+            "duplicates": self.duplicates,
+        }
+
+
+tap_coalescer = TapCoalescer()
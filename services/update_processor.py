@@ -0,0 +1,67 @@
+"""
+Concurrent update processing that keeps each chat's updates in order.
+
+Updates from different chats run in parallel (up to `concurrency` at once);
+updates from the same chat wait for the previous one, so ConversationHandler
+state transitions never race. An update waits for its chat's turn before it
+takes one of the `concurrency` slots, so a chat flooding the bot only ever
+holds one slot and never delays the other chats.
+"""
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    # Application has already made a task per update when process_update runs, so
+    # the base class semaphore bounds nothing worth bounding; a finite one would be
+    # taken while waiting for the chat lock and let one busy chat fill it
+    UNBOUNDED = 2 ** 31 - 1
+
+    def __init__(self, concurrency: int):
+        super().__init__(max_concurrent_updates=self.UNBOUNDED)
+        self.concurrency = concurrency
+        self._running = asyncio.Semaphore(concurrency)
+        self._chats: dict[object, list] = {}   # key -> [lock, users]
+        self.processed = 0
+
+    @staticmethod
+    def _key(update: object):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return ("user", update.effective_user.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self._key(update)
+        if key is None:
+            async with self._running:
+                await coroutine
+            self.processed += 1
+            return
+
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:          # FIFO: same chat -> arrival order
+                async with self._running:     # a slot only once it is this chat's turn
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+        self.processed += 1
+
+    def active_chats(self) -> int:
+        return len(self._chats)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
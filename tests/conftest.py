@@ -0,0 +1,48 @@
+"""
+Test settings: a throwaway SQLite database and no side channels (metrics
+port, replay log, saved destination index). Set before config.py is
+imported by anything, so a developer's .env never leaks into the tests.
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+
+TMP_DIR = tempfile.mkdtemp(prefix="hotel-bot-tests-")
+os.environ.update({
+    "BOT_TOKEN": "123456:TEST",
+    "RAPIDAPI_KEY": "test",
+    "DATABASE_URL": f"sqlite:///{TMP_DIR}/test.db",
+    "METRICS_PORT": "0",
+    "REPLAY_LOG": "",
+    "DEST_INDEX_PATH": f"{TMP_DIR}/destinations.idx",
+    "PREFETCH_ENABLED": "0",
+    "PERSISTENCE_ENABLED": "0",
+    # fast retries; every test sets the limits it is about explicitly
+    "UPSTREAM_BACKOFF_BASE": "0.01",
+    "UPSTREAM_BACKOFF_MAX": "0.05",
+    "RAPIDAPI_RATE": "100000",
+    "RAPIDAPI_BURST": "100000",
+})
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from database.db import shutdown_db
+    from database.init_db import init_db
+
+    init_db()
+    yield
+    shutdown_db()
+    shutil.rmtree(TMP_DIR, ignore_errors=True)
+
+
+@pytest.fixture(autouse=True)
+def fresh_endpoints():
+    """Breakers and latency history are module state: start every test from closed breakers."""
+    from services import resilience
+
+    resilience._endpoints.clear()
+    yield
+    resilience._endpoints.clear()
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+
+from services.cache import SingleFlight, SqliteCacheBackend, TTLCache
+
+
+class Work:
+    """A slow upstream call that counts how often it really ran."""
+
+    def __init__(self, seconds: float = 0.05, result="result"):
+        self.seconds = seconds
+        self.result = result
+        self.started = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.result
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache("test_lru", maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1           # "b" is now the oldest
+    cache.set("c", 3)
+
+    assert ("a" in cache, "b" in cache, "c" in cache) == (True, False, True)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entry_is_a_miss_but_can_be_served_stale():
+    cache = TTLCache("test_ttl", ttl=0.01)
+    cache.set("k", "old")
+    time.sleep(0.02)
+
+    assert "k" not in cache
+    assert cache.get("k") is None
+    assert cache.get("k", allow_stale=True) == "old"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_backend_is_the_second_level():
+    backend = SqliteCacheBackend("test")
+    first, second = TTLCache("test_l2_a", backend=backend), TTLCache("test_l2_b", backend=backend)
+
+    async def scenario():
+        await first.aset("k", {"hotels": [1, 2]})
+        await first.aset("k", {"hotels": [3]})          # an upsert, not a duplicate key
+        found = await second.aget("k")
+        await second.adelete("k")
+        first.clear()
+        return found, await first.aget("k", "gone")
+
+    assert asyncio.run(scenario()) == ({"hotels": [3]}, "gone")
+    assert second.backend_hits == 1
+    assert "k" not in second
+
+
+def test_expired_backend_rows_are_not_returned():
+    backend = SqliteCacheBackend("test_expired")
+    backend.set("k", "value", ttl=-1)
+    assert backend.get("k") is None
+
+
+def test_single_flight_coalesces_concurrent_callers():
+    flight, work = SingleFlight(), Work()
+
+    async def scenario():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["result"] * 5
+    assert (work.started, flight.coalesced) == (1, 4)
+
+
+def test_cancelled_first_caller_does_not_cancel_the_others():
+    flight, work = SingleFlight(), Work()
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "result"
+    assert (work.started, work.cancelled) == (1, 0)
+
+
+def test_work_is_cancelled_when_the_last_waiter_leaves():
+    flight, work = SingleFlight(), Work()
+
+    async def scenario():
+        callers = [asyncio.ensure_future(flight.do("k", work)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert work.cancelled == 1
+        assert flight._inflight == {}
+        # the next caller starts fresh instead of joining the cancelled task
+        return await flight.do("k", work)
+
+    assert asyncio.run(scenario()) == "result"
+    assert work.started == 2
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        results = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await flight.do("k", failing)
+
+    asyncio.run(scenario())
+    assert len(calls) == 2
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+from playhouse.db_url import connect
+
+from database import db as db_module
+from database.db import run_db
+from database.models import ApiCache, HotelDetails, ResultRow
+from services import hotel_details, result_store
+from services.cache import SqliteCacheBackend
+
+POSTGRES_URL = "postgresql://bot@localhost/hotel_bot"
+
+
+@pytest.fixture
+def postgres():
+    """Queries compiled for Postgres (nothing is sent: no server needed)."""
+    database = connect(POSTGRES_URL)
+    with database.bind_ctx([ApiCache, ResultRow, HotelDetails]):
+        yield
+
+
+@pytest.mark.parametrize("build", [
+    lambda: SqliteCacheBackend._upsert("ns:key", "{}", 1.0),
+    lambda: result_store._upsert_rows([{"result_id": "r", "position": 0, "data": "{}", "created_at": 1.0}]),
+    lambda: hotel_details._upsert("1", "en-us", "text", 1.0),
+])
+def test_upserts_compile_for_postgres(postgres, build):
+    sql, _ = build().sql()
+    assert "ON CONFLICT" in sql and "DO UPDATE SET" in sql
+
+
+def test_upserts_overwrite_on_sqlite():
+    backend = SqliteCacheBackend("upsert")
+    backend.set("k", {"v": 1}, ttl=60)
+    backend.set("k", {"v": 2}, ttl=60)
+    assert backend.get("k")[0] == {"v": 2}
+
+    hotel_details._upsert("42", "en-us", "old", 1.0).execute()
+    hotel_details._upsert("42", "en-us", "new", 2.0).execute()
+    row = HotelDetails.get((HotelDetails.hotel_id == "42") & (HotelDetails.languagecode == "en-us"))
+    assert (row.description, row.fetched_at) == ("new", 2.0)
+
+
+def test_run_db_reports_to_the_timing_hook(monkeypatch):
+    seen = []
+    monkeypatch.setattr(db_module, "_timing_hook", lambda seconds, name: seen.append(name))
+
+    def query():
+        return 7
+
+    assert asyncio.run(run_db(query)) == 7
+    assert seen == ["test_run_db_reports_to_the_timing_hook.<locals>.query"]
+
+
+def test_description_table_is_trimmed_in_batches():
+    HotelDetails.delete().execute()
+    backend = hotel_details.HotelDetailsBackend(max_rows=100, trim_every=50)
+    try:
+        for i in range(160):
+            backend.set((str(i), "en-us"), f"text {i}", ttl=60)
+        left = {row.hotel_id for row in HotelDetails.select(HotelDetails.hotel_id)}
+        # trims ran on writes 1, 51, 101 and 151; the last one found 151 rows and
+        # dropped the 51 over the cap plus 1% slack, least recently used first
+        assert len(left) == 160 - 52
+        assert "51" not in left and "52" in left and "159" in left
+        assert backend.evictions == 52
+    finally:
+        HotelDetails.delete().execute()
@@ -0,0 +1,46 @@
+from services.destination_index import DestinationIndex, fold
+
+
+def city(dest_id, name, country):
+    return {"dest_id": dest_id, "search_type": "city", "dest_type": "city", "name": name,
+            "label": f"{name}, {country}", "country": country}
+
+
+def make_index() -> DestinationIndex:
+    index = DestinationIndex()
+    index.add_many([
+        city("-1456928", "Paris", "France"),
+        city("-1746443", "Berlin", "Germany"),
+        city("20088325", "New York", "United States"),
+        city("-671919", "São Paulo", "Brazil"),
+    ])
+    return index
+
+
+def names(dests):
+    return [d["name"] for d in dests]
+
+
+def test_fold():
+    assert fold("  São  Paulo!") == "sao paulo"
+
+
+def test_exact_name_answers_locally():
+    index = make_index()
+    assert names(index.exact("paris ")) == ["Paris"]
+    assert names(index.exact("SAO PAULO")) == ["São Paulo"]
+    assert names(index.exact("Berlin, Germany")) == ["Berlin"]   # the label
+
+
+def test_near_matches_are_not_answers():
+    index = make_index()
+    # typo-close or prefix-close names can be another place: they go to the API
+    for query in ("Parma", "Bern", "Par", "york"):
+        assert index.exact(query) == []
+    assert (index.hits, index.misses) == (0, 4)
+
+
+def test_suggestions_still_cover_prefixes_and_typos():
+    index = make_index()
+    assert names(index.search("york")) == ["New York"]
+    assert names(index.search("parsi")) == ["Paris"]
@@ -0,0 +1,19 @@
+import pytest
+
+from utils.formatting import get_review_count
+
+
+@pytest.mark.parametrize("label, expected", [
+    ("Hotel Lutetia 8.9 Excellent 1,234 reviews", 1234),
+    ("Tiny inn 9.5 Superb 1 review", 1),
+    ("Scored 8.1, reviews", 0),
+    ("no reviews yet", 0),
+    ("reviews", 0),
+    ("", 0),
+])
+def test_review_count_from_label(label, expected):
+    assert get_review_count({"accessibilityLabel": label}) == expected
+
+
+def test_review_count_prefers_the_property_field():
+    assert get_review_count({"property": {"reviewCount": 57}, "accessibilityLabel": "3 reviews"}) == 57
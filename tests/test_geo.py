@@ -0,0 +1,18 @@
+import math
+
+from utils.geo import haversine_km, valid_point
+
+
+def test_haversine_known_distances():
+    assert math.isclose(haversine_km(48.8566, 2.3522, 51.5074, -0.1278), 343.5, abs_tol=1.0)   # Paris - London
+    assert haversine_km(10.0, 20.0, 10.0, 20.0) == 0.0
+    # across the antimeridian is short, not half the planet
+    assert haversine_km(0.0, 179.9, 0.0, -179.9) < 25
+
+
+def test_valid_point():
+    assert valid_point(48.85, 2.35)
+    assert not valid_point(None, 2.35)
+    assert not valid_point(float("nan"), 2.35)
+    assert not valid_point(91.0, 0.0)
+    assert not valid_point(0.0, -180.5)
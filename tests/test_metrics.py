@@ -0,0 +1,16 @@
+from main import build_application
+from services import metrics
+from services.instrumentation import InstrumentedRequest
+
+
+def help_lines() -> list[str]:
+    return [line for line in metrics.render().splitlines() if line.startswith("# HELP")]
+
+
+def test_building_the_application_twice_registers_every_metric_once():
+    build_application(request=InstrumentedRequest())
+    exposed = help_lines()
+    build_application(request=InstrumentedRequest())
+
+    assert help_lines() == exposed
+    assert len(exposed) == len(set(exposed))
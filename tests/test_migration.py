@@ -0,0 +1,50 @@
+import json
+
+from database.db import db
+from database.init_db import migrate_history_payloads
+from database.models import SearchHistory, SearchHistoryPayload
+
+TABLE = SearchHistory._meta.table_name
+
+
+def columns() -> set[str]:
+    return {c.name for c in db.get_columns(TABLE)}
+
+
+def old_row(user_id: int, hotels_json: str | None) -> int:
+    """A searchhistory row as an old hotel_bot.db has it: the hotels inline."""
+    row = SearchHistory.create(user_id=user_id, command="lowprice", city="Rome", dest_id="1",
+                               search_type="CITY", checkin="2030-01-01", checkout="2030-01-02")
+    db.execute_sql(f'UPDATE "{TABLE}" SET hotels_json = ? WHERE id = ?', (hotels_json, row.id))
+    return row.id
+
+
+def test_hotels_json_moves_to_payloads_and_the_column_is_dropped():
+    hotels = [[{"hotel_id": i, "name": f"Hotel {i}"}] for i in range(5)]
+    with db.connection_context():
+        db.execute_sql(f'ALTER TABLE "{TABLE}" ADD COLUMN hotels_json TEXT')
+        ids = [old_row(777, json.dumps(h)) for h in hotels]
+        empty = old_row(777, None)
+        try:
+            migrate_history_payloads(batch_size=2)   # several batches
+
+            assert "hotels_json" not in columns()
+            payloads = {p.history_id: p.unpack() for p in SearchHistoryPayload.select()
+                        .where(SearchHistoryPayload.history.in_(ids + [empty]))}
+            assert payloads == {**dict(zip(ids, hotels)), empty: []}
+            # the history rows themselves are untouched
+            assert SearchHistory.select().where(SearchHistory.user_id == 777).count() == 6
+
+            migrate_history_payloads()               # nothing left to do the second time
+        finally:
+            SearchHistory.delete().where(SearchHistory.user_id == 777).execute()
+            if "hotels_json" in columns():
+                db.execute_sql(f'ALTER TABLE "{TABLE}" DROP COLUMN hotels_json')
+
+
+def test_new_schema_is_left_alone():
+    with db.connection_context():
+        before = SearchHistoryPayload.select().count()
+        migrate_history_payloads()
+        assert "hotels_json" not in columns()
+        assert SearchHistoryPayload.select().count() == before
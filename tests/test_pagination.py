@@ -0,0 +1,57 @@
+import asyncio
+from types import SimpleNamespace
+
+from telegram.error import BadRequest, TimedOut
+
+from handlers.pagination import _send_photos
+from services.hotel_details import photo_file_cache, photo_url_cache
+
+
+class Message:
+    """The message a photos tap answers; albums fail with the queued errors first."""
+
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.albums: list[list] = []
+        self.texts: list[str] = []
+
+    async def reply_media_group(self, media):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.albums.append([m.media for m in media])
+        return [SimpleNamespace(photo=[SimpleNamespace(file_id=f"new-{i}")]) for i in range(len(media))]
+
+    async def reply_text(self, text, **kwargs):
+        self.texts.append(text)
+
+
+def send_photos(hotel_id: str, message: Message):
+    async def scenario():
+        await photo_file_cache.aset(hotel_id, ["old-1", "old-2"])
+        await _send_photos(SimpleNamespace(message=message), SimpleNamespace(hotel_id=hotel_id))
+        return await photo_file_cache.aget(hotel_id)
+
+    photo_url_cache.set(hotel_id, ["http://photos.test/1.jpg", "http://photos.test/2.jpg"])
+    return asyncio.run(scenario())
+
+
+def test_stale_file_ids_are_replaced_in_memory_and_on_disk():
+    message = Message(BadRequest("Wrong file identifier/http url specified"))
+    assert send_photos("101", message) == ["new-0", "new-1"]
+    assert message.albums == [["http://photos.test/1.jpg", "http://photos.test/2.jpg"]]
+    assert photo_file_cache.backend.get("101")[0] == ["new-0", "new-1"]
+
+
+def test_failed_url_album_is_reported_and_nothing_cached():
+    message = Message(BadRequest("Wrong file identifier"), BadRequest("Failed to get http url content"))
+    assert send_photos("102", message) is None
+    assert message.texts == ["❌ Could not send the photos. Please try again later."]
+    assert photo_file_cache.backend.get("102") is None
+
+
+def test_other_errors_on_cached_file_ids_are_reported_and_forgotten():
+    message = Message(TimedOut())
+    assert send_photos("103", message) is None
+    assert message.albums == []
+    assert message.texts == ["❌ Could not send the photos. Please try again later."]
+    assert photo_file_cache.backend.get("103") is None
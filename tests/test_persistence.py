@@ -0,0 +1,36 @@
+import asyncio
+import pickle
+from datetime import date
+
+from database.persistence import PeeweeSessionStore, SessionPersistence, dumps, loads
+
+
+def test_values_round_trip_as_json():
+    value = {"checkin": date(2030, 1, 2), "origin": [41.9, 12.5], "destinations_cache": [{"dest_id": "1"}] * 50}
+    blob = dumps(value)
+    assert blob[:1] == b"Z"          # large enough to be compressed
+    assert loads(blob) == value
+    assert dumps({"hotel_index": 3}) == b'J{"hotel_index":3}'
+
+
+def test_pickled_rows_are_never_loaded():
+    store = PeeweeSessionStore()
+    store.save("user", "41", b"p" + pickle.dumps({"old": True}))
+    store.save("user", "42", dumps({"command": "lowprice"}))
+
+    user_data = asyncio.run(SessionPersistence(store).get_user_data())
+    assert 41 not in user_data
+    assert user_data[42] == {"command": "lowprice"}
+
+
+def test_unchanged_data_is_not_written_again():
+    persistence = SessionPersistence(PeeweeSessionStore())
+
+    async def scenario():
+        await persistence.update_user_data(43, {"checkin": date(2030, 1, 2)})
+        await persistence.update_user_data(43, {"checkin": date(2030, 1, 2)})
+        await persistence.update_conversation("search", (43, 43), 2)
+        return await persistence.get_conversations("search")
+
+    assert asyncio.run(scenario())[(43, 43)] == 2
+    assert (persistence.writes, persistence.skipped_writes) == (2, 1)
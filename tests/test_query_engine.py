@@ -0,0 +1,63 @@
+from benchmarks.bench_query_engine import make_records, naive_bestdeal, split_pages
+from utils.hotel_record import HotelRecord
+from utils.query_engine import FilterSpec, ResultSet
+
+PARIS = (48.8566, 2.3522)
+
+
+def hotel(hotel_id, price=100.0, rating=8.0, reviews=10, distance=1.0, lat=None, lon=None) -> HotelRecord:
+    return HotelRecord(hotel_id, f"Hotel {hotel_id}", price, "USD", rating, reviews, distance, lat, lon, "")
+
+
+def ids(records):
+    return [r.hotel_id for r in records]
+
+
+def test_bestdeal_matches_the_plain_loop():
+    records = make_records(2000)
+    spec = FilterSpec.from_user_input(50, 400, 10)
+    assert ids(ResultSet(records).query(spec, "bestdeal")) == ids(naive_bestdeal(records, 50, 400, 10))
+
+
+def test_extending_page_by_page_equals_one_set():
+    records = make_records(500)
+    spec = FilterSpec.from_user_input(0, 300, 5)
+    results = ResultSet(origin=PARIS)
+    for page in split_pages(records):
+        results.extend(page)
+    for ranking in ("lowprice", "guest_rating", "bestdeal", {"price": 0.5, "rating": 0.5}):
+        assert ids(results.query(spec, ranking)) == ids(ResultSet(records, PARIS).query(spec, ranking))
+
+
+def test_queries_between_pages_only_check_the_new_records():
+    records = make_records(600)
+    specs = [FilterSpec.from_user_input(50, 400, 10), FilterSpec(min_rating=8.0), FilterSpec.from_user_input(0, 0)]
+    results = ResultSet(origin=PARIS)
+    loaded = []
+    for page in split_pages(records):
+        results.extend(page)
+        loaded += page
+        for spec in specs:
+            assert ids(results.query(spec, "bestdeal")) == ids(ResultSet(loaded, PARIS).query(spec, "bestdeal"))
+    assert len(results._matches) == len(specs)
+
+
+def test_user_input_zero_means_no_limit_but_bestdeal_needs_a_distance():
+    records = [hotel(1, price=None), hotel(2, distance=None), hotel(3, price=950.0, distance=30.0)]
+    assert ids(ResultSet(records).query(FilterSpec.from_user_input(0, 0), "lowprice")) == [2, 3]
+    assert ids(ResultSet(records).query(FilterSpec.from_user_input(0, 0, 0), "bestdeal")) == [3]
+
+
+def test_origin_distance_wins_over_the_scraped_text():
+    near = hotel(1, distance=20.0, lat=48.857, lon=2.353)     # really ~0.1 km away
+    far = hotel(2, distance=0.5, lat=48.95, lon=2.55)         # really ~17 km away
+    no_coords = hotel(3, distance=1.5)
+    results = ResultSet([near, far, no_coords], origin=PARIS)
+
+    assert ids(results.query(FilterSpec(max_distance=2), "bestdeal")) == [1, 3]
+
+
+def test_unknown_values_rank_last():
+    records = [hotel(1, rating=None), hotel(2, rating=9.0), hotel(3, rating=8.0)]
+    results = ResultSet(records)
+    assert ids(results.query(FilterSpec(), "guest_rating")) == [2, 3, 1]
@@ -0,0 +1,104 @@
+import asyncio
+
+import pytest
+
+from fakes.booking_api import FakeBookingAPI
+from services import booking_api, resilience
+from services.cache import SqliteCacheBackend
+from services.rate_limit import QuotaExhausted, RateLimiter
+from services.resilience import CircuitBreaker
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = FakeBookingAPI(latency=0.05)
+    booking_api.use_transport(fake.transport())
+    yield fake
+    booking_api.use_transport(None)
+
+
+def test_queue_wait_is_not_upstream_time(upstream, monkeypatch):
+    # 40 searches at 20/s queue for ~1.75s: far over the endpoint's budget
+    monkeypatch.setattr(booking_api, "rate_limiter", RateLimiter(rate=20, burst=5, daily_quota=1000))
+    ep = resilience.endpoint("searchHotels")
+    ep.budget = 0.5
+
+    async def scenario():
+        try:
+            return await asyncio.gather(
+                *(booking_api.search_hotels("-1", "city", "2030-01-01", "2030-01-02", page=page)
+                  for page in range(1, 41)),
+                return_exceptions=True,
+            )
+        finally:
+            await booking_api.close_client()
+
+    results = asyncio.run(scenario())
+
+    assert [r for r in results if isinstance(r, Exception)] == []
+    assert ep.retries == 0
+    assert ep.breaker.state == CircuitBreaker.CLOSED
+    assert ep.latency.percentile(1.0) < 0.5
+    # a hedge may still go out once the queue has drained and a token is free
+    assert upstream.requests["searchHotels"] == 40 + ep.hedges
+
+
+def test_spent_quota_fails_without_touching_the_breaker(upstream, monkeypatch):
+    monkeypatch.setattr(booking_api, "rate_limiter", RateLimiter(daily_quota=1, weights={}))
+
+    async def scenario():
+        try:
+            await booking_api.search_hotels("-1", "city", "2030-01-01", "2030-01-02")
+            with pytest.raises(booking_api.QuotaExceededError):
+                await booking_api.search_hotels("-1", "city", "2030-01-01", "2030-01-02", page=2)
+        finally:
+            await booking_api.close_client()
+
+    asyncio.run(scenario())
+    assert resilience.endpoint("searchHotels").breaker.failures == 0
+
+
+def test_try_acquire_never_jumps_the_queue():
+    limiter = RateLimiter(rate=1, burst=1, daily_quota=10, weights={})
+
+    async def scenario():
+        assert limiter.try_acquire("searchHotels")
+        assert not limiter.try_acquire("searchHotels")   # bucket empty
+        waiting = asyncio.ensure_future(limiter.acquire("searchHotels"))
+        await asyncio.sleep(0)
+        limiter._tokens = 1.0
+        assert not limiter.try_acquire("searchHotels")   # someone is queued
+        await waiting
+
+    asyncio.run(scenario())
+    assert limiter.quota_used == 2
+
+
+def test_queued_calls_fail_once_the_quota_is_spent():
+    limiter = RateLimiter(rate=20, burst=1, daily_quota=3, weights={})
+
+    async def scenario():
+        return await asyncio.gather(*(limiter.acquire("searchHotels") for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    # all five were admitted to the queue; only three fit the quota when their turn came
+    assert results[:3] == [None] * 3
+    assert all(isinstance(r, QuotaExhausted) for r in results[3:])
+    assert (limiter.quota_used, limiter.rejected) == (3, 2)
+
+
+def test_quota_count_survives_a_restart():
+    store = SqliteCacheBackend("test_quota")
+
+    async def run(calls: int) -> RateLimiter:
+        limiter = RateLimiter(daily_quota=5, weights={}, store=store)
+        for _ in range(calls):
+            await limiter.acquire("searchHotels")
+        await limiter.flush()
+        return limiter
+
+    assert asyncio.run(run(3)).quota_remaining == 2
+    restarted = asyncio.run(run(2))
+    assert restarted.quota_used == 5
+    with pytest.raises(QuotaExhausted):
+        asyncio.run(run(1))
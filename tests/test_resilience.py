@@ -0,0 +1,143 @@
+import asyncio
+
+import httpx
+import pytest
+
+from fakes.booking_api import FakeBookingAPI
+from services import resilience
+from services.resilience import CircuitBreaker, CircuitOpenError
+
+PATH = "/api/v1/hotels/getDescriptionAndInfo"
+
+
+class Upstream:
+    """FakeBookingAPI with a per-request script: "ok", "error" (503) or "hang"."""
+
+    def __init__(self, script=(), latency: float = 0.0):
+        self.fake = FakeBookingAPI(latency=latency)
+        self.script = list(script)
+        self.sent = 0
+        self.client = httpx.AsyncClient(base_url="http://booking.test", transport=self.fake.transport())
+
+    async def send(self, timeout: float) -> httpx.Response:
+        step = self.script[self.sent] if self.sent < len(self.script) else "ok"
+        self.sent += 1
+        self.fake.error_rate = 1.0 if step == "error" else 0.0
+        self.fake.timeout_rate = 1.0 if step == "hang" else 0.0
+        return await self.client.get(PATH, params={"hotel_id": "1"}, timeout=timeout)
+
+
+def breaker(name: str, failures: int = 2, reset_after: float = 0.05) -> CircuitBreaker:
+    ep = resilience.endpoint(name)
+    ep.breaker = CircuitBreaker(failures=failures, reset_after=reset_after)
+    return ep.breaker
+
+
+def test_retries_until_success():
+    upstream = Upstream(["error", "error", "ok"])
+    result = asyncio.run(resilience.call("retry", upstream.send))
+
+    assert result.status_code == 200
+    assert upstream.sent == 3
+    assert resilience.endpoint("retry").retries == 2
+    assert resilience.endpoint("retry").breaker.state == CircuitBreaker.CLOSED
+
+
+def test_final_5xx_is_returned_and_counts_as_failure():
+    upstream = Upstream(["error"] * 10)
+    result = asyncio.run(resilience.call("down", upstream.send))
+
+    assert result.status_code == 503
+    assert upstream.sent == resilience.UPSTREAM_RETRIES + 1
+    assert resilience.endpoint("down").breaker.failures == 1
+
+
+def test_hedge_wins_over_hung_attempt():
+    ep = resilience.endpoint("hedge")
+    ep.budget = 2.0
+    for _ in range(resilience.UPSTREAM_HEDGE_MIN_SAMPLES):
+        ep.latency.add(0.02)
+    upstream = Upstream(["hang", "ok"])
+
+    result = asyncio.run(resilience.call("hedge", upstream.send))
+
+    assert result.status_code == 200
+    assert (ep.hedges, ep.hedge_wins, ep.retries) == (1, 1, 0)
+
+
+def test_breaker_opens_fails_fast_and_closes_after_trial():
+    cb = breaker("flaky")
+    upstream = Upstream(["error"] * 6)
+
+    async def scenario():
+        for _ in range(2):
+            await resilience.call("flaky", upstream.send)
+        assert cb.state == CircuitBreaker.OPEN
+        sent = upstream.sent
+        with pytest.raises(CircuitOpenError):
+            await resilience.call("flaky", upstream.send)
+        assert upstream.sent == sent   # failed fast, nothing sent
+
+        await asyncio.sleep(0.06)
+        result = await resilience.call("flaky", upstream.send)   # the trial
+        assert result.status_code == 200
+
+    asyncio.run(scenario())
+    assert cb.state == CircuitBreaker.CLOSED
+
+
+def test_failed_trial_reopens():
+    cb = breaker("still_down", failures=1)
+    upstream = Upstream(["error"] * 10)
+
+    async def scenario():
+        await resilience.call("still_down", upstream.send)
+        await asyncio.sleep(0.06)
+        await resilience.call("still_down", upstream.send)
+
+    asyncio.run(scenario())
+    assert cb.state == CircuitBreaker.OPEN
+    assert not cb._trial_running
+
+
+def test_cancelled_trial_does_not_wedge_the_breaker():
+    cb = breaker("cancelled", failures=1)
+    upstream = Upstream(["error"] * 3 + ["hang"])
+
+    async def scenario():
+        await resilience.call("cancelled", upstream.send)
+        await asyncio.sleep(0.06)
+        trial = asyncio.ensure_future(resilience.call("cancelled", upstream.send))
+        await asyncio.sleep(0.02)
+        assert cb.state == CircuitBreaker.HALF_OPEN
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        # counted as a failed trial: open again, and a new trial goes out after reset_after
+        assert cb.state == CircuitBreaker.OPEN
+        assert not cb._trial_running
+        await asyncio.sleep(0.06)
+        result = await resilience.call("cancelled", Upstream().send)
+        assert result.status_code == 200
+
+    asyncio.run(scenario())
+    assert cb.state == CircuitBreaker.CLOSED
+
+
+def test_trial_failing_with_own_error_does_not_wedge_the_breaker():
+    cb = breaker("own_error", failures=1)
+
+    async def broken(timeout):
+        raise ValueError("not an upstream problem")
+
+    async def scenario():
+        await resilience.call("own_error", Upstream(["error"] * 3).send)
+        await asyncio.sleep(0.06)
+        with pytest.raises(ValueError):
+            await resilience.call("own_error", broken)
+        assert not cb._trial_running
+        await asyncio.sleep(0.06)
+        assert (await resilience.call("own_error", Upstream().send)).status_code == 200
+
+    asyncio.run(scenario())
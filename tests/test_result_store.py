@@ -0,0 +1,106 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from database.models import ResultRow
+from handlers import search
+from services.result_store import ResultStore
+from utils.hotel_record import HotelRecord
+
+
+class Message:
+    async def reply_text(self, text, **kwargs):
+        pass
+
+
+def records(n: int) -> list[HotelRecord]:
+    return [HotelRecord(i, f"Hotel {i}", 100.0 + i, "USD", 8.0, 10, 1.0, None, None, f"card {i}")
+            for i in range(n)]
+
+
+def rows(result_id: str) -> int:
+    return ResultRow.select().where(ResultRow.result_id == result_id).count()
+
+
+def test_spilled_set_is_read_back_one_card_at_a_time():
+    store = ResultStore(maxsize=1)
+
+    async def scenario():
+        first = await store.put(records(3))
+        await store.put(records(1))        # evicts `first` to the table
+        return first, await store.get(first, 5)
+
+    first, (hotel, index, total) = asyncio.run(scenario())
+    assert (hotel.card, index, total) == ("card 2", 2, 3)
+    assert store.stats()["spills"] == 1
+
+
+def test_drop_deletes_spilled_rows():
+    store = ResultStore(maxsize=1)
+
+    async def scenario():
+        first = await store.put(records(3))
+        second = await store.put(records(2))
+        await store.flush()
+        assert rows(first) == 3
+        await store.drop(first)
+        await store.drop(second)           # in memory: nothing on disk to delete
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert rows(first) == 0
+    assert len(store) == 0
+
+
+def test_put_does_not_wait_for_the_spill():
+    store = ResultStore(maxsize=1)
+
+    async def scenario():
+        first = await store.put(records(3))
+        await store.put(records(1))
+        # evicted but not written yet: still served, and dropping it leaves nothing behind
+        assert rows(first) == 0
+        hotel, _, total = await store.get(first, 1)
+        assert (hotel.card, total) == ("card 1", 3)
+        await store.drop(first)
+        await store.flush()
+        return first
+
+    first = asyncio.run(scenario())
+    assert rows(first) == 0
+    assert store.stats()["spilling"] == 0
+
+
+def test_new_search_drops_the_previous_result_set():
+    store = ResultStore(maxsize=0)
+    user_data = {}
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1), message=Message())
+
+    async def scenario():
+        previous = user_data["result_id"] = await store.put(records(2))
+        await store.flush()
+        assert rows(previous) == 2
+        with patch.object(search, "result_store", store):
+            await search.lowprice_start(update, SimpleNamespace(user_data=user_data))
+        return previous
+
+    previous = asyncio.run(scenario())
+    assert rows(previous) == 0
+    assert user_data == {"command": "lowprice"}
+
+
+def test_expired_sets_are_purged_in_the_background():
+    store = ResultStore(maxsize=0, ttl=0, purge_interval=0.05)
+
+    async def scenario():
+        store.start()
+        result_id = await store.put(records(2))
+        await store.flush()
+        assert rows(result_id) == 2
+        await asyncio.sleep(0.2)
+        await store.stop()
+        return result_id
+
+    result_id = asyncio.run(scenario())
+    assert rows(result_id) == 0
+    assert store.stats()["purged"] >= 2
@@ -0,0 +1,130 @@
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+from telegram.error import RetryAfter
+from telegram.ext import ExtBot
+
+from fakes.telegram import FakeTelegram
+from services.send_queue import BULK, SendScheduler, send_priority
+
+
+def scheduler(**limits) -> SendScheduler:
+    settings = dict(rate=1000, burst=1000, chat_rate=20, chat_burst=1, group_rate=20, max_retries=2)
+    settings.update(limits)
+    return SendScheduler(**settings)
+
+
+async def request(limiter, sent: list, label, chat_id=1, endpoint="sendMessage"):
+    async def callback():
+        sent.append(label)
+        return label
+
+    return await limiter.process_request(callback, (), {}, endpoint, {"chat_id": chat_id}, None)
+
+
+def test_higher_priority_goes_first_in_a_busy_chat():
+    limiter, sent = scheduler(), []
+
+    async def scenario():
+        await request(limiter, sent, "first")   # takes the chat's only token
+        waiting = [
+            asyncio.ensure_future(request(limiter, sent, "album", endpoint="sendMediaGroup")),
+            asyncio.ensure_future(request(limiter, sent, "reply")),
+        ]
+        await asyncio.sleep(0.01)
+        # an edit answering a tap skips the chat's queue altogether
+        await request(limiter, sent, "edit", endpoint="editMessageText")
+        await asyncio.gather(*waiting)
+        await limiter.shutdown()
+
+    asyncio.run(scenario())
+    assert sent == ["first", "edit", "reply", "album"]
+    assert limiter.sent == [1, 2, 1]
+
+
+def test_send_priority_overrides_the_endpoint():
+    limiter, sent = scheduler(), []
+
+    async def scenario():
+        await request(limiter, sent, "first")
+        with send_priority(BULK):
+            bulk = asyncio.ensure_future(request(limiter, sent, "history"))
+        await asyncio.sleep(0.01)
+        normal = asyncio.ensure_future(request(limiter, sent, "reply"))
+        await asyncio.gather(bulk, normal)
+        await limiter.shutdown()
+
+    asyncio.run(scenario())
+    assert sent == ["first", "reply", "history"]
+
+
+def test_chats_are_paced_independently():
+    limiter, sent = scheduler(chat_rate=10), []
+
+    async def scenario():
+        started = time.monotonic()
+        await asyncio.gather(*(request(limiter, sent, chat_id, chat_id=chat_id) for chat_id in range(1, 21)))
+        spread = time.monotonic() - started
+        await asyncio.gather(*(request(limiter, sent, "again") for _ in range(3)))
+        same_chat = time.monotonic() - started - spread
+        await limiter.shutdown()
+        return spread, same_chat
+
+    spread, same_chat = asyncio.run(scenario())
+    assert spread < 0.1           # twenty chats, one message each: no waiting
+    assert same_chat >= 0.25      # three more to chat 1 at 10/s
+
+
+def test_retry_after_blocks_the_chat_and_retries():
+    limiter = scheduler(chat_burst=5)
+    telegram = FakeTelegram(flood_limit=1, retry_after=1)
+    bot = ExtBot("123456:TEST", request=telegram, get_updates_request=FakeTelegram(), rate_limiter=limiter)
+
+    async def scenario():
+        async with bot:
+            await bot.send_message(1, "one")
+            started = time.monotonic()
+            await bot.send_message(1, "two")
+            waited = time.monotonic() - started
+        return waited
+
+    waited = asyncio.run(scenario())
+    assert telegram.flooded == 1
+    assert limiter.retried == 1
+    assert waited >= 1.0
+    assert telegram.last_message(1)["text"] == "two"
+
+
+def test_gives_up_after_max_retries():
+    limiter = scheduler(max_retries=2)
+    attempts = []
+
+    async def flooded():
+        attempts.append(1)
+        raise RetryAfter(timedelta(milliseconds=10))
+
+    async def scenario():
+        with pytest.raises(RetryAfter):
+            await limiter.process_request(flooded, (), {}, "sendMessage", {"chat_id": 1}, None)
+        await limiter.shutdown()
+
+    asyncio.run(scenario())
+    assert len(attempts) == 3
+    assert (limiter.retried, limiter.failed) == (2, 1)
+    assert limiter.queue_depth() == 0
+
+
+def test_unpaced_requests_do_not_queue():
+    limiter, sent = scheduler(chat_rate=0.001), []
+
+    async def scenario():
+        await request(limiter, sent, "first")
+        # the chat is out of tokens for the next 1000 s; callback answers still go through
+        await asyncio.wait_for(request(limiter, sent, "answer", endpoint="answerCallbackQuery"), 1)
+        await limiter.shutdown()
+
+    asyncio.run(scenario())
+    assert sent == ["first", "answer"]
+    assert limiter.stats()["queued"] == {"interactive": 0, "normal": 0, "bulk": 0}
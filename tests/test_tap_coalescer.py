@@ -0,0 +1,82 @@
+import asyncio
+
+from services.tap_coalescer import TapCoalescer
+
+WINDOW = 0.1
+EDIT = 0.03
+
+
+class Card:
+    """Stands in for the pagination card: every render is one (slow) edit."""
+
+    def __init__(self):
+        self.index = 0
+        self.edits: list[tuple[float, int]] = []   # (when the edit finished, index shown)
+
+    def render(self, index):
+        async def render(previous):
+            await asyncio.sleep(EDIT)
+            self.edits.append((asyncio.get_running_loop().time(), index))
+            return index
+        return render
+
+
+def test_first_tap_is_edited_without_waiting_for_the_window():
+    coalescer, card = TapCoalescer(window=WINDOW), Card()
+
+    async def scenario():
+        start = asyncio.get_running_loop().time()
+        await coalescer.render("msg", card.render(1))
+        await asyncio.sleep(WINDOW * 2)
+        return card.edits[0][0] - start
+
+    time_to_edit = asyncio.run(scenario())
+    assert time_to_edit < EDIT + WINDOW / 2
+    assert coalescer.shown("msg") == 1
+
+
+def test_burst_collapses_into_one_more_edit_with_the_last_tap():
+    coalescer, card = TapCoalescer(window=WINDOW), Card()
+
+    async def scenario():
+        for index in range(1, 8):
+            await coalescer.render("msg", card.render(index))
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(WINDOW * 3)
+
+    asyncio.run(scenario())
+    assert [index for _, index in card.edits] == [1, 7]
+    assert card.edits[1][0] - card.edits[0][0] >= WINDOW - EDIT
+    assert coalescer.stats()["pending"] == 0
+
+
+def test_taps_on_other_messages_are_not_held_back():
+    coalescer, card = TapCoalescer(window=WINDOW), Card()
+
+    async def scenario():
+        await coalescer.render("a", card.render(1))
+        await coalescer.render("b", card.render(2))
+        await asyncio.sleep(EDIT * 2)
+
+    asyncio.run(scenario())
+    assert sorted(index for _, index in card.edits) == [1, 2]
+
+
+def test_once_drops_duplicates_while_running():
+    coalescer = TapCoalescer()
+    started = []
+
+    async def work():
+        started.append(1)
+        await asyncio.sleep(0.02)
+
+    async def scenario():
+        assert coalescer.once("photos", work)
+        await asyncio.sleep(0)
+        assert not coalescer.once("photos", work)
+        await asyncio.sleep(0.05)
+        assert coalescer.once("photos", work)   # finished: runs again
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert len(started) == 2 and coalescer.duplicates == 1
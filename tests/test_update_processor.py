@@ -0,0 +1,57 @@
+import asyncio
+
+from telegram import Update
+
+from services.update_processor import PerChatUpdateProcessor
+
+
+def message_update(update_id: int, chat_id: int) -> Update:
+    return Update.de_json({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": "hi",
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": "u"},
+    }}, None)
+
+
+def test_same_chat_in_order_other_chats_in_parallel():
+    processor = PerChatUpdateProcessor(concurrency=4)
+    done = []
+
+    async def handle(chat_id, n, seconds):
+        await asyncio.sleep(seconds)
+        done.append((chat_id, n))
+
+    async def scenario():
+        await asyncio.gather(*(
+            processor.process_update(message_update(n, chat), handle(chat, n, 0.02 if n == 0 else 0.0))
+            for n in range(3) for chat in (1, 2)
+        ))
+
+    asyncio.run(scenario())
+    for chat in (1, 2):
+        assert [n for c, n in done if c == chat] == [0, 1, 2]
+
+
+def test_flooding_chat_does_not_stall_the_others():
+    processor = PerChatUpdateProcessor(concurrency=2)
+    loop_time = []
+
+    async def slow():
+        await asyncio.sleep(0.005)
+
+    async def quick():
+        loop_time.append(asyncio.get_running_loop().time())
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        flood = [asyncio.ensure_future(processor.process_update(message_update(n, 1), slow()))
+                 for n in range(100)]   # ~0.5s of work for chat 1
+        await asyncio.sleep(0)
+        started = loop.time()
+        await processor.process_update(message_update(1000, 2), quick())
+        waited = loop_time[0] - started
+        assert processor.active_chats() == 1
+        await asyncio.gather(*flood)
+        return waited
+
+    assert asyncio.run(scenario()) < 0.1
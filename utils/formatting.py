@@ -1,3 +1,5 @@
+import re
+
 def format_hotel(hotel: dict) -> str:
     hotel_id = hotel.get("hotel_id")
     prop = hotel.get("property") or {}
@@ -54,7 +56,21 @@ def get_guest_rating(hotel: dict):
             continue
     return 0.0
 
-import re
+def get_review_count(hotel: dict):
+    """
+    Number of reviews: property.reviewCount, or the number before 'reviews'
+    in accessibilityLabel. Returns int (0 if unknown).
+    """
+    prop = hotel.get("property") or {}
+    val = prop.get("reviewCount")
+    if isinstance(val, int):
+        return val
+    # a whole number ("1,234"): not a lone comma, nor the tail of a score ("8.1, reviews")
+    m = re.search(r"(?<![\d.,])(\d{1,3}(?:,\d{3})+|\d+)\s+reviews?", hotel.get("accessibilityLabel") or "",
+                  re.IGNORECASE)
+    if not m:
+        return 0
+    return int(m.group(1).replace(",", ""))
 
 def get_distance_km(hotel: dict):
     """
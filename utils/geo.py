@@ -0,0 +1,25 @@
+"""
+Great-circle distances for hotel coordinates.
+
+Result sets are a few pages of one destination, so filtering by radius
+measures every hotel directly (see utils/query_engine.py): at these sizes a
+spatial index costs more to build than it saves.
+"""
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def valid_point(lat, lon) -> bool:
+    """Both known (not None / NaN) and in range."""
+    return (lat is not None and lon is not None and lat == lat and lon == lon
+            and -90 <= lat <= 90 and -180 <= lon <= 180)
+
@@ -0,0 +1,71 @@
+from utils.formatting import (
+    format_hotel,
+    get_hotel_price_value,
+    get_guest_rating,
+    get_review_count,
+    get_distance_km,
+)
+
+
+class HotelRecord:
+    """
+    Compact, already-parsed hotel from searchHotels.
+    Built once per hotel when the response arrives, so filters/sorting and
+    pagination never touch the nested API dict again.
+    """
+
+    __slots__ = (
+        "hotel_id",
+        "name",
+        "price",         # float or None
+        "currency",
+        "rating",        # float, 0.0 if unknown
+        "review_count",  # int, 0 if unknown
+        "distance_km",   # float or None
+        "latitude",
+        "longitude",
+        "card",          # preformatted text for the hotel card
+    )
+
+    def __init__(self, hotel_id, name, price, currency, rating, review_count,
+                 distance_km, latitude, longitude, card):
+        self.hotel_id = hotel_id
+        self.name = name
+        self.price = price
+        self.currency = currency
+        self.rating = rating
+        self.review_count = review_count
+        self.distance_km = distance_km
+        self.latitude = latitude
+        self.longitude = longitude
+        self.card = card
+
+    @classmethod
+    def from_api(cls, hotel: dict) -> "HotelRecord":
+        prop = hotel.get("property") or {}
+        gross = (prop.get("priceBreakdown") or {}).get("grossPrice") or {}
+        return cls(
+            hotel_id=hotel.get("hotel_id"),
+            name=prop.get("name") or prop.get("wishlistName") or "Hotel",
+            price=get_hotel_price_value(hotel),
+            currency=gross.get("currency", ""),
+            rating=get_guest_rating(hotel),
+            review_count=get_review_count(hotel),
+            distance_km=get_distance_km(hotel),
+            latitude=prop.get("latitude"),
+            longitude=prop.get("longitude"),
+            card=format_hotel(hotel),
+        )
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "HotelRecord":
+        # old history rows hold raw API dicts
+        if "card" not in data:
+            return cls.from_api(data)
+        return cls(**{name: data.get(name) for name in cls.__slots__})
+
+    def __repr__(self):
+        return f"HotelRecord({self.hotel_id!r}, {self.name!r}, price={self.price!r})"
@@ -0,0 +1,66 @@
+"""
+Message edits that skip the Bot API call when nothing would change.
+
+Telegram answers such edits with "Message is not modified" (a BadRequest),
+which costs a round trip and counts against the chat's flood limit. The
+message attached to a callback query is what the user is looking at, so
+comparing against it catches most of them; the error itself is swallowed
+for the rest (e.g. two taps racing each other).
+"""
+from telegram import CallbackQuery, InlineKeyboardMarkup, Message
+from telegram.error import BadRequest
+
+from services.metrics import edits_skipped
+
+
+def is_not_modified(error: BadRequest) -> bool:
+    return "not modified" in str(error).lower()
+
+
+def _same_markup(message: Message, reply_markup: InlineKeyboardMarkup | None) -> bool:
+    current = message.reply_markup
+    if not current or not current.inline_keyboard:
+        return reply_markup is None or not reply_markup.inline_keyboard
+    return current == reply_markup
+
+
+def _unchanged(query: CallbackQuery, text: str | None, reply_markup) -> bool:
+    message = query.message
+    if not isinstance(message, Message):
+        return False   # inaccessible (too old) or inline: nothing to compare with
+    # Telegram strips surrounding whitespace from what it stores
+    if text is not None and (message.text or "").strip() != text.strip():
+        return False
+    return _same_markup(message, reply_markup)
+
+
+async def edit_text(query: CallbackQuery, text: str, reply_markup: InlineKeyboardMarkup | None = None,
+                    compare: bool = True) -> bool:
+    """
+    query.edit_message_text unless the message already shows this. True if an
+    edit was sent. compare=False when the message may have been edited since
+    the tap (query.message is then stale).
+    """
+    if compare and _unchanged(query, text, reply_markup):
+        edits_skipped.inc(method="editMessageText")
+        return False
+    try:
+        await query.edit_message_text(text, reply_markup=reply_markup)
+    except BadRequest as e:
+        if not is_not_modified(e):
+            raise
+        edits_skipped.inc(method="editMessageText")
+        return False
+    return True
+
+
+async def edit_markup(message: Message, reply_markup: InlineKeyboardMarkup | None) -> bool:
+    """message.edit_reply_markup, tolerating "not modified" (the local copy may be stale)."""
+    try:
+        await message.edit_reply_markup(reply_markup=reply_markup)
+    except BadRequest as e:
+        if not is_not_modified(e):
+            raise
+        edits_skipped.inc(method="editMessageReplyMarkup")
+        return False
+    return True